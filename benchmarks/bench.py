@@ -0,0 +1,184 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+End-to-end benchmarks of promql_http_api against a local synthetic Prometheus
+
+Examples:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --series 1000 --points 1440 --json results.json
+    python benchmarks/bench.py --baseline results.json --tolerance 0.2
+'''
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promql_http_api import ConversionPool, PromqlHttpApi  # noqa: E402
+from synthetic import SyntheticPrometheus  # noqa: E402
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+STEP = 15
+
+
+def best_time(fn: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def peak_memory(fn: Callable) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def import_time() -> float:
+    '''
+    The time to import promql_http_api in a new interpreter, in seconds
+    Measured with python -X importtime, as the cumulative time of the package.
+    '''
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import promql_http_api'],
+                             capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    times = {}
+    for line in process.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1e6
+    return times['promql_http_api']
+
+
+def run(args) -> dict:
+    results = {}
+
+    def record(name: str, value: float, unit: str, higher_is_better: bool):
+        results[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+        print(f'{name:<32} {value:>14,.1f} {unit}')
+
+    if not args.only or 'import' in args.only:
+        record('import_time', min(import_time() for _ in range(args.repeat)) * 1000, 'ms', False)
+
+    end = START + datetime.timedelta(seconds=STEP * (args.points - 1))
+    samples = args.series * args.points
+    with SyntheticPrometheus(args.series, args.cardinality, args.labels) as prometheus:
+        api = PromqlHttpApi(prometheus.url)
+        pooled_api = PromqlHttpApi(prometheus.url, conversion_pool=ConversionPool(args.workers, min_size=0))
+        schema = {'dtype': float}
+
+        def query_range(client=api):
+            return client.query_range('synthetic', START, end, f'{STEP}s')
+
+        # Render the response body once, outside of the measurements
+        query_range()()
+
+        conversions = {
+            'dataframe': lambda: query_range().to_dataframe(schema),
+            'dataframe_stream': lambda: query_range().to_dataframe(schema, stream=True),
+            'dataframe_compact': lambda: query_range().to_dataframe({'compact': True}),
+            'numpy_grid': lambda: query_range().to_numpy_grid(),
+            # The peak memory of the pool excludes its worker processes
+            'dataframe_pool': lambda: query_range(pooled_api).to_dataframe(schema),
+        }
+        for name, fn in conversions.items():
+            if args.only and name not in args.only:
+                continue
+            record(f'{name}_throughput', samples / best_time(fn, args.repeat), 'samples/s', True)
+            record(f'{name}_peak_memory', peak_memory(fn) / (1 << 20), 'MiB', False)
+        pooled_api.close()
+
+        if not args.only or 'concurrent' in args.only:
+            prometheus.latency = args.latency
+            times = [START + datetime.timedelta(seconds=i) for i in range(args.queries)]
+            for t in times:
+                api.query('synthetic', t)()
+
+            def concurrent():
+                endpoints = [api.query('synthetic', t) for t in times]
+                batch = api.run_many(endpoints, max_workers=args.concurrency)
+                assert all(result.ok for result in batch)
+
+            record('concurrent_throughput', args.queries / best_time(concurrent, args.repeat), 'queries/s', True)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> 'list[str]':
+    '''
+    List the benchmarks that regressed by more than the tolerance (a fraction)
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['value']
+        new = result['value']
+        change = (new - old) / old if old else 0.0
+        if not result['higher_is_better']:
+            change = -change
+        if change < -tolerance:
+            regressions.append(f'{name}: {old:,.1f} -> {new:,.1f} {result["unit"]} ({change:+.0%})')
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--series', type=int, default=100, help='series per response')
+    parser.add_argument('--points', type=int, default=1440, help='points per series of range queries')
+    parser.add_argument('--cardinality', type=int, default=10, help='distinct values per label')
+    parser.add_argument('--labels', type=int, default=3, help='labels per series')
+    parser.add_argument('--latency', type=float, default=0.01, help='server latency of concurrent queries, seconds')
+    parser.add_argument('--queries', type=int, default=200, help='instant queries in the concurrent benchmark')
+    parser.add_argument('--concurrency', type=int, default=16, help='workers in the concurrent benchmark')
+    parser.add_argument('--workers', type=int, default=None, help='processes of the dataframe_pool benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best one is reported')
+    parser.add_argument('--only', nargs='*', help='benchmarks to run, e.g. import dataframe numpy_grid concurrent')
+    parser.add_argument('--json', help='write the results to a JSON file')
+    parser.add_argument('--baseline', help='compare the results to a JSON file written by --json')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression against the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from promql_http_api.duration import parse_duration
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class SyntheticPrometheus:
+    '''
+    A local HTTP server that answers PromQL queries with synthetic series
+
+    /api/v1/query returns a vector, and /api/v1/query_range a matrix over the
+    requested start, end and step, with one sample per step. Response bodies
+    are rendered once per distinct request and then served from memory, so
+    the server is not the bottleneck of the client being measured.
+    '''
+
+    def __init__(self,
+                 series: int = 100,
+                 cardinality: int = 10,
+                 labels: int = 3,
+                 latency: float = 0.0,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        '''
+        Parameters:
+            series (int): The number of series in each response
+            cardinality (int): The number of distinct values of each label (but the instance label)
+            labels (int): The number of labels per series, besides __name__ and instance
+            latency (float): A delay added to each response, in seconds
+            host (str): The listen address
+            port (int): The listen port. 0 picks a free port.
+        '''
+        self.series = series
+        self.cardinality = cardinality
+        self.labels = labels
+        self.latency = latency
+        self.requests = 0
+        self._bodies: dict = {}
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._make_handler())
+        self.url = f'http://{host}:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def metrics(self) -> 'list[dict]':
+        '''
+        The labels of the synthetic series
+        '''
+        return [
+            dict({'__name__': 'synthetic', 'instance': f'host-{i:06d}:9100'},
+                 **{f'label{j}': f'value{(i // (j + 1)) % self.cardinality}' for j in range(self.labels)})
+            for i in range(self.series)
+        ]
+
+    def render(self, path: str, params: dict) -> bytes:
+        '''
+        Render the response body of a request
+        '''
+        metrics = self.metrics()
+        if path == '/api/v1/query':
+            t = float(params.get('time', 1700000000))
+            result = [{'metric': metric, 'value': [t, str(i * 0.5)]} for i, metric in enumerate(metrics)]
+            data = {'resultType': 'vector', 'result': result}
+        else:
+            start = float(params['start'])
+            step = parse_duration(params['step'])
+            points = int((float(params['end']) - start) // step) + 1
+            timestamps = [start + k * step for k in range(points)]
+            result = [{'metric': metric, 'values': [[t, str(i + k * 0.25)] for k, t in enumerate(timestamps)]}
+                      for i, metric in enumerate(metrics)]
+            data = {'resultType': 'matrix', 'result': result}
+        return json.dumps({'status': 'success', 'data': data}, separators=(',', ':')).encode()
+
+    def body(self, path: str, params: dict) -> bytes:
+        key = (path, tuple(sorted(params.items())))
+        with self._lock:
+            self.requests += 1
+            body = self._bodies.get(key)
+        if body is None:
+            body = self.render(path, params)
+            with self._lock:
+                self._bodies[key] = body
+        return body
+
+    def _make_handler(self):
+        prometheus = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def respond(self, params: dict):
+                path = urlsplit(self.path).path
+                if path not in ('/api/v1/query', '/api/v1/query_range'):
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = prometheus.body(path, params)
+                if prometheus.latency:
+                    time.sleep(prometheus.latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond(dict(parse_qsl(urlsplit(self.path).query)))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.respond(dict(parse_qsl(self.rfile.read(length).decode())))
+
+        return Handler
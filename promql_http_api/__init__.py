@@ -16,3 +16,5 @@
 
 
 from .api import *  # noqa: F401, F403
+from .async_api import *  # noqa: F401, F403
+from .multi import *  # noqa: F401, F403
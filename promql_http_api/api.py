@@ -14,12 +14,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Any, Callable, Optional, Sequence, Union
+from .api_endpoint import ApiEndpoint
+from .batch import run_many
+from .cache import ResultCache
+from .decoders import Decoder
+from .disk_cache import DiskCache
+from .hedging import Hedging, LatencyTracker  # noqa: F401
+from .metrics import Instrumentation, MetricsAggregator, RequestMetrics  # noqa: F401
+from .planner import QueryBudgetExceeded, QueryPlan, QueryPlanner  # noqa: F401
+from .process_pool import ConversionPool
 from .query import Query, QueryRange
+from .query_times import QueryTimes
+from .sliding import SlidingQueryRange
 from .format_query import FormatQuery
 from .series import Series
+from .singleflight import Coalescer
 from .labels import Labels
 from .label_values import LabelValues
+from .metadata import MetadataIndex
 from .targets import Targets
+from .transport import Transport
 from .rules import Rules
 from .alerts import Alerts
 from .alertsmanagers import AlertManagers
@@ -27,6 +42,7 @@ from .config import Config
 from .flags import Flags
 from .runtimeinfo import RuntimeInfo
 from .buildinfo import BuildInfo
+from .tsdb_status import TsdbStatus
 
 
 class PromqlHttpApi:
@@ -36,9 +52,56 @@ class PromqlHttpApi:
     API endpoint classes
     '''
 
-    def __init__(self, url: str, headers: dict = {}):
+    def __init__(self,
+                 url: str,
+                 headers: dict = {},
+                 decoder: Optional[Union[str, Decoder]] = None,
+                 cache: Optional[ResultCache] = None,
+                 disk_cache: Optional[DiskCache] = None,
+                 coalesce: Union[bool, Coalescer] = False,
+                 instrument: Optional[Instrumentation] = None,
+                 hedge: Optional[Union[Sequence[str], Hedging]] = None,
+                 transport: Optional[Transport] = None,
+                 conversion_pool: Union[bool, ConversionPool] = False,
+                 planner: Optional[QueryPlanner] = None):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            headers (dict): Default HTTP headers for all API calls
+            decoder (str or callable): The JSON decoder backend for API responses.
+                See decoders.get_decoder() for the supported values.
+            cache (ResultCache): A result cache shared by all API calls
+            disk_cache (DiskCache): A persistent cache of range query results
+            coalesce (bool or Coalescer): Share one HTTP request between identical
+                concurrent API calls. Pass a Coalescer to share it between clients.
+            instrument (Instrumentation): Called with the latency breakdown and size
+                of each request, e.g. a MetricsAggregator
+            hedge (list or Hedging): Replica URLs of the Prometheus server. Requests
+                that are slower than the usual latency are duplicated to a replica,
+                and the first good response wins. Pass a Hedging object to tune it.
+            transport (Transport): The HTTP connection pool of the client. Each client
+                creates its own by default. Pass a Transport to tune it, or to share it.
+            conversion_pool (bool or ConversionPool): Decode and convert large query
+                responses to DataFrames in worker processes. Pass a ConversionPool to
+                set the number of workers, and the response size that triggers the pool.
+            planner (QueryPlanner): Plan range queries before executing them: split them by
+                label and time range, and refuse the ones above the budgets of the planner
+        '''
         self.url = url
         self.headers = headers
+        self.decoder = decoder
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.coalescer = Coalescer() if coalesce is True else coalesce or None
+        self.instrument = instrument
+        self.hedging = Hedging([url, *hedge]) if hedge is not None and not isinstance(hedge, Hedging) else hedge
+        self.transport = transport or self._new_transport()
+        self.conversion_pool = ConversionPool() if conversion_pool is True else conversion_pool or None
+        self.planner = planner
+
+    def _new_transport(self) -> Optional[Transport]:
+        # The connection pool of the client, unless one was passed
+        return Transport()
 
     def _update_(self, args, kwargs) -> list:
         args = [self.url] + list(args)
@@ -50,6 +113,24 @@ class PromqlHttpApi:
         for key, value in k_headers.items():
             headers[key] = value
         kwargs['headers'] = headers
+        if self.decoder is not None:
+            kwargs.setdefault('decoder', self.decoder)
+        if self.cache is not None:
+            kwargs.setdefault('cache', self.cache)
+        if self.disk_cache is not None:
+            kwargs.setdefault('disk_cache', self.disk_cache)
+        if self.coalescer is not None:
+            kwargs.setdefault('coalesce', self.coalescer)
+        if self.instrument is not None:
+            kwargs.setdefault('instrument', self.instrument)
+        if self.hedging is not None:
+            kwargs.setdefault('hedge', self.hedging)
+        if self.transport is not None:
+            kwargs.setdefault('transport', self.transport)
+        if self.conversion_pool is not None:
+            kwargs.setdefault('conversion_pool', self.conversion_pool)
+        if self.planner is not None:
+            kwargs.setdefault('planner', self.planner)
 
         return [args, kwargs]
 
@@ -67,6 +148,20 @@ class PromqlHttpApi:
         args, kwargs = self._update_(args, kwargs)
         return QueryRange(*args, **kwargs)
 
+    def query_times(self, *args, **kwargs) -> QueryTimes:
+        '''
+        Get a QueryTimes object
+        '''
+        args, kwargs = self._update_(args, kwargs)
+        return QueryTimes(*args, **kwargs)
+
+    def sliding_query_range(self, *args, **kwargs) -> SlidingQueryRange:
+        '''
+        Get a SlidingQueryRange object
+        '''
+        args, kwargs = self._update_(args, kwargs)
+        return SlidingQueryRange(*args, **kwargs)
+
     def format_query(self, *args, **kwargs) -> FormatQuery:
         '''
         Get a FormatQuery object
@@ -95,6 +190,13 @@ class PromqlHttpApi:
         args, kwargs = self._update_(args, kwargs)
         return LabelValues(*args, **kwargs)
 
+    def metadata_index(self, *args, **kwargs) -> MetadataIndex:
+        '''
+        Get a loaded MetadataIndex of the series of the server
+        See MetadataIndex for the parameters
+        '''
+        return MetadataIndex(self, *args, **kwargs).load()
+
     def targets(self, *args, **kwargs) -> Targets:
         '''
         Get a Targets object
@@ -150,3 +252,30 @@ class PromqlHttpApi:
         '''
         args, kwargs = self._update_(args, kwargs)
         return BuildInfo(*args, **kwargs)
+
+    def tsdb_status(self, *args, **kwargs) -> TsdbStatus:
+        '''
+        Get a TsdbStatus object
+        '''
+        args, kwargs = self._update_(args, kwargs)
+        return TsdbStatus(*args, **kwargs)
+
+    def run_many(self,
+                 endpoints: Sequence[ApiEndpoint],
+                 max_workers: int = 8,
+                 ordered: bool = True,
+                 func: Optional[Callable[[ApiEndpoint], Any]] = None):
+        '''
+        Execute API endpoint objects concurrently
+        See batch.run_many()
+        '''
+        return run_many(endpoints, max_workers, ordered, func)
+
+    def close(self):
+        '''
+        Close the pooled connections, and the conversion pool of the client
+        '''
+        if self.transport is not None:
+            self.transport.close()
+        if self.conversion_pool is not None:
+            self.conversion_pool.close()
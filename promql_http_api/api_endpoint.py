@@ -16,7 +16,41 @@
 
 import json
 import logging
+from datetime import datetime
+from typing import Optional, Union
+from urllib.parse import urlencode
 from .api_response import ApiResponse
+from .cache import ResultCache
+from .http_config import post_threshold
+
+
+def metadata_params(match: Optional[Union[str, 'list[str]']] = None,
+                    start: Optional[datetime] = None,
+                    end: Optional[datetime] = None,
+                    limit: Optional[int] = None) -> 'list[tuple[str, str]]':
+    '''
+    Make the series selector and time range parameters of the metadata API endpoints
+    (series, labels and label values)
+
+    Parameters:
+        match (str or list): Series selectors
+        start (datetime): The start of the time range
+        end (datetime): The end of the time range
+        limit (int): The maximal number of returned items (Prometheus 2.49 and later)
+    Returns:
+        params (list): (name, value) tuples
+    '''
+    if isinstance(match, str):
+        params = [('match[]', match)]
+    else:
+        params = [('match[]', selector) for selector in match or []]
+    if start is not None:
+        params.append(('start', str(start.timestamp())))
+    if end is not None:
+        params.append(('end', str(end.timestamp())))
+    if limit is not None:
+        params.append(('limit', str(limit)))
+    return params
 
 
 class ApiEndpoint:
@@ -24,11 +58,16 @@ class ApiEndpoint:
     Base class for API endpoints
     '''
 
+    # Does the Prometheus HTTP API accept form encoded POST requests for the endpoint?
+    post_supported = False
+
     def __init__(self, url: str, **kwargs):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.base_url = url
         self.init_kwargs = kwargs
         self.response: ApiResponse = None  # type: ignore
+        # When the endpoint object was submitted to an executor (time.perf_counter())
+        self.queued: Optional[float] = None
 
     def pretty(self, msg: str):
         return json.dumps(msg, indent=4)
@@ -39,19 +78,140 @@ class ApiEndpoint:
             return
         api_kwargs = self.init_kwargs.copy()
         api_kwargs.update(kwargs)
-        self.response = ApiResponse(url, *args, **api_kwargs)
-        self.logger.debug('response = ' + self.pretty(str(self.response)))
+        if self.queued is not None:
+            api_kwargs.setdefault('queued', self.queued)
+        data = self._cache_get(url, api_kwargs)
+        if data is not None:
+            return data
+        request_url = self._prepare_request(api_kwargs)
+        self.response = ApiResponse(request_url, *args, **api_kwargs)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('response = ' + self.pretty(str(self.response)))
+        data = self.response.data()
+        self._cache_put(url, api_kwargs, data)
+        return data
+
+    async def acall(self, *args, **kwargs):
+        '''
+        Execute the API call asynchronously
+        The awaitable equivalent of __call__(). The request is sent with the
+        httpx.AsyncClient given in the 'client' argument, if any.
+        Awaiting the endpoint object itself is the same as awaiting acall().
+
+        Returns:
+            data: The data of the PromQL API response
+        '''
+        if self.response is not None:
+            return
+        url = self.base_url + self.make_url()
+        api_kwargs = self.init_kwargs.copy()
+        api_kwargs.update(kwargs)
+        if self.queued is not None:
+            api_kwargs.setdefault('queued', self.queued)
+        data = self._cache_get(url, api_kwargs)
+        if data is not None:
+            return data
+        request_url = self._prepare_request(api_kwargs)
+        # httpx is only imported by asynchronous clients
+        from .async_api_response import AsyncApiResponse
+        response = AsyncApiResponse(request_url, *args, **api_kwargs)
+        await response.fetch()
+        self.response = response
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('response = ' + self.pretty(str(self.response)))
         data = self.response.data()
+        self._cache_put(url, api_kwargs, data)
         return data
 
+    def __await__(self):
+        return self.acall().__await__()
+
+    def cache_ttl(self, cache: ResultCache) -> Optional[float]:
+        '''
+        Get the time-to-live of the endpoint result in a result cache
+
+        Parameters:
+            cache (ResultCache): The result cache
+        Returns:
+            ttl (float): The time-to-live in seconds, or None for no expiry
+        '''
+        return cache.ttl
+
+    def _cache_get(self, url: str, api_kwargs: dict):
+        cache = api_kwargs.get('cache', None)
+        if cache is None:
+            return None
+        data = cache.get(cache.make_key(url, api_kwargs.get('headers', {})))
+        if data is not None:
+            self.logger.debug(f'cache hit: {url}')
+            self.response = ApiResponse.from_data(url, data, **api_kwargs)
+        return data
+
+    def _cache_put(self, url: str, api_kwargs: dict, data):
+        cache = api_kwargs.get('cache', None)
+        if cache is None or data is None:
+            return
+        cache.put(cache.make_key(url, api_kwargs.get('headers', {})), data, self.cache_ttl(cache))
+
     def make_url(self):
         '''
         Make the URL for the API endpoint.
-        This method must be overridden by the subclass.
+        The default joins make_path() and the encoded make_params().
 
         Parameters:
             None
         Returns:
             url (str): The URL for the API endpoint
         '''
+        path = self.make_path()
+        params = self.make_params()
+        if not params:
+            return path
+        return path + '?' + urlencode(params)
+
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint, without the query parameters.
+        This method (or make_url) must be overridden by the subclass.
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
         raise NotImplementedError
+
+    def make_params(self) -> 'list[tuple[str, str]]':
+        '''
+        Make the query parameters for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            params (list): (name, value) tuples
+        '''
+        return []
+
+    def make_request(self, threshold: int = post_threshold) -> 'tuple[str, str, Optional[list]]':
+        '''
+        Make the HTTP request for the API endpoint
+        Requests with URLs longer than the threshold are sent as form
+        encoded POST requests, if the endpoint supports them.
+
+        Parameters:
+            threshold (int): The maximal URL length of GET requests
+        Returns:
+            method (str): The HTTP method
+            url (str): The request URL
+            form (list): The POST form parameters, or None
+        '''
+        url = self.base_url + self.make_url()
+        if self.post_supported and len(url) > threshold:
+            return 'POST', self.base_url + self.make_path(), self.make_params()
+        return 'GET', url, None
+
+    def _prepare_request(self, api_kwargs: dict) -> str:
+        method, url, form = self.make_request(api_kwargs.get('post_threshold', post_threshold))
+        api_kwargs['method'] = method
+        api_kwargs['form'] = form
+        return url
@@ -17,13 +17,51 @@
 import requests
 from requests.exceptions import ConnectTimeout
 import logging
+import time
+import warnings
+from typing import Optional
+from .decoders import get_decoder
 from .http_config import http_retries, http_backoff
+from .metrics import RequestMetrics
+from .transport import Transport
+
+
+class _DefaultSession:
+    # ApiResponse.session used to be the session of all requests
+    def __get__(self, instance, owner) -> requests.Session:
+        warnings.warn('ApiResponse.session is deprecated: configure the Transport of the client '
+                      '(PromqlHttpApi.transport.session), or Transport.default() for the endpoint objects '
+                      'that are created without a client', DeprecationWarning, stacklevel=2)
+        return Transport.default().session
 
 
 class ApiResponse:
-    session = requests.Session()
+    # Deprecated: the session of the default transport
+    session = _DefaultSession()
 
     def __init__(self, url: str, *args, **kwargs):
+        self._setup(url, **kwargs)
+        self.get()
+
+    @classmethod
+    def from_data(cls, url: str, data, **kwargs) -> 'ApiResponse':
+        '''
+        Make a successful response object from PromQL API response data,
+        without executing an HTTP request. Used for results that are
+        assembled on the client side, e.g. from several requests.
+
+        Parameters:
+            url (str): The URL the data stands for
+            data: The data of the PromQL API response
+        Returns:
+            response (ApiResponse): The response object
+        '''
+        response = cls.__new__(cls)
+        response._setup(url, **kwargs)
+        response._envelope = {'status': 'success', 'data': data}
+        return response
+
+    def _setup(self, url: str, **kwargs):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.url = url
         self.retry = 'retries' in kwargs
@@ -31,39 +69,114 @@ class ApiResponse:
         self.timeout = kwargs.get('timeout', None)
         self.backoff = kwargs.get('backoff', http_backoff)
         self.headers = kwargs.get('headers', {})
+        self.decoder = get_decoder(kwargs.get('decoder', None))
+        self.stream = kwargs.get('stream', False)
+        self.method = kwargs.get('method', 'GET')
+        self.form = kwargs.get('form', None)
+        self.coalescer = kwargs.get('coalesce', None)
+        self.instrument = kwargs.get('instrument', None)
+        self.hedging = kwargs.get('hedge', None)
+        self.queued = kwargs.get('queued', None)
+        self.transport = kwargs.get('transport', None) or Transport.default()
+        self.metrics = RequestMetrics(url, self.method) if self.instrument is not None else None
         self.response: requests.Response = None  # type: ignore
-        self.get()
+        self._envelope: Optional[dict] = None
 
     def get(self):
         '''
         Get the response from the PromQL API
-        Executes the HTTP GET request to the PromQL API
+        Executes the HTTP request (GET, or POST with form data) to the PromQL API
 
         Parameters:
             None
         Returns:
             None
         Exceptions:
-            requests.exceptions.RequestException: If the HTTP GET request fails
+            requests.exceptions.RequestException: If the HTTP request fails
         '''
         if self.response:
             return
+        if self.coalescer is None or self.stream:
+            self.response = self._request()
+            if self.metrics is not None and not self.stream:
+                self.metrics.count_results(self.data())
+                self.report()
+            return
+        # Identical concurrent requests share one HTTP request and one decoded body
+        key = self.coalescer.make_key(self.url, self.form, self.headers, self.decoder)
+        self.response, self._envelope = self.coalescer.do(key, self._request_envelope)
 
+    def _request(self) -> requests.Response:
         retries = self.retries
         timeout = self.timeout
+        started = time.perf_counter()
+        if self.metrics is not None and self.queued is not None:
+            self.metrics.queue_wait = started - self.queued
         while retries > 0:
             try:
-                self.logger.debug(f'HTTP GET url: {self.url}; headers: {self.headers}, timeout: {timeout}')
-                self.response = ApiResponse.session.get(self.url, headers=self.headers, timeout=timeout)
-                break
+                self.logger.debug(f'HTTP {self.method} url: {self.url}; headers: {self.headers}, timeout: {timeout}')
+                response = self._send(timeout)
+                if self.metrics is not None:
+                    self._measure(self.metrics, response, started)
+                return response
             except ConnectTimeout:
                 self.logger.warning(f"HTTP connection timeout, {retries} retries remaining")
                 retries -= 1
                 timeout *= self.backoff
             except Exception as e:
                 raise e
-        if retries == 0:
-            raise ConnectTimeout(f"HTTP GET request failed. URL: {self.url}; headers: {self.headers}")
+        raise ConnectTimeout(f"HTTP {self.method} request failed. URL: {self.url}; headers: {self.headers}")
+
+    def _send(self, timeout) -> requests.Response:
+        # Instrumented requests are streamed, to tell the headers from the body
+        stream = self.stream or self.metrics is not None
+        if self.hedging is None:
+            return self.transport.request(self.method, self.url, data=self.form,
+                                          headers=self.headers, timeout=timeout, stream=stream)
+
+        # Hedged requests are streamed, so that the losers can be closed without downloading their body
+        def send(url: str) -> requests.Response:
+            return self.transport.request(self.method, url, data=self.form,
+                                          headers=self.headers, timeout=timeout, stream=True)
+        return self.hedging.execute(self.url, send)
+
+    def _measure(self, metrics: RequestMetrics, response: requests.Response, started: float):
+        headers = time.perf_counter()
+        metrics.status_code = response.status_code
+        metrics.ttfb = headers - started
+        if not self.stream:
+            metrics.bytes = len(response.content)
+            metrics.download = time.perf_counter() - headers
+
+    def _request_envelope(self) -> tuple:
+        self.response = self._request()
+        self._envelope = self._decode(self.response.content) if self.response.status_code == 200 else None
+        if self.metrics is not None:
+            self.metrics.count_results(self.data())
+            self.report()
+        return self.response, self._envelope
+
+    def _decode(self, content: bytes) -> dict:
+        if self.metrics is None:
+            return self.decoder(content)
+        started = time.perf_counter()
+        envelope = self.decoder(content)
+        self.metrics.decode = time.perf_counter() - started
+        return envelope
+
+    def report(self):
+        '''
+        Report the request metrics to the instrumentation callback, if any
+        Called when the response was downloaded and decoded. Streamed
+        responses are reported by their consumer (e.g. Base.iter_series()).
+
+        Parameters:
+            None
+        Returns:
+            None
+        '''
+        if self.metrics is not None:
+            self.instrument.request_done(self.metrics)
 
     def http_response_ok(self):
         '''
@@ -78,6 +191,50 @@ class ApiResponse:
             return False
         return self.response.status_code == 200
 
+    def iter_content(self, chunk_size: int):
+        '''
+        Iterate over the raw response body
+        Only meaningful for streamed responses (stream=True),
+        where the body has not been downloaded yet
+
+        Parameters:
+            chunk_size (int): The chunk size in bytes
+        Returns:
+            chunks (iterator): The response body in chunks of bytes
+        '''
+        return self.response.iter_content(chunk_size)
+
+    def content(self) -> Optional[bytes]:
+        '''
+        Get the raw response body, if it has not been decoded yet
+        Lets the caller decode large bodies its own way (see ConversionPool).
+
+        Parameters:
+            None
+        Returns:
+            content (bytes): The response body, or None if it was already decoded,
+                or the HTTP response is not OK
+        '''
+        if self._envelope is not None or self.stream or not self.http_response_ok():
+            return None
+        return self.response.content
+
+    def envelope(self) -> Optional[dict]:
+        '''
+        Get the decoded PromQL API response body
+        The body is decoded once, on first access, and cached
+
+        Parameters:
+            None
+        Returns:
+            envelope (dict): The decoded response body, or None if the HTTP response is not OK
+        '''
+        if self._envelope is None:
+            if not self.http_response_ok():
+                return None
+            self._envelope = self._decode(self.response.content)
+        return self._envelope
+
     def status(self):
         '''
         Get PromQL API response status
@@ -87,9 +244,10 @@ class ApiResponse:
         Returns:
             status (str): The status of the PromQL API response
         '''
-        if not self.http_response_ok():
+        envelope = self.envelope()
+        if envelope is None:
             return None
-        return self.response.json()['status']
+        return envelope['status']
 
     def data(self):
         '''
@@ -102,7 +260,7 @@ class ApiResponse:
         '''
         if self.status() != 'success':
             return None
-        return self.response.json()['data']
+        return self.envelope()['data']  # type: ignore
 
     def error_type(self):
         '''
@@ -115,7 +273,7 @@ class ApiResponse:
         '''
         if self.status() != 'error':
             return None
-        return self.response.json()['errorType']
+        return self.envelope()['errorType']  # type: ignore
 
     def error(self):
         '''
@@ -128,7 +286,7 @@ class ApiResponse:
         '''
         if self.status() != 'error':
             return None
-        return self.response.json()['error']
+        return self.envelope()['error']  # type: ignore
 
     def __str__(self):
         '''
@@ -140,7 +298,8 @@ class ApiResponse:
             str: The string representation of the response
         '''
         ret = ""
-        ret += f"status_code: {self.response.status_code}, "
+        status_code = self.response.status_code if self.response is not None else None
+        ret += f"status_code: {status_code}, "
         ret += f"status: {self.status()}, "
         ret += f"data: {self.data()}"
         return ret
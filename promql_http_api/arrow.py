@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from .columnar import SeriesBlock, is_float_dtype
+from typing import Iterable, Optional
+
+
+def import_pyarrow():
+    '''
+    Import the optional pyarrow package
+
+    Exceptions:
+        ImportError: If pyarrow is not installed
+    '''
+    try:
+        import pyarrow  # type: ignore
+    except ImportError as e:
+        raise ImportError("Arrow output requires pyarrow: pip install 'promql-http-api[arrow]'") from e
+    return pyarrow
+
+
+def import_polars():
+    '''
+    Import the optional polars package
+
+    Exceptions:
+        ImportError: If polars is not installed
+    '''
+    try:
+        import polars  # type: ignore
+    except ImportError as e:
+        raise ImportError("Polars output requires polars: pip install 'promql-http-api[polars]'") from e
+    return polars
+
+
+def arrow_timezone(timezone) -> str:
+    '''
+    Get the Arrow name of a timezone: the name of a timezone database zone,
+    or a fixed offset, e.g. '+02:00' for timezone(timedelta(hours=2))
+
+    Parameters:
+        timezone (tzinfo or str): The timezone. None for UTC.
+    Returns:
+        tz (str): The timezone of Arrow timestamp types
+    '''
+    if timezone is None:
+        return 'UTC'
+    if isinstance(timezone, str):
+        return timezone
+    offset = timezone.utcoffset(None)
+    if offset is None:
+        # zoneinfo and pytz zones
+        return str(getattr(timezone, 'key', None) or getattr(timezone, 'zone', None) or timezone)
+    minutes = round(offset.total_seconds() / 60)
+    sign = '-' if minutes < 0 else '+'
+    return f'{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}'
+
+
+def blocks_to_arrow(blocks: Iterable[SeriesBlock],
+                    columns: Optional['list[str]'] = None,
+                    dtype=np.float64,
+                    timezone=None):
+    '''
+    Build a long format Arrow table from PromQL series
+
+    The table columns are 'timestamp' (timestamp[ms], in the given timezone),
+    the label columns as dictionary arrays, and 'value'. A label that a series
+    does not have is null.
+
+    Parameters:
+        blocks (iterable): SeriesBlock objects
+        columns (list): Label columns. Defaults to the labels of the first series
+        dtype: The type of the 'value' column. None or str keep the raw values (string)
+        timezone (tzinfo): The timezone of the 'timestamp' column. The default is UTC.
+    Returns:
+        table (pyarrow.Table): The series as an Arrow table
+    '''
+    pa = import_pyarrow()
+    float_dtype = is_float_dtype(dtype)
+    metrics = []
+    lengths = []
+    timestamps = []
+    values: list = []
+    for block in blocks:
+        metrics.append(block.metric)
+        lengths.append(len(block))
+        timestamps.append(np.rint(block.timestamps.astype(np.float64) * 1000).astype(np.int64))
+        if dtype is None or dtype is str or float_dtype:
+            values.append(block.values.astype(dtype if float_dtype else str))
+        else:
+            values.append([dtype(value) for value in block.values])
+    if not columns:
+        columns = list(metrics[0].keys()) if metrics else []
+
+    tz = arrow_timezone(timezone)
+    names = ['timestamp']
+    arrays = [pa.array(np.concatenate(timestamps) if timestamps else np.array([], dtype=np.int64),
+                       type=pa.timestamp('ms', tz=tz))]
+    for column in columns:
+        # Dictionary encode the labels per series, then repeat the indices
+        categories: dict = {}
+        codes = np.array([categories.setdefault(metric[column], len(categories)) if column in metric else -1
+                          for metric in metrics], dtype=np.int32)
+        indices = np.repeat(codes, lengths)
+        names.append(column)
+        arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, mask=indices < 0),
+                                                     pa.array(list(categories), type=pa.string())))
+    names.append('value')
+    if dtype is None or dtype is str:
+        arrays.append(pa.array(np.concatenate(values) if values else [], type=pa.string()))
+    elif float_dtype:
+        arrays.append(pa.array(np.concatenate(values) if values else np.array([], dtype=dtype)))
+    else:
+        arrays.append(pa.array([value for block_values in values for value in block_values]))
+    return pa.Table.from_arrays(arrays, names=names)
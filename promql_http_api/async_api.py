@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Optional, Sequence, Union
+from .api import PromqlHttpApi
+from .cache import ResultCache
+from .decoders import Decoder
+from .hedging import Hedging
+from .metrics import Instrumentation
+from .singleflight import Coalescer
+from .transport import Transport
+
+
+class AsyncPromqlHttpApi(PromqlHttpApi):
+    '''
+    Asynchronous variant of the top level API class
+    Provides the same factory methods as PromqlHttpApi. The returned
+    API endpoint objects are executed by awaiting them, or their
+    ato_dataframe() method, over a shared pooled httpx.AsyncClient.
+    '''
+
+    def __init__(self,
+                 url: str,
+                 headers: dict = {},
+                 decoder: Optional[Union[str, Decoder]] = None,
+                 cache: Optional[ResultCache] = None,
+                 max_connections: Optional[int] = 100,
+                 max_keepalive_connections: Optional[int] = 20,
+                 keepalive_expiry: Optional[float] = 5.0,
+                 http2: bool = False,
+                 timeout: Optional[float] = None,
+                 coalesce: Union[bool, Coalescer] = False,
+                 instrument: Optional[Instrumentation] = None,
+                 hedge: Optional[Union[Sequence[str], Hedging]] = None,
+                 transport: Optional[Transport] = None):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            headers (dict): Default HTTP headers for all API calls
+            decoder (str or callable): The JSON decoder backend for API responses
+            cache (ResultCache): A result cache shared by all API calls
+            max_connections (int): The maximal number of concurrent connections
+            max_keepalive_connections (int): The maximal number of idle connections kept in the pool
+            keepalive_expiry (float): The idle connection time-out in seconds
+            http2 (bool): Multiplex requests over HTTP/2 connections (requires httpx[http2])
+            timeout (float): The default request time-out in seconds. None means no time-out.
+            coalesce (bool or Coalescer): Share one HTTP request between identical
+                concurrent API calls
+            instrument (Instrumentation): Called with the latency breakdown and size
+                of each request, e.g. a MetricsAggregator
+            hedge (list or Hedging): Replica URLs of the Prometheus server, for hedged requests
+            transport (Transport): The connection pool of the endpoint objects when they are
+                called synchronously. They use Transport.default() if None.
+        '''
+        super().__init__(url, headers, decoder, cache, coalesce=coalesce, instrument=instrument, hedge=hedge,
+                         transport=transport)
+        import httpx
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_keepalive_connections,
+                              keepalive_expiry=keepalive_expiry)
+        self.client = httpx.AsyncClient(limits=limits, http2=http2, timeout=timeout)
+
+    def _new_transport(self) -> Optional[Transport]:
+        # Requests are sent with the httpx client
+        return None
+
+    def _update_(self, args, kwargs) -> list:
+        args, kwargs = super()._update_(args, kwargs)
+        kwargs.setdefault('client', self.client)
+        return [args, kwargs]
+
+    async def aclose(self):
+        '''
+        Close the connection pools
+        '''
+        await self.client.aclose()
+        if self.transport is not None:
+            self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
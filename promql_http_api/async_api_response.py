@@ -0,0 +1,131 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import httpx
+import time
+from typing import Optional
+from .api_response import ApiResponse
+from .metrics import RequestMetrics
+
+
+class AsyncApiResponse(ApiResponse):
+    '''
+    An ApiResponse executed with an httpx.AsyncClient
+    The request is sent by awaiting fetch(), instead of on construction.
+    '''
+
+    def __init__(self, url: str, *args, **kwargs):
+        self._setup(url, **kwargs)
+        self.client: Optional[httpx.AsyncClient] = kwargs.get('client', None)
+
+    async def fetch(self):
+        '''
+        Get the response from the PromQL API
+        Executes the HTTP request (GET, or POST with form data) to the PromQL API
+
+        Parameters:
+            None
+        Returns:
+            None
+        Exceptions:
+            httpx.HTTPError: If the HTTP request fails
+        '''
+        if self.response is not None:
+            return
+        if self.coalescer is None:
+            self.response = await self._request_client()  # type: ignore
+            if self.metrics is not None:
+                self.metrics.count_results(self.data())
+                self.report()
+            return
+        key = self.coalescer.make_key(self.url, self.form, self.headers, self.decoder)
+        self.response, self._envelope = await self.coalescer.ado(key, self._request_envelope_async)
+
+    async def _request_client(self) -> httpx.Response:
+        if self.client is None:
+            async with httpx.AsyncClient() as client:
+                return await self._fetch(client)
+        return await self._fetch(self.client)
+
+    async def _request_envelope_async(self) -> tuple:
+        self.response = await self._request_client()  # type: ignore
+        self._envelope = self._decode(self.response.content) if self.response.status_code == 200 else None
+        if self.metrics is not None:
+            self.metrics.count_results(self.data())
+            self.report()
+        return self.response, self._envelope
+
+    async def _fetch(self, client: httpx.AsyncClient) -> httpx.Response:
+        retries = self.retries
+        timeout = self.timeout
+        started = time.perf_counter()
+        if self.metrics is not None and self.queued is not None:
+            self.metrics.queue_wait = started - self.queued
+        events: dict = {}
+        while retries > 0:
+            try:
+                self.logger.debug(f'HTTP {self.method} url: {self.url}; headers: {self.headers}, timeout: {timeout}')
+                response = await self._asend(client, timeout, events)
+                if self.metrics is not None:
+                    _measure(self.metrics, response, started, events)
+                return response
+            except httpx.ConnectTimeout:
+                self.logger.warning(f"HTTP connection timeout, {retries} retries remaining")
+                retries -= 1
+                if timeout is not None:
+                    timeout *= self.backoff
+        raise httpx.ConnectTimeout(f"HTTP {self.method} request failed. URL: {self.url}; headers: {self.headers}")
+
+    async def _asend(self, client: httpx.AsyncClient, timeout: Optional[float], events: dict) -> httpx.Response:
+        def send(url: str):
+            return client.request(
+                self.method, url, data=_form_data(self.form), headers=self.headers,
+                timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout,
+                extensions={'trace': _tracer(events)} if self.metrics is not None else None)
+        if self.hedging is None:
+            return await send(self.url)
+        return await self.hedging.aexecute(self.url, send)
+
+
+def _tracer(events: dict):
+    # Record the time of the httpcore trace events, e.g. 'connection.connect_tcp.started'
+    async def trace(event_name: str, info: dict):
+        events[event_name] = time.perf_counter()
+    return trace
+
+
+def _measure(metrics: RequestMetrics, response: httpx.Response, started: float, events: dict):
+    done = time.perf_counter()
+    connect_started = events.get('connection.connect_tcp.started')
+    connected = events.get('connection.start_tls.complete', events.get('connection.connect_tcp.complete'))
+    if connect_started is not None and connected is not None:
+        metrics.connect = connected - connect_started
+    headers = events.get('http11.receive_response_headers.complete',
+                         events.get('http2.receive_response_headers.complete', done))
+    metrics.status_code = response.status_code
+    metrics.ttfb = headers - started
+    metrics.download = done - headers
+    metrics.bytes = len(response.content)
+
+
+def _form_data(form: Optional[list]) -> Optional[dict]:
+    # httpx takes repeated form fields (e.g. match[]) as lists
+    if form is None:
+        return None
+    data: dict = {}
+    for name, value in form:
+        data.setdefault(name, []).append(value)
+    return data
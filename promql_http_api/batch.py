@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from typing import Any, Callable, Iterator, Optional, Sequence
+from .api_endpoint import ApiEndpoint
+from .transport import Transport
+
+
+class BatchResult:
+    '''
+    The result of one API endpoint object in a batch
+
+    Attributes:
+        index (int): The position of the endpoint object in the batch
+        endpoint (ApiEndpoint): The endpoint object
+        data: The value returned for the endpoint object, None on error
+        error (Exception): The exception raised for the endpoint object, if any
+    '''
+
+    __slots__ = ('index', 'endpoint', 'data', 'error')
+
+    def __init__(self, index: int, endpoint: ApiEndpoint, data: Any = None, error: Optional[Exception] = None):
+        self.index = index
+        self.endpoint = endpoint
+        self.data = data
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f'BatchResult(index={self.index}, endpoint={self.endpoint!r}, ok={self.ok})'
+
+
+def _run(index: int, endpoint: ApiEndpoint, func: Callable) -> BatchResult:
+    try:
+        return BatchResult(index, endpoint, data=func(endpoint))
+    except Exception as e:
+        return BatchResult(index, endpoint, error=e)
+
+
+def _execute(endpoint: ApiEndpoint):
+    return endpoint()
+
+
+def run_many(endpoints: Sequence[ApiEndpoint],
+             max_workers: int = 8,
+             ordered: bool = True,
+             func: Optional[Callable[[ApiEndpoint], Any]] = None):
+    '''
+    Execute API endpoint objects concurrently
+
+    Errors are reported per endpoint object, and do not abort the batch.
+
+    Parameters:
+        endpoints (list): API endpoint objects (e.g. Query, QueryRange)
+        max_workers (int): The maximal number of concurrent requests
+        ordered (bool): Return a list of results in input order if True,
+            or an iterator over the results as they complete if False
+        func (callable): Applied to each endpoint object. The default executes
+            the endpoint object, e.g. use lambda q: q.to_dataframe() to get DataFrames.
+    Returns:
+        results (list or iterator): BatchResult objects
+    '''
+    func = func or _execute
+    endpoints = list(endpoints)
+    # Size the connection pools for the batch, instead of discarding connections
+    transports = {}
+    for endpoint in endpoints:
+        transport = endpoint.init_kwargs.get('transport', None) or Transport.default()
+        transports[id(transport)] = transport
+    for transport in transports.values():
+        transport.grow(max_workers)
+    queued = time.perf_counter()
+    for endpoint in endpoints:
+        endpoint.queued = queued
+    if ordered:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_run, range(len(endpoints)), endpoints, [func] * len(endpoints)))
+    return _iter_completed(endpoints, max_workers, func)
+
+
+def _iter_completed(endpoints: 'list[ApiEndpoint]', max_workers: int, func: Callable) -> Iterator[BatchResult]:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run, index, endpoint, func) for index, endpoint in enumerate(endpoints)]
+        for future in as_completed(futures):
+            yield future.result()
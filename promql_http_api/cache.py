@@ -0,0 +1,159 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+from urllib.parse import parse_qsl, urlsplit
+from .duration import Duration, parse_duration
+
+
+class ResultCache:
+    '''
+    A thread-safe in-memory cache of PromQL API response data
+
+    Entries are keyed by the normalized request (URL and headers), evicted
+    in least recently used order beyond max_entries, and expire after a
+    per-entry time-to-live. Results that can no longer change (e.g. range
+    queries that ended before the immutable_after horizon) never expire.
+    '''
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 ttl: Optional[Duration] = 60,
+                 immutable_after: Optional[Duration] = '1h',
+                 headers: Optional[Iterable[str]] = None):
+        '''
+        Parameters:
+            max_entries (int): The maximal number of cached results
+            ttl (duration): The default time-to-live of an entry. None means no expiry.
+            immutable_after (duration): Results that end this long before now are
+                immutable, and cached with no time-to-live. None disables this.
+            headers (list): The names of the request headers that are part of the
+                cache key. The default uses all the request headers.
+        '''
+        self.max_entries = max_entries
+        self.ttl = parse_duration(ttl) if ttl is not None else None
+        self.immutable_after = parse_duration(immutable_after) if immutable_after is not None else None
+        self.headers = {header.lower() for header in headers} if headers is not None else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, url: str, headers: dict = {}) -> tuple:
+        '''
+        Make a normalized cache key for a request
+        The key does not depend on the order of the query parameters,
+        or on the case of the host name and of the header names.
+
+        Parameters:
+            url (str): The request URL
+            headers (dict): The request headers
+        Returns:
+            key (tuple): The cache key
+        '''
+        parts = urlsplit(url)
+        params = tuple(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        key_headers = tuple(sorted(
+            (name.lower(), value) for name, value in headers.items()
+            if self.headers is None or name.lower() in self.headers))
+        return (parts.scheme.lower(), parts.netloc.lower(), parts.path, params, key_headers)
+
+    def is_immutable(self, end: float) -> bool:
+        '''
+        Is a result that ends at the given time immutable?
+
+        Parameters:
+            end (float): The end of the result time range, in seconds since the epoch
+        Returns:
+            bool: True if the result can be cached with no time-to-live
+        '''
+        if self.immutable_after is None:
+            return False
+        return end < time.time() - self.immutable_after
+
+    def get(self, key: tuple) -> Any:
+        '''
+        Get a cached result
+
+        Parameters:
+            key (tuple): The cache key
+        Returns:
+            data: The cached result, or None
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, data = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: tuple, data: Any, ttl: Optional[float] = None):
+        '''
+        Cache a result
+
+        Parameters:
+            key (tuple): The cache key
+            data: The result
+            ttl (float): The entry time-to-live in seconds. None means no expiry.
+        Returns:
+            None
+        '''
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        '''
+        Remove all the cached results
+        '''
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        '''
+        Get the cache counters
+
+        Returns:
+            stats (dict): hits, misses, evictions, expirations and entries
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+            }
@@ -0,0 +1,327 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from itertools import chain
+import numpy as np
+from typing import Iterable, Optional, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+def import_pandas():
+    '''
+    Import the optional pandas package
+
+    Exceptions:
+        ImportError: If pandas is not installed
+    '''
+    try:
+        import pandas
+    except ImportError as e:
+        raise ImportError("DataFrame output requires pandas: pip install 'promql-http-api[pandas]'") from e
+    return pandas
+
+
+class SeriesBlock:
+    '''
+    A single PromQL result series in columnar form
+
+    Attributes:
+        metric (dict): The series labels
+        timestamps (ndarray): Sample timestamps, in seconds since the epoch
+        values (ndarray): Raw sample values, as returned by Prometheus (str)
+    '''
+
+    __slots__ = ('metric', 'timestamps', 'values')
+
+    def __init__(self, metric: dict, timestamps: np.ndarray, values: np.ndarray):
+        self.metric = metric
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return f'SeriesBlock(metric={self.metric}, samples={len(self)})'
+
+
+class Grid:
+    '''
+    PromQL result series on a dense, step aligned time grid
+
+    Attributes:
+        values (ndarray): 2-D array of sample values (series x timestamps),
+            NaN where a series has no sample
+        timestamps (ndarray): The grid timestamps, in seconds since the epoch
+        metrics (list): The labels of each series (row)
+    '''
+
+    __slots__ = ('values', 'timestamps', 'metrics')
+
+    def __init__(self, values: np.ndarray, timestamps: np.ndarray, metrics: 'list[dict]'):
+        self.values = values
+        self.timestamps = timestamps
+        self.metrics = metrics
+
+    def __repr__(self):
+        return f'Grid(series={self.values.shape[0]}, timestamps={self.values.shape[1]})'
+
+
+def series_from_result(result: dict) -> SeriesBlock:
+    '''
+    Convert a decoded PromQL result element to a SeriesBlock
+
+    Parameters:
+        result (dict): A 'vector' or 'matrix' result element
+    Returns:
+        block (SeriesBlock): The series in columnar form
+    '''
+    samples = result['values'] if 'values' in result else [result['value']]
+    if len(samples) == 0:
+        return SeriesBlock(result['metric'], np.array([]), np.array([], dtype=object))
+    timestamps, values = zip(*samples)
+    return SeriesBlock(result['metric'], np.array(timestamps), np.array(values, dtype=object))
+
+
+def is_float_dtype(dtype) -> bool:
+    '''
+    Can the dtype be parsed in bulk by NumPy as a floating point type?
+    '''
+    try:
+        return np.dtype(dtype).kind == 'f'
+    except TypeError:
+        return False
+
+
+def parse_values(values: np.ndarray, dtype=None):
+    '''
+    Convert raw (str) sample values to the requested dtype
+
+    Floating point dtypes are parsed in bulk, including the "NaN", "+Inf"
+    and "-Inf" values Prometheus uses. Other dtypes are applied per value,
+    like Base.cast() does.
+
+    Parameters:
+        values (ndarray): Raw sample values
+        dtype: The requested dtype. None or str keep the raw values.
+    Returns:
+        values (ndarray or list): The converted values
+    '''
+    if dtype is None or dtype is str:
+        return values
+    if is_float_dtype(dtype):
+        return values.astype(dtype)
+    return [dtype(value) for value in values]
+
+
+def _concatenate(arrays: 'list[np.ndarray]', dtype=None) -> np.ndarray:
+    # Empty series must not affect the inferred dtype of the result
+    arrays = [array for array in arrays if len(array)]
+    if len(arrays) == 0:
+        return np.array([], dtype=dtype)
+    return np.concatenate(arrays)
+
+
+def blocks_to_dataframe(blocks: Iterable[SeriesBlock],
+                        columns: Optional['list[str]'] = None,
+                        dtype=None,
+                        timezone=None,
+                        categorical: bool = False,
+                        timestamp: str = 's') -> 'DataFrame':
+    '''
+    Build a long format DataFrame from PromQL series
+
+    The DataFrame columns are 'timestamp', 'datetime' (only if a timezone
+    is given), the label columns, and 'value'.
+
+    Parameters:
+        blocks (iterable): SeriesBlock objects
+        columns (list): Label columns. Defaults to the labels of the first series
+        dtype: The dtype of the 'value' column. None keeps the raw values (str)
+        timezone (tzinfo): The timezone of the 'datetime' column
+        categorical (bool): Make the label columns pandas Categoricals
+        timestamp (str): The 'timestamp' column format: 's' for seconds since
+            the epoch as returned by Prometheus, 'ms' for int64 milliseconds,
+            or 'datetime64' for datetime64[ns] (UTC)
+    Returns:
+        df (DataFrame): The series as a DataFrame
+    '''
+    if timestamp not in ('s', 'ms', 'datetime64'):
+        raise ValueError(f"Unexpected timestamp format: {timestamp}")
+    metrics = []
+    lengths = []
+    timestamps = []
+    values = []
+    # Timestamps and values are converted one series at a time,
+    # so streamed series do not keep their raw arrays around
+    for block in blocks:
+        metrics.append(block.metric)
+        lengths.append(len(block))
+        timestamps.append(convert_timestamps(block.timestamps, timestamp))
+        values.append(parse_values(block.values, dtype))
+    return columns_to_dataframe(metrics, lengths, concatenate_timestamps(timestamps, timestamp),
+                                concatenate_values(values, dtype), columns, timezone, categorical, timestamp)
+
+
+def convert_timestamps(timestamps: np.ndarray, timestamp: str = 's') -> np.ndarray:
+    '''
+    Convert sample timestamps in seconds to the format of the 'timestamp' column:
+    float seconds for 's', int64 milliseconds for 'ms' and 'datetime64'
+    '''
+    if timestamp == 's':
+        return timestamps
+    return np.rint(timestamps * 1000).astype(np.int64)
+
+
+def concatenate_timestamps(timestamps: 'list[np.ndarray]', timestamp: str = 's') -> np.ndarray:
+    '''
+    Concatenate the converted timestamps of several series
+    '''
+    return _concatenate(timestamps, dtype=np.float64 if timestamp == 's' else np.int64)
+
+
+def concatenate_values(values: list, dtype=None):
+    '''
+    Concatenate the parsed values of several series
+    '''
+    if dtype is None or dtype is str:
+        return _concatenate(values, dtype=object)
+    if is_float_dtype(dtype):
+        return _concatenate(values, dtype=dtype)
+    return list(chain.from_iterable(values))
+
+
+def columns_to_dataframe(metrics: 'list[dict]',
+                         lengths: Sequence[int],
+                         timestamps: np.ndarray,
+                         values,
+                         columns: Optional['list[str]'] = None,
+                         timezone=None,
+                         categorical: bool = False,
+                         timestamp: str = 's') -> 'DataFrame':
+    '''
+    Build a long format DataFrame from the concatenated samples of PromQL series
+    See blocks_to_dataframe()
+
+    Parameters:
+        metrics (list): The labels of each series
+        lengths (sequence): The number of samples of each series
+        timestamps (ndarray): The concatenated timestamps, see convert_timestamps()
+        values (ndarray or list): The concatenated values, see concatenate_values()
+        columns, timezone, categorical, timestamp: See blocks_to_dataframe()
+    Returns:
+        df (DataFrame): The series as a DataFrame
+    '''
+    import_pandas()
+    from pandas import Categorical, DataFrame, Index, to_datetime
+    if not columns:
+        columns = list(metrics[0].keys()) if metrics else []
+
+    names = ['timestamp']
+    arrays: list = [timestamps]
+    if timestamp == 'datetime64':
+        arrays[0] = (timestamps * 1000000).view('datetime64[ns]')
+    if timezone is not None:
+        names.append('datetime')
+        if timestamp == 's':
+            datetimes = to_datetime(timestamps, unit='s', utc=True)
+        else:
+            datetimes = to_datetime(timestamps, unit='ms', utc=True)
+        arrays.append(datetimes.tz_convert(timezone))
+    for column in columns:
+        names.append(column)
+        if categorical:
+            # Dictionary encode the labels per series, then repeat the codes
+            categories: dict = {}
+            codes = np.array([categories.setdefault(metric[column], len(categories)) for metric in metrics],
+                             dtype=np.int32)
+            arrays.append(Categorical.from_codes(np.repeat(codes, lengths), categories=Index(list(categories))))
+        else:
+            labels = np.empty(len(metrics), dtype=object)
+            labels[:] = [metric[column] for metric in metrics]
+            arrays.append(np.repeat(labels, lengths))
+    names.append('value')
+    arrays.append(values)
+
+    # Build by position, label names may collide with the fixed columns
+    df = DataFrame(dict(enumerate(arrays)))
+    df.columns = names
+    return df
+
+
+def blocks_to_grid(blocks: Iterable[SeriesBlock], start_ms: int, step_ms: int, points: int,
+                   dtype=np.float64) -> Grid:
+    '''
+    Place PromQL series on a dense, step aligned time grid
+
+    Parameters:
+        blocks (iterable): SeriesBlock objects
+        start_ms (int): The first grid timestamp in milliseconds
+        step_ms (int): The grid step in milliseconds
+        points (int): The number of grid timestamps
+        dtype: A floating point dtype for the values
+    Returns:
+        grid (Grid): The series on the grid
+    '''
+    rows = []
+    metrics = []
+    for block in blocks:
+        row = np.full(points, np.nan, dtype=dtype)
+        if len(block):
+            offsets = np.rint(block.timestamps.astype(np.float64) * 1000).astype(np.int64) - start_ms
+            index = np.rint(offsets / step_ms).astype(np.int64)
+            valid = (index >= 0) & (index < points)
+            row[index[valid]] = parse_values(block.values[valid], dtype)
+        rows.append(row)
+        metrics.append(block.metric)
+    values = np.vstack(rows) if rows else np.empty((0, points), dtype=dtype)
+    timestamps = (start_ms + np.arange(points, dtype=np.int64) * step_ms) / 1000
+    return Grid(values, timestamps, metrics)
+
+
+def grid_to_dataframe(grid: Grid, columns: Optional['list[str]'] = None, timezone=None) -> 'DataFrame':
+    '''
+    Build a wide format DataFrame from a Grid
+
+    The DataFrame has one row per grid timestamp, indexed by a DatetimeIndex,
+    and one column per series. The column index holds the label values of
+    the series: a MultiIndex for several label columns.
+
+    Parameters:
+        grid (Grid): The series on a time grid
+        columns (list): Label columns. Defaults to all the label names, in order of appearance
+        timezone (tzinfo): The timezone of the index. The default is UTC.
+    Returns:
+        df (DataFrame): The series as a wide DataFrame
+    '''
+    import_pandas()
+    from pandas import DataFrame, Index, MultiIndex, to_datetime
+    if not columns:
+        columns = list(dict.fromkeys(name for metric in grid.metrics for name in metric))
+    index = to_datetime(grid.timestamps, unit='s', utc=True)
+    if timezone is not None:
+        index = index.tz_convert(timezone)
+    index.name = 'datetime'
+    labels = [tuple(metric.get(column, '') for column in columns) for metric in grid.metrics]
+    if len(columns) == 1:
+        column_index = Index([label[0] for label in labels], name=columns[0])
+    elif columns:
+        column_index = MultiIndex.from_tuples(labels, names=columns)
+    else:
+        column_index = Index(range(len(labels)))
+    return DataFrame(grid.values.T, index=index, columns=column_index)
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from typing import Any, Callable, Optional, Union
+
+Decoder = Callable[[bytes], Any]
+
+
+def _json_decoder() -> Decoder:
+    return json.loads
+
+
+def _orjson_decoder() -> Decoder:
+    import orjson
+    return orjson.loads
+
+
+def _simdjson_decoder() -> Decoder:
+    import simdjson  # type: ignore
+    return simdjson.loads
+
+
+decoders = {
+    'json': _json_decoder,
+    'orjson': _orjson_decoder,
+    'simdjson': _simdjson_decoder,
+}
+
+
+def get_decoder(decoder: Optional[Union[str, Decoder]] = None) -> Decoder:
+    '''
+    Get a JSON decoder function
+
+    Parameters:
+        decoder (str or callable): A decoder backend name ('json', 'orjson',
+            'simdjson' or 'auto'), or a callable that decodes a bytes body.
+            The default is the standard library json module.
+            'auto' picks the fastest backend that is installed.
+    Returns:
+        decoder (callable): A function that decodes a bytes body
+    Exceptions:
+        ValueError: If the backend name is unknown
+        ImportError: If the requested backend is not installed
+    '''
+    if decoder is None:
+        return _json_decoder()
+    if callable(decoder):
+        return decoder
+    if decoder == 'auto':
+        for name in ('orjson', 'simdjson'):
+            try:
+                return decoders[name]()
+            except ImportError:
+                pass
+        return _json_decoder()
+    if decoder not in decoders:
+        raise ValueError(f"Unknown JSON decoder: {decoder}")
+    return decoders[decoder]()
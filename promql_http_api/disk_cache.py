@@ -0,0 +1,319 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+from .duration import Duration, parse_duration
+from .merge import merge_matrix
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+
+def _timestamp(ms: int):
+    # Render timestamps like the Prometheus JSON API: whole seconds are integers
+    return ms // 1000 if ms % 1000 == 0 else ms / 1000
+
+
+class DiskCache:
+    '''
+    A persistent on-disk cache of range query results
+
+    Results are stored per query (URL, PromQL query, step and headers) in
+    fixed, step aligned time blocks of block_points points. Each block is
+    a NumPy .npz file holding the series labels and columnar timestamp and
+    value arrays. Only blocks that ended before the immutable_after horizon
+    are stored. Later range queries are served from the stored blocks, and
+    only the missing blocks are fetched from the server.
+
+    The cache directory may be shared by several processes on a host:
+    blocks are written atomically, and eviction is serialized with a lock
+    file. Beyond max_bytes, the least recently used blocks are evicted.
+    The cache size is scanned on the first store, and then kept as a running
+    total of the blocks stored by the process, so that queries do not scan
+    the cache directory. Eviction scans it again when the total exceeds max_bytes.
+    '''
+
+    def __init__(self,
+                 directory: str,
+                 block_points: int = 1440,
+                 max_bytes: int = 1 << 30,
+                 immutable_after: Duration = '1h'):
+        '''
+        Parameters:
+            directory (str): The cache directory
+            block_points (int): The number of steps per block
+            max_bytes (int): The maximal total size of the stored blocks
+            immutable_after (duration): Blocks that end this long before now are stored
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.directory = directory
+        self.block_points = block_points
+        self.max_bytes = max_bytes
+        self.immutable_after = parse_duration(immutable_after)
+        self.hits = 0
+        self.misses = 0
+        # The total size of the blocks: as of the last scan, plus the blocks stored since
+        self._bytes: Optional[int] = None
+        self._bytes_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def query_key(self, url: str, query: str, step_ms: int, headers: dict = {}) -> str:
+        '''
+        Make the cache key of a range query
+
+        Parameters:
+            url (str): The Prometheus server URL
+            query (str): The PromQL query
+            step_ms (int): The query step in milliseconds
+            headers (dict): The request headers
+        Returns:
+            key (str): The cache key
+        '''
+        key = json.dumps([url, query, step_ms, sorted(headers.items())])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def fetch(self,
+              key: str,
+              start_ms: int,
+              end_ms: int,
+              step_ms: int,
+              fetch: Callable[[int, int], Optional['list[dict]']]) -> Optional['list[dict]']:
+        '''
+        Get a range query result from the stored blocks,
+        fetching and storing the missing blocks
+
+        Parameters:
+            key (str): The cache key, see query_key()
+            start_ms (int): The start of the time range, a multiple of the step
+            end_ms (int): The end of the time range
+            step_ms (int): The query step in milliseconds
+            fetch (callable): Fetches the matrix result of a time range (start_ms, end_ms),
+                or returns None on failure
+        Returns:
+            result (list): The matrix result, or None if a fetch failed
+        '''
+        block_ms = self.block_points * step_ms
+        cutoff_ms = (time.time() - self.immutable_after) * 1000
+        blocks: dict = {}
+        missing = []
+        for block in range(start_ms // block_ms, end_ms // block_ms + 1):
+            result = self.load(key, block)
+            if result is None:
+                missing.append(block)
+            else:
+                blocks[block] = result
+
+        for run in _runs(missing):
+            run_start = run[0] * block_ms
+            run_end = (run[-1] + 1) * block_ms - step_ms
+            stored = [block for block in run if (block + 1) * block_ms - step_ms < cutoff_ms]
+            stored_end = (stored[-1] + 1) * block_ms - step_ms if stored else run_start
+            fetched = fetch(run_start, min(run_end, max(end_ms, stored_end)))
+            if fetched is None:
+                return None
+            split = _split_blocks(fetched, block_ms, run)
+            for block in run:
+                blocks[block] = split[block]
+                if block in stored:
+                    self.store(key, block, split[block])
+            if stored and self._over_budget():
+                self.evict()
+
+        result = merge_matrix(blocks[block] for block in sorted(blocks))
+        return _trim(result, start_ms, end_ms)
+
+    def _path(self, key: str, block: int) -> str:
+        return os.path.join(self.directory, key, f'{block}.npz')
+
+    def load(self, key: str, block: int) -> Optional['list[dict]']:
+        '''
+        Load a stored block
+
+        Parameters:
+            key (str): The cache key
+            block (int): The block number
+        Returns:
+            result (list): The matrix result of the block, or None if it is not stored
+        '''
+        import numpy as np
+        path = self._path(key, block)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                metrics = json.loads(str(arrays['metrics']))
+                lengths = arrays['lengths']
+                timestamps = arrays['timestamps'].tolist()
+                values = arrays['values'].tolist()
+            # Mark the block as recently used
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        result = []
+        pos = 0
+        for metric, length in zip(metrics, lengths.tolist()):
+            samples = [[_timestamp(ms), value] for ms, value in
+                       zip(timestamps[pos:pos + length], values[pos:pos + length])]
+            result.append({'metric': metric, 'values': samples})
+            pos += length
+        return result
+
+    def store(self, key: str, block: int, result: 'list[dict]'):
+        '''
+        Store a block
+        The block file is replaced atomically, so concurrent readers
+        see either the previous file or the new one.
+
+        Parameters:
+            key (str): The cache key
+            block (int): The block number
+            result (list): The matrix result of the block
+        Returns:
+            None
+        '''
+        import numpy as np
+        directory = os.path.join(self.directory, key)
+        os.makedirs(directory, exist_ok=True)
+        samples = [sample for series in result for sample in series['values']]
+        arrays: dict = {
+            'metrics': np.array(json.dumps([series['metric'] for series in result])),
+            'lengths': np.array([len(series['values']) for series in result], dtype=np.int64),
+            'timestamps': np.array([round(sample[0] * 1000) for sample in samples], dtype=np.int64),
+            'values': np.array([sample[1] for sample in samples], dtype=str),
+        }
+        path = self._path(key, block)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(file, **arrays)
+            added = os.path.getsize(temp_path) - _getsize(path)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._bytes_lock:
+            if self._bytes is not None:
+                self._bytes += added
+
+    def _over_budget(self) -> bool:
+        # Is the cache above max_bytes, or is its size unknown?
+        with self._bytes_lock:
+            return self._bytes is None or self._bytes > self.max_bytes
+
+    def size(self) -> int:
+        '''
+        Get the total size of the stored blocks in bytes
+        '''
+        return sum(os.path.getsize(path) for path, _ in self._files())
+
+    def _files(self) -> 'list[tuple[str, float]]':
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for block in os.scandir(entry.path):
+                if block.name.endswith('.npz'):
+                    try:
+                        files.append((block.path, block.stat().st_mtime))
+                    except FileNotFoundError:
+                        pass
+        return files
+
+    def evict(self):
+        '''
+        Evict the least recently used blocks, until the cache size is within max_bytes
+        '''
+        with self._lock():
+            files = sorted(self._files(), key=lambda file: file[1])
+            sizes = {}
+            for path, _ in files:
+                try:
+                    sizes[path] = os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+            total = sum(sizes.values())
+            for path, _ in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= sizes.get(path, 0)
+                self.logger.debug(f'evicted {path}')
+            with self._bytes_lock:
+                self._bytes = total
+
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _getsize(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _runs(blocks: 'list[int]') -> 'list[list[int]]':
+    # Group consecutive block numbers
+    runs: 'list[list[int]]' = []
+    for block in blocks:
+        if runs and runs[-1][-1] == block - 1:
+            runs[-1].append(block)
+        else:
+            runs.append([block])
+    return runs
+
+
+def _split_blocks(result: 'list[dict]', block_ms: int, blocks: 'list[int]') -> dict:
+    split: dict = {block: [] for block in blocks}
+    for series in result:
+        parts: dict = {}
+        for sample in series['values']:
+            parts.setdefault(round(sample[0] * 1000) // block_ms, []).append(sample)
+        for block, samples in parts.items():
+            if block in split:
+                split[block].append({'metric': series['metric'], 'values': samples})
+    return split
+
+
+def _trim(result: 'list[dict]', start_ms: int, end_ms: int) -> 'list[dict]':
+    trimmed = []
+    for series in result:
+        samples = [sample for sample in series['values'] if start_ms <= round(sample[0] * 1000) <= end_ms]
+        if samples:
+            trimmed.append({'metric': series['metric'], 'values': samples})
+    return trimmed
@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from datetime import timedelta
+from typing import Union
+
+Duration = Union[str, int, float, timedelta]
+
+_units = {
+    'ms': 0.001,
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800,
+    'y': 31536000,
+}
+_duration = re.compile(r'(\d+)(ms|s|m|h|d|w|y)')
+
+
+def parse_duration(value: Duration) -> float:
+    '''
+    Convert a duration to seconds
+
+    Parameters:
+        value: A Prometheus duration string (e.g. '1h30m'), a number of
+            seconds (as a number or a string), or a timedelta
+    Returns:
+        seconds (float): The duration in seconds
+    Exceptions:
+        ValueError: If the value is not a valid duration
+    '''
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    pos = 0
+    seconds = 0.0
+    for match in _duration.finditer(value):
+        if match.start() != pos:
+            break
+        seconds += int(match.group(1)) * _units[match.group(2)]
+        pos = match.end()
+    if pos == 0 or pos != len(value):
+        raise ValueError(f"Invalid duration: {value}")
+    return seconds
+
+
+def format_duration(seconds: float) -> str:
+    '''
+    Convert a number of seconds to a Prometheus duration string
+
+    Parameters:
+        seconds (float): The duration in seconds
+    Returns:
+        duration (str): The duration, e.g. '1h30m'
+    '''
+    ms = int(round(seconds * 1000))
+    if ms == 0:
+        return '0s'
+    duration = ''
+    for unit in ('y', 'w', 'd', 'h', 'm', 's', 'ms'):
+        unit_ms = int(_units[unit] * 1000)
+        if ms >= unit_ms:
+            duration += f'{ms // unit_ms}{unit}'
+            ms %= unit_ms
+    return duration
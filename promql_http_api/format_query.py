@@ -23,19 +23,32 @@ class FormatQuery(ApiEndpoint):
     Format Query API endpoint class
     '''
 
+    post_supported = True
+
     def __init__(self, url, query, **kwargs):
         super().__init__(url, **kwargs)
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.query = query
 
-    def make_url(self):
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
+        return '/api/v1/format_query'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
         '''
-        Make the URL for the API endpoint
+        Make the query parameters for the API endpoint
 
         Parameters:
             None
         Returns:
-            url (str): The URL for the API endpoint
+            params (list): (name, value) tuples
         '''
         self.logger.debug(f'query = {self.query}')
-        return f'/api/v1/format_query?query={self.query}'
+        return [('query', self.query)]
@@ -0,0 +1,318 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+
+class LatencyTracker:
+    '''
+    A thread-safe record of the recent response latencies of each endpoint
+    '''
+
+    def __init__(self, window: int = 200):
+        '''
+        Parameters:
+            window (int): The number of recent latencies kept per endpoint
+        '''
+        self.window = window
+        self._latencies: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, latency: float):
+        '''
+        Record a response latency of an endpoint, in seconds
+        '''
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.window)
+            latencies.append(latency)
+
+    def count(self, endpoint: str) -> int:
+        '''
+        Get the number of recorded latencies of an endpoint
+        '''
+        with self._lock:
+            return len(self._latencies.get(endpoint, ()))
+
+    def percentile(self, endpoint: str, percentile: float) -> Optional[float]:
+        '''
+        Get a latency percentile of an endpoint
+
+        Parameters:
+            endpoint (str): The endpoint
+            percentile (float): The percentile, between 0 and 100
+        Returns:
+            latency (float): The latency percentile in seconds, or None if no latency was recorded
+        '''
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+
+class Hedging:
+    '''
+    Hedged requests over equivalent Prometheus servers (e.g. HA replicas)
+
+    A request is sent to its own server first. If it has not answered
+    within the hedge delay, a duplicate request goes to the next replica,
+    and the first good response (no exception, HTTP status below 500)
+    wins. A failed response also triggers the next replica right away.
+    The delay is a latency percentile of the first server, so it adapts to
+    its recent behavior. Losing requests are cancelled (asyncio), or closed
+    as soon as their response headers arrive (threads).
+    '''
+
+    def __init__(self,
+                 urls: Sequence[str],
+                 percentile: float = 95,
+                 initial_delay: float = 0.1,
+                 min_delay: float = 0.005,
+                 min_samples: int = 20,
+                 max_hedges: int = 1,
+                 max_workers: int = 32,
+                 tracker: Optional[LatencyTracker] = None):
+        '''
+        Parameters:
+            urls (list): The equivalent Prometheus server URLs
+            percentile (float): The latency percentile of the first server after
+                which a request is hedged
+            initial_delay (float): The hedge delay in seconds, until min_samples
+                latencies were recorded
+            min_delay (float): The minimal hedge delay in seconds
+            min_samples (int): The number of latencies needed to use the percentile
+            max_hedges (int): The maximal number of extra requests per request
+            max_workers (int): The maximal number of concurrent synchronous requests
+            tracker (LatencyTracker): The latency record, e.g. shared between clients
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.urls = [url.rstrip('/') for url in urls]
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.max_workers = max_workers
+        self.tracker = tracker or LatencyTracker()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def candidates(self, url: str) -> 'list[tuple[str, str]]':
+        '''
+        Get the equivalent request URLs on each server, the request's own server first
+
+        Parameters:
+            url (str): The request URL
+        Returns:
+            candidates (list): (server URL, request URL) tuples.
+                Only the request itself if its server is not one of the urls.
+        '''
+        for base in self.urls:
+            if url == base or url.startswith(base + '/') or url.startswith(base + '?'):
+                suffix = url[len(base):]
+                return [(base, url)] + [(other, other + suffix) for other in self.urls if other != base]
+        return [('', url)]
+
+    def delay(self, server: str) -> float:
+        '''
+        Get the current hedge delay of a server, in seconds
+        '''
+        if self.tracker.count(server) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.tracker.percentile(server, self.percentile) or 0.0)
+
+    def execute(self, url: str, send: Callable[[str], Any]) -> Any:
+        '''
+        Execute a request with hedging, in worker threads
+
+        Parameters:
+            url (str): The request URL
+            send (callable): Sends the request to a URL, and returns the response
+        Returns:
+            response: The winning response
+        Exceptions:
+            Any exception of the last attempt, if all of them failed
+        '''
+        candidates = self.candidates(url)
+        if len(candidates) == 1:
+            return send(url)
+        executor = self._get_executor()
+        pending: dict = {}
+        attempts = 0
+        failures: list = []
+        limit = min(len(candidates), self.max_hedges + 1)
+        timeout: Optional[float] = None
+
+        def launch():
+            nonlocal attempts, timeout
+            server, request_url = candidates[attempts]
+            pending[executor.submit(self._timed, send, server, request_url)] = server
+            attempts += 1
+            # Hedge again if this request is slow too
+            timeout = self.delay(server) if attempts < limit else None
+
+        self._count(requests=1)
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Too slow: hedge
+                self.logger.debug(f'hedging {url} after {timeout} seconds')
+                self._count(hedged=1)
+                launch()
+                continue
+            for future in done:
+                server = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                if response.status_code < 500:
+                    if server != candidates[0][0]:
+                        self._count(hedge_wins=1)
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    _close_failures(failures)
+                    return response
+                failures.append(response)
+            if attempts < limit:
+                # Failed: try the next server right away
+                launch()
+        last = failures.pop()
+        _close_failures(failures)
+        if isinstance(last, Exception):
+            raise last
+        return last
+
+    async def aexecute(self, url: str, send: Callable[[str], Awaitable[Any]]) -> Any:
+        '''
+        Asynchronous execute(), the losing requests are cancelled
+
+        Parameters:
+            url (str): The request URL
+            send (callable): Returns an awaitable that sends the request to a URL
+        Returns:
+            response: The winning response
+        Exceptions:
+            Any exception of the last attempt, if all of them failed
+        '''
+        import asyncio
+        candidates = self.candidates(url)
+        if len(candidates) == 1:
+            return await send(url)
+        pending: dict = {}
+        attempts = 0
+        failures: list = []
+        limit = min(len(candidates), self.max_hedges + 1)
+        timeout: Optional[float] = None
+
+        def launch():
+            nonlocal attempts, timeout
+            server, request_url = candidates[attempts]
+            pending[asyncio.ensure_future(self._atimed(send, server, request_url))] = server
+            attempts += 1
+            # Hedge again if this request is slow too
+            timeout = self.delay(server) if attempts < limit else None
+
+        self._count(requests=1)
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.logger.debug(f'hedging {url} after {timeout} seconds')
+                    self._count(hedged=1)
+                    launch()
+                    continue
+                for task in done:
+                    server = pending.pop(task)
+                    if task.exception() is not None:
+                        failures.append(task.exception())
+                        continue
+                    response = task.result()
+                    if response.status_code < 500:
+                        if server != candidates[0][0]:
+                            self._count(hedge_wins=1)
+                        return response
+                    failures.append(response)
+                if attempts < limit:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        if isinstance(failures[-1], BaseException):
+            raise failures[-1]
+        return failures[-1]
+
+    def _timed(self, send: Callable, server: str, url: str):
+        started = time.perf_counter()
+        response = send(url)
+        self.tracker.observe(server, time.perf_counter() - started)
+        return response
+
+    async def _atimed(self, send: Callable, server: str, url: str):
+        started = time.perf_counter()
+        response = await send(url)
+        self.tracker.observe(server, time.perf_counter() - started)
+        return response
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hedging')
+            return self._executor
+
+    def _count(self, requests: int = 0, hedged: int = 0, hedge_wins: int = 0):
+        with self._lock:
+            self.requests += requests
+            self.hedged += hedged
+            self.hedge_wins += hedge_wins
+
+    def stats(self) -> dict:
+        '''
+        Get the hedging counters
+
+        Returns:
+            stats (dict): requests (with more than one candidate server),
+                hedged (extra requests sent on slowness) and hedge_wins
+                (requests answered by another server than their own)
+        '''
+        with self._lock:
+            return {'requests': self.requests, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins}
+
+
+def _close_response(future):
+    # Release the connection of a losing request, without reading its body
+    if future.exception() is None:
+        future.result().close()
+
+
+def _close_failures(failures: list):
+    # Release the connections of the failed responses that are not returned
+    for failure in failures:
+        if not isinstance(failure, BaseException):
+            failure.close()
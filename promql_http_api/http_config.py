@@ -1,2 +1,6 @@
 http_retries: int = 3
 http_backoff: int = 2
+# Prometheus rejects range queries with more points per series
+max_points_per_series: int = 11000
+# Longer request URLs are sent as POST requests, where supported
+post_threshold: int = 4096
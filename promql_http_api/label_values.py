@@ -15,7 +15,10 @@
 # limitations under the License.
 
 import logging
-from .api_endpoint import ApiEndpoint
+from datetime import datetime
+from typing import Optional, Union
+from urllib.parse import quote
+from .api_endpoint import ApiEndpoint, metadata_params
 
 
 class LabelValues(ApiEndpoint):
@@ -23,25 +26,54 @@ class LabelValues(ApiEndpoint):
     LabelValues API endpoint class
     '''
 
-    def __init__(self, url: str, label: str, **kwargs):
+    def __init__(self,
+                 url: str,
+                 label: str,
+                 match: Optional[Union[str, 'list[str]']] = None,
+                 start: Optional[datetime] = None,
+                 end: Optional[datetime] = None,
+                 limit: Optional[int] = None,
+                 **kwargs):
         '''
         LabelValues returns all potential values for a label name.
+
+        Parameters:
+            url (str): The Prometheus server URL
+            label (str): The label name
+            match (str or list): Only return the values of the series matching these selectors
+            start (datetime): The start of the time range
+            end (datetime): The end of the time range
+            limit (int): The maximal number of returned items (Prometheus 2.49 and later)
         '''
         super().__init__(url, **kwargs)
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.label = label
+        self.match = match
+        self.start = start
+        self.end = end
+        self.limit = limit
 
-    def make_url(self):
+    def make_path(self):
         '''
-        Make the URL for the API endpoint
+        Make the URL path for the API endpoint
 
         Parameters:
             None
         Returns:
-            url (str): The URL for the API endpoint
+            path (str): The URL path for the API endpoint
         '''
         if self.label is None:
             return
 
-        url = f'/api/v1/label/{self.label}/values?'
-        return url
+        return f'/api/v1/label/{quote(self.label, safe="")}/values'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
+        '''
+        Make the query parameters for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            params (list): (name, value) tuples
+        '''
+        return metadata_params(self.match, self.start, self.end, self.limit)
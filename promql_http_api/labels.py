@@ -14,7 +14,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .api_endpoint import ApiEndpoint
+import logging
+from datetime import datetime
+from typing import Optional, Union
+from .api_endpoint import ApiEndpoint, metadata_params
 
 
 class Labels(ApiEndpoint):
@@ -22,14 +25,48 @@ class Labels(ApiEndpoint):
     Labels API endpoint class
     '''
 
-    def make_url(self):
+    post_supported = True
+
+    def __init__(self,
+                 url: str,
+                 match: Optional[Union[str, 'list[str]']] = None,
+                 start: Optional[datetime] = None,
+                 end: Optional[datetime] = None,
+                 limit: Optional[int] = None,
+                 **kwargs):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            match (str or list): Only return the labels of the series matching these selectors
+            start (datetime): The start of the time range
+            end (datetime): The end of the time range
+            limit (int): The maximal number of returned items (Prometheus 2.49 and later)
+        '''
+        super().__init__(url, **kwargs)
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.match = match
+        self.start = start
+        self.end = end
+        self.limit = limit
+
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
+        return '/api/v1/labels'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
         '''
-        Make the URL for the API endpoint
+        Make the query parameters for the API endpoint
 
         Parameters:
             None
         Returns:
-            url (str): The URL for the API endpoint
+            params (list): (name, value) tuples
         '''
-        url = '/api/v1/labels?'
-        return url
+        return metadata_params(self.match, self.start, self.end, self.limit)
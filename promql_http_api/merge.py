@@ -0,0 +1,101 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Iterable, Optional, Sequence
+
+
+def series_key(metric: dict) -> tuple:
+    '''
+    A hashable key that identifies a series by its labels
+    '''
+    return tuple(sorted(metric.items()))
+
+
+def merge_matrix(results: Iterable['list[dict]']) -> 'list[dict]':
+    '''
+    Merge matrix results of consecutive time ranges
+
+    Series are matched by their labels. The samples of each series are
+    concatenated in the given order, and samples at or before the last
+    timestamp already merged (e.g. at range boundaries) are dropped.
+    The merged series are sorted by their labels, like Prometheus sorts
+    matrix results, so series that only appear in some of the results
+    are in the same place as in an unsplit query.
+
+    Parameters:
+        results (iterable): 'result' lists of matrix responses, in time order
+    Returns:
+        result (list): The merged 'result' list
+    '''
+    merged: dict = {}
+    for result in results:
+        for series in result:
+            key = series_key(series['metric'])
+            target = merged.get(key)
+            if target is None:
+                merged[key] = {'metric': series['metric'], 'values': list(series['values'])}
+                continue
+            values = target['values']
+            last = values[-1][0] if values else None
+            for value in series['values']:
+                if last is None or value[0] > last:
+                    values.append(value)
+    return [merged[key] for key in sorted(merged)]
+
+
+def deduplicate(result: 'list[dict]', replica_label: Optional[str] = None,
+                ignore_labels: Sequence[str] = ()) -> 'list[dict]':
+    '''
+    Merge the replicas of series in a vector or matrix result
+
+    Series are replicas if their labels are equal, except for the replica
+    label and the ignored labels. The merged series keeps the labels of its
+    primary replica, without the replica label. In matrix results, the
+    primary replica is the one with the most samples, and its gaps are
+    filled with the samples of the other replicas. In vector results, the
+    first replica is kept.
+
+    Parameters:
+        result (list): The 'result' list of a vector or matrix response
+        replica_label (str): The label that tells replicas apart, if any
+        ignore_labels (list): Other labels that are not part of the series identity
+    Returns:
+        result (list): The deduplicated 'result' list
+    '''
+    ignored = set(ignore_labels)
+    if replica_label is not None:
+        ignored.add(replica_label)
+    groups: dict = {}
+    for series in result:
+        key = series_key({name: value for name, value in series['metric'].items() if name not in ignored})
+        groups.setdefault(key, []).append(series)
+    merged = []
+    for replicas in groups.values():
+        if len(replicas) == 1:
+            series = dict(replicas[0])
+        elif 'values' in replicas[0]:
+            primary = max(replicas, key=lambda series: len(series['values']))
+            samples = {sample[0]: sample for sample in primary['values']}
+            for replica in replicas:
+                for sample in replica['values']:
+                    samples.setdefault(sample[0], sample)
+            series = {'metric': primary['metric'], 'values': sorted(samples.values(), key=lambda sample: sample[0])}
+        else:
+            series = dict(replicas[0])
+        if replica_label is not None and replica_label in series['metric']:
+            series['metric'] = {name: value for name, value in series['metric'].items() if name != replica_label}
+        merged.append(series)
+    return merged
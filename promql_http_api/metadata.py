@@ -0,0 +1,268 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+import threading
+from bisect import bisect_left
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Pattern, Union, TYPE_CHECKING
+from .duration import Duration, parse_duration
+from .merge import series_key
+
+if TYPE_CHECKING:
+    from .api import PromqlHttpApi
+
+Matcher = Union[str, Pattern]
+
+# Characters with a special meaning in a regular expression
+_special = set('.^$*+?{}[]\\|()')
+
+
+def literal_prefix(pattern: str) -> str:
+    '''
+    Get the literal prefix of a regular expression
+    Every string fully matching the expression starts with the prefix.
+
+    Parameters:
+        pattern (str): The regular expression
+    Returns:
+        prefix (str): The literal prefix, possibly empty
+    '''
+    if '|' in pattern:
+        return ''
+    prefix = ''
+    for char in pattern:
+        if char in _special:
+            # A quantifier applies to the last literal character
+            if char in '*?{' and prefix:
+                prefix = prefix[:-1]
+            break
+        prefix += char
+    return prefix
+
+
+class MetadataIndex:
+    '''
+    An in-memory index of the series of a Prometheus server
+
+    Loads the series matching some selectors once, with the series API, and
+    answers labels, label values and series lookups locally, from an inverted
+    index (label name -> label value -> series). Label values can be looked
+    up by prefix (e.g. for autocompletion) or by regular expression.
+    refresh() adds the series that appeared in a recent time window.
+    The index is thread-safe.
+    '''
+
+    def __init__(self,
+                 api: 'PromqlHttpApi',
+                 match: Union[str, 'list[str]'] = '{__name__=~".+"}',
+                 start: Optional[datetime] = None,
+                 end: Optional[datetime] = None,
+                 **kwargs):
+        '''
+        Parameters:
+            api (PromqlHttpApi): The API client
+            match (str or list): Series selectors of the indexed series. The default is all the series.
+            start (datetime): The start of the time range of the indexed series
+            end (datetime): The end of the time range of the indexed series
+            kwargs: Passed to the series API calls, e.g. match_batch_size or timeout
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.api = api
+        self.match = match
+        self.start = start
+        self.end = end
+        self.kwargs = kwargs
+        self.loaded_at: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._series: 'list[dict]' = []
+        self._ids: dict = {}
+        self._postings: 'dict[str, dict[str, set]]' = {}
+        self._sorted: dict = {}
+
+    def _fetch(self, start: Optional[datetime], end: Optional[datetime]) -> 'list[dict]':
+        series = self.api.series(self.match, start=start, end=end, **self.kwargs)
+        data = series()
+        if data is None:
+            raise ValueError(f"Series API call failed: {series.response.error_type()}: {series.response.error()}")
+        return data
+
+    def _add(self, series: 'list[dict]') -> int:
+        # Called with the lock held. Returns the number of new series.
+        added = 0
+        for metric in series:
+            key = series_key(metric)
+            if key in self._ids:
+                continue
+            id = len(self._series)
+            self._ids[key] = id
+            self._series.append(metric)
+            for name, value in metric.items():
+                values = self._postings.get(name)
+                if values is None:
+                    values = self._postings[name] = {}
+                    self._sorted.pop(None, None)
+                ids = values.get(value)
+                if ids is None:
+                    ids = values[value] = set()
+                    self._sorted.pop(name, None)
+                ids.add(id)
+            added += 1
+        return added
+
+    def load(self) -> 'MetadataIndex':
+        '''
+        (Re)load the index
+        Executes the series API call with the selectors and time range of the index.
+
+        Parameters:
+            None
+        Returns:
+            self (MetadataIndex): The index
+        Exceptions:
+            ValueError: If the API call fails
+        '''
+        series = self._fetch(self.start, self.end)
+        with self._lock:
+            self._clear()
+            self._add(series)
+            self.loaded_at = self.refreshed_at = datetime.now(timezone.utc)
+        self.logger.debug(f'{len(series)} series loaded')
+        return self
+
+    def refresh(self, window: Duration = '5m') -> int:
+        '''
+        Add the series that were active in a recent time window
+        Only the series of the window are requested, instead of the whole
+        time range of the index. Series are not removed; see load().
+
+        Parameters:
+            window (duration): The time window, up to now. It should cover the time
+                since the last refresh.
+        Returns:
+            added (int): The number of new series
+        Exceptions:
+            ValueError: If the API call fails
+        '''
+        now = datetime.now(timezone.utc)
+        series = self._fetch(now - timedelta(seconds=parse_duration(window)), now)
+        with self._lock:
+            added = self._add(series)
+            self.refreshed_at = now
+        self.logger.debug(f'{added} new series out of {len(series)}')
+        return added
+
+    def __len__(self):
+        return len(self._series)
+
+    def _sorted_values(self, name: Optional[str]) -> 'list[str]':
+        # Called with the lock held: the sorted label names (None) or values of a label, cached until they change
+        values = self._sorted.get(name)
+        if values is None:
+            values = self._sorted[name] = sorted(self._postings if name is None else self._postings.get(name, {}))
+        return values
+
+    @staticmethod
+    def _lookup(values: 'list[str]', prefix: str = '', regex: Optional[Matcher] = None) -> 'list[str]':
+        if regex is not None:
+            pattern = re.compile(regex) if isinstance(regex, str) else regex
+            # The literal prefix does not hold for case insensitive or verbose patterns
+            literal = literal_prefix(pattern.pattern) if not pattern.flags & (re.IGNORECASE | re.VERBOSE) else ''
+            if len(literal) > len(prefix):
+                if not literal.startswith(prefix):
+                    return []
+                prefix = literal
+        if prefix:
+            first = bisect_left(values, prefix)
+            last = first
+            while last < len(values) and values[last].startswith(prefix):
+                last += 1
+            values = values[first:last]
+        if regex is not None:
+            values = [value for value in values if pattern.fullmatch(value)]
+        return list(values)
+
+    def labels(self, prefix: str = '', regex: Optional[Matcher] = None) -> 'list[str]':
+        '''
+        Get the label names, in sorted order
+
+        Parameters:
+            prefix (str): Only return the names starting with the prefix
+            regex (str or Pattern): Only return the names fully matching the regular expression
+        Returns:
+            names (list): The label names
+        '''
+        with self._lock:
+            return self._lookup(self._sorted_values(None), prefix, regex)
+
+    def label_values(self, label: str, prefix: str = '', regex: Optional[Matcher] = None) -> 'list[str]':
+        '''
+        Get the values of a label, in sorted order
+
+        Parameters:
+            label (str): The label name, e.g. '__name__' for the metric names
+            prefix (str): Only return the values starting with the prefix
+            regex (str or Pattern): Only return the values fully matching the regular expression
+        Returns:
+            values (list): The label values
+        '''
+        with self._lock:
+            return self._lookup(self._sorted_values(label), prefix, regex)
+
+    def _ids_matching(self, matchers: 'dict[str, Matcher]') -> set:
+        # Called with the lock held
+        matches = []
+        for name, matcher in matchers.items():
+            values = self._postings.get(name, {})
+            if isinstance(matcher, str):
+                matches.append(values.get(matcher, set()))
+            else:
+                ids: set = set()
+                for value in self._lookup(self._sorted_values(name), regex=matcher):
+                    ids |= values[value]
+                matches.append(ids)
+        if not matches:
+            return set(range(len(self._series)))
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    def series(self, matchers: Optional['dict[str, Matcher]'] = None, **labels: Matcher) -> 'list[dict]':
+        '''
+        Get the series matching all the label matchers
+
+        Parameters:
+            matchers (dict): Label name -> label value (str, equality) or
+                regular expression (compiled Pattern, full match)
+            labels: More label matchers, as keyword arguments
+        Returns:
+            series (list): The labels of the matching series, in order of indexing
+        '''
+        matchers = dict(matchers or {}, **labels)
+        with self._lock:
+            return [self._series[id] for id in sorted(self._ids_matching(matchers))]
+
+    def count(self, matchers: Optional['dict[str, Matcher]'] = None, **labels: Matcher) -> int:
+        '''
+        Count the series matching all the label matchers, see series()
+        '''
+        matchers = dict(matchers or {}, **labels)
+        with self._lock:
+            return len(self._ids_matching(matchers))
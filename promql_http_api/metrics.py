@@ -0,0 +1,209 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from typing import Optional, Sequence
+
+
+class RequestMetrics:
+    '''
+    The latency breakdown and size of one API request
+
+    Durations are in seconds, None where not measured. connect is only
+    measured by the asynchronous API (httpx), and only for requests that
+    open a new connection.
+
+    Attributes:
+        url (str): The request URL
+        method (str): The HTTP method
+        status_code (int): The HTTP status code
+        queue_wait (float): From the submission to an executor (e.g. run_many(),
+            range query shards) to the start of the request
+        connect (float): TCP (and TLS) connection set up
+        ttfb (float): From the start of the request to the response headers
+        download (float): From the response headers to the end of the body
+        bytes (int): The size of the response body
+        decode (float): JSON decoding of the response body
+        conversion (float): Conversion of the results (e.g. to a DataFrame)
+        series (int): The number of result series
+        samples (int): The number of result samples
+    '''
+
+    __slots__ = ('url', 'method', 'status_code', 'queue_wait', 'connect', 'ttfb', 'download', 'bytes',
+                 'decode', 'conversion', 'series', 'samples')
+
+    def __init__(self, url: str, method: str = 'GET'):
+        self.url = url
+        self.method = method
+        self.status_code: Optional[int] = None
+        self.queue_wait: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.download: Optional[float] = None
+        self.bytes: Optional[int] = None
+        self.decode: Optional[float] = None
+        self.conversion: Optional[float] = None
+        self.series: Optional[int] = None
+        self.samples: Optional[int] = None
+
+    def count_results(self, data):
+        '''
+        Set the series and sample counts from PromQL query response data
+        '''
+        if not isinstance(data, dict) or not isinstance(data.get('result'), list):
+            return
+        self.series = len(data['result'])
+        if data.get('resultType') == 'matrix':
+            self.samples = sum(len(result['values']) for result in data['result'])
+        else:
+            self.samples = self.series
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f'RequestMetrics({self.as_dict()})'
+
+
+class Instrumentation:
+    '''
+    The instrumentation callback interface
+    Pass an instance to PromqlHttpApi(instrument=...). Subclasses override
+    the callbacks they need, which may be called from several threads.
+    '''
+
+    def request_done(self, metrics: RequestMetrics):
+        '''
+        Called when a request completed, and its response was downloaded and decoded
+        '''
+        pass
+
+    def conversion_done(self, metrics: RequestMetrics):
+        '''
+        Called when the results of a request were converted (e.g. by to_dataframe())
+        The metrics of merged results (e.g. range query shards) only hold the conversion.
+        '''
+        pass
+
+
+# Default histogram buckets
+duration_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+bytes_buckets = tuple(float(1 << shift) for shift in range(10, 32, 2))
+count_buckets = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def _format(value: float) -> str:
+    # The shortest text that parses back to the same float, without a trailing .0
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+class Histogram:
+    '''
+    A cumulative histogram, in the Prometheus exposition format
+    '''
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def export(self) -> 'list[str]':
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{self.name}_bucket{{le="{_format(bound)}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{self.name}_sum {_format(self.sum)}')
+        lines.append(f'{self.name}_count {self.count}')
+        return lines
+
+
+class MetricsAggregator(Instrumentation):
+    '''
+    Aggregate the request metrics of a client into histograms
+
+    export() renders them in the Prometheus text exposition format, e.g.
+    to be served on a /metrics endpoint of the application.
+    '''
+
+    # (RequestMetrics attribute, metric name suffix, help, buckets)
+    request_metrics = (
+        ('queue_wait', 'queue_wait_seconds', 'Time from submission to the start of the request', duration_buckets),
+        ('connect', 'connect_seconds', 'Connection set up time', duration_buckets),
+        ('ttfb', 'ttfb_seconds', 'Time to the response headers', duration_buckets),
+        ('download', 'download_seconds', 'Response body download time', duration_buckets),
+        ('bytes', 'response_bytes', 'Response body size', bytes_buckets),
+        ('decode', 'decode_seconds', 'Response JSON decoding time', duration_buckets),
+        ('series', 'series', 'Result series per response', count_buckets),
+        ('samples', 'samples', 'Result samples per response', count_buckets),
+    )
+    conversion_metrics = (
+        ('conversion', 'conversion_seconds', 'Result conversion time', duration_buckets),
+    )
+
+    def __init__(self, prefix: str = 'promql_http_api'):
+        '''
+        Parameters:
+            prefix (str): The prefix of the exported metric names
+        '''
+        self.prefix = prefix
+        self.requests: dict = {}
+        self.histograms = {
+            attribute: Histogram(f'{prefix}_{suffix}', help, buckets)
+            for attribute, suffix, help, buckets in self.request_metrics + self.conversion_metrics
+        }
+        self._lock = threading.Lock()
+
+    def request_done(self, metrics: RequestMetrics):
+        self._observe(metrics, self.request_metrics)
+        with self._lock:
+            self.requests[metrics.status_code] = self.requests.get(metrics.status_code, 0) + 1
+
+    def conversion_done(self, metrics: RequestMetrics):
+        self._observe(metrics, self.conversion_metrics)
+
+    def _observe(self, metrics: RequestMetrics, names: tuple):
+        with self._lock:
+            for attribute, *_ in names:
+                value = getattr(metrics, attribute)
+                if value is not None:
+                    self.histograms[attribute].observe(value)
+
+    def export(self) -> str:
+        '''
+        Export the metrics in the Prometheus text exposition format
+
+        Returns:
+            text (str): The exposition text
+        '''
+        name = f'{self.prefix}_requests_total'
+        with self._lock:
+            lines = [f'# HELP {name} Completed requests by HTTP status code', f'# TYPE {name} counter']
+            for code, count in sorted(self.requests.items(), key=lambda item: str(item[0])):
+                lines.append(f'{name}{{code="{code}"}} {count}')
+            for histogram in self.histograms.values():
+                lines.extend(histogram.export())
+        return '\n'.join(lines) + '\n'
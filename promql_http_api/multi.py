@@ -0,0 +1,212 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Mapping, Optional, Sequence, Union, TYPE_CHECKING
+from .api import PromqlHttpApi
+from .api_response import ApiResponse
+from .merge import deduplicate
+from .query import Base, Query, QueryRange
+
+if TYPE_CHECKING:
+    from .columnar import SeriesBlock
+    from pandas import DataFrame
+
+
+class _FanOut(Base):
+    '''
+    Mixin that executes a query on several Prometheus servers, and merges the results
+    '''
+
+    def __init__(self,
+                 endpoints: dict,
+                 *args,
+                 source_label: Optional[str] = None,
+                 dedup: bool = False,
+                 replica_label: Optional[str] = None,
+                 partial_response: bool = False,
+                 max_workers: Optional[int] = None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.endpoints = endpoints
+        self.source_label = source_label
+        self.dedup = dedup or replica_label is not None
+        self.replica_label = replica_label
+        self.partial_response = partial_response
+        self.max_workers = max_workers or len(endpoints)
+        self.errors: dict = {}
+
+    def __call__(self, *args, **kwargs):
+        if self.response is not None:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._call_source, source, args, kwargs) for source in self.endpoints]
+            results = [future.result() for future in futures]
+        return self._merge_sources(results)
+
+    async def acall(self, *args, **kwargs):
+        import asyncio
+        if self.response is not None:
+            return
+        results = await asyncio.gather(*(self._acall_source(source, args, kwargs) for source in self.endpoints))
+        return self._merge_sources(results)
+
+    def iter_series(self, chunk_size: int = 1 << 20) -> Iterator['SeriesBlock']:
+        '''
+        Iterate over the series of the merged results
+        The responses of the servers are not streamed, since the series
+        can only be merged once all of them were received.
+        '''
+        self.__call__()
+        yield from self._result_blocks()
+
+    def _pool_to_dataframe(self) -> Optional['DataFrame']:
+        # The merged results are decoded already
+        return None
+
+    def _call_source(self, source: str, args: tuple, kwargs: dict):
+        try:
+            return self.endpoints[source](*args, **kwargs)
+        except Exception as e:
+            return self._source_failed(source, e)
+
+    async def _acall_source(self, source: str, args: tuple, kwargs: dict):
+        try:
+            return await self.endpoints[source].acall(*args, **kwargs)
+        except Exception as e:
+            return self._source_failed(source, e)
+
+    def _source_failed(self, source: str, error: Exception):
+        if not self.partial_response:
+            raise error
+        self.logger.warning(f'{source}: {error}')
+        self.errors[source] = error
+        return None
+
+    def _merge_sources(self, results: list):
+        merged = {}
+        for (source, endpoint), data in zip(self.endpoints.items(), results):
+            if data is not None:
+                merged[source] = data
+                continue
+            if source in self.errors:
+                continue
+            if not self.partial_response:
+                # Expose the failed server response (status, error)
+                self.response = endpoint.response
+                return None
+            self.logger.warning(f'{source}: {endpoint.response.error_type()}: {endpoint.response.error()}')
+            self.errors[source] = ValueError(f"{endpoint.response.error_type()}: {endpoint.response.error()}")
+        if not merged:
+            self.response = next(iter(self.endpoints.values())).response
+            if self.response is None:
+                raise next(iter(self.errors.values()))
+            return None
+
+        result_types = {data['resultType'] for data in merged.values()}
+        result_type = result_types.pop()
+        if result_types or result_type not in ('vector', 'matrix'):
+            raise ValueError(f"Cannot merge PromQL results of type {result_type}")
+        result = []
+        for source, data in merged.items():
+            for series in data['result']:
+                if self.source_label is not None:
+                    series = dict(series, metric=dict(series['metric'], **{self.source_label: source}))
+                result.append(series)
+        if self.dedup:
+            ignore_labels = [self.source_label] if self.source_label is not None else []
+            result = deduplicate(result, self.replica_label, ignore_labels)
+        url = self.base_url + self.make_url()
+        self.response = ApiResponse.from_data(url, {'resultType': result_type, 'result': result},
+                                              **self.init_kwargs)
+        return self.response.data()
+
+
+class MultiQuery(_FanOut, Query):
+    '''
+    Query API endpoint executed on several Prometheus servers
+    '''
+    pass
+
+
+class MultiQueryRange(_FanOut, QueryRange):
+    '''
+    QueryRange API endpoint executed on several Prometheus servers
+    '''
+    pass
+
+
+class MultiPromqlHttpApi:
+    '''
+    A client of several Prometheus servers (e.g. shards, or HA replica pairs)
+
+    Queries are sent to all the servers concurrently, and their results
+    are merged into one result, which converts to a single DataFrame.
+    '''
+
+    def __init__(self,
+                 urls: Union[Sequence[str], Mapping[str, str]],
+                 source_label: Optional[str] = None,
+                 dedup: bool = False,
+                 replica_label: Optional[str] = None,
+                 partial_response: bool = False,
+                 max_workers: Optional[int] = None,
+                 **kwargs):
+        '''
+        Parameters:
+            urls (list or dict): The Prometheus server URLs, or a dict of
+                source names to URLs. The source name of a URL in a list is the URL.
+            source_label (str): Add a label with the source name to each result series
+            dedup (bool): Merge series with the same labels from different servers
+                (HA replicas), filling the gaps of one replica with the samples of the others
+            replica_label (str): The label that tells HA replicas apart (e.g. 'replica').
+                It is dropped from the merged series. Implies dedup.
+            partial_response (bool): Return the results of the servers that succeeded
+                when others fail, instead of failing the query. The failures are in
+                the 'errors' dict of the endpoint object.
+            max_workers (int): The maximal number of concurrent requests.
+                The default is the number of servers.
+            kwargs: PromqlHttpApi arguments for all the servers (e.g. headers, cache)
+        '''
+        sources = dict(urls) if isinstance(urls, Mapping) else {url: url for url in urls}
+        if not sources:
+            raise ValueError("At least one Prometheus server URL is required")
+        self.apis = {source: PromqlHttpApi(url, **kwargs) for source, url in sources.items()}
+        self.fan_out: dict = {
+            'source_label': source_label,
+            'dedup': dedup,
+            'replica_label': replica_label,
+            'partial_response': partial_response,
+            'max_workers': max_workers,
+        }
+
+    def query(self, *args, **kwargs) -> MultiQuery:
+        '''
+        Get a MultiQuery object
+        '''
+        endpoints = {source: api.query(*args, **dict(kwargs)) for source, api in self.apis.items()}
+        args, kwargs = next(iter(self.apis.values()))._update_(args, kwargs)
+        return MultiQuery(endpoints, *args, **self.fan_out, **kwargs)
+
+    def query_range(self, *args, **kwargs) -> MultiQueryRange:
+        '''
+        Get a MultiQueryRange object
+        '''
+        endpoints = {source: api.query_range(*args, **dict(kwargs)) for source, api in self.apis.items()}
+        args, kwargs = next(iter(self.apis.values()))._update_(args, kwargs)
+        return MultiQueryRange(endpoints, *args, **self.fan_out, **kwargs)
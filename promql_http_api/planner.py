@@ -0,0 +1,332 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+from typing import Any, Generator, Optional, TYPE_CHECKING
+from .api_endpoint import ApiEndpoint
+from .duration import format_duration, parse_duration
+from .http_config import max_points_per_series
+from .label_values import LabelValues
+from .promql import add_matcher, is_label_preserving, regex_matcher, selectors
+from .series import Series
+from .tsdb_status import TsdbStatus
+
+if TYPE_CHECKING:
+    from .query import QueryRange
+
+# Planning steps yield the metadata API endpoints to call, and get back their data,
+# so that the same steps run with synchronous and asynchronous API calls
+Steps = Generator[ApiEndpoint, Any, Any]
+
+
+def _run(steps: Steps) -> Any:
+    try:
+        endpoint = next(steps)
+        while True:
+            try:
+                data = endpoint()
+            except Exception as e:
+                endpoint = steps.throw(e)
+            else:
+                endpoint = steps.send(data)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _arun(steps: Steps, **kwargs) -> Any:
+    try:
+        endpoint = next(steps)
+        while True:
+            try:
+                data = await endpoint.acall(**kwargs)
+            except Exception as e:
+                endpoint = steps.throw(e)
+            else:
+                endpoint = steps.send(data)
+    except StopIteration as stop:
+        return stop.value
+
+
+class QueryBudgetExceeded(ValueError):
+    '''
+    Raised when a query would exceed the series or sample budget of a QueryPlanner
+
+    Attributes:
+        plan (QueryPlan): The plan of the refused query, with its estimates
+    '''
+
+    def __init__(self, message: str, plan: 'QueryPlan'):
+        super().__init__(message)
+        self.plan = plan
+
+
+class QueryPlan:
+    '''
+    The execution plan of a range query, see QueryPlanner
+
+    Attributes:
+        query (str): The PromQL query
+        series (int): The estimated number of series selected by the query
+        exact (bool): False if the series count is a lower bound (e.g. from the TSDB head statistics)
+        points (int): The number of points per series
+        samples (int): The estimated number of samples (series x points)
+        shard_label (str): The label the query is split by, None if it is not split by label
+        queries (list): The queries of the label shards, or the query itself
+        shard_points (int): The number of points per series of a time shard
+        shards (int): The number of requests (label shards x time shards)
+        samples_per_request (int): The estimated number of samples of each request
+        concurrency (int): The number of concurrent requests
+        notes (list): Why the plan was chosen
+    '''
+
+    def __init__(self, query: str, series: int, exact: bool, points: int, step: float):
+        self.query = query
+        self.series = series
+        self.exact = exact
+        self.points = points
+        self.step = step
+        self.samples = series * points
+        self.shard_label: Optional[str] = None
+        self.queries = [query]
+        self.shard_points = max(1, points)
+        self.shards = 1
+        self.samples_per_request = self.samples
+        self.concurrency = 1
+        self.notes: 'list[str]' = []
+
+    @property
+    def time_shards(self) -> int:
+        return math.ceil(self.points / self.shard_points) if self.points else 1
+
+    @property
+    def shard_size(self) -> Optional[str]:
+        '''
+        The time range of a time shard (a duration), None if the time range is not split
+        '''
+        if self.time_shards <= 1:
+            return None
+        return format_duration(self.shard_points * self.step)
+
+    def as_dict(self) -> dict:
+        return {
+            'query': self.query,
+            'series': self.series,
+            'exact': self.exact,
+            'points': self.points,
+            'samples': self.samples,
+            'shard_label': self.shard_label,
+            'label_shards': len(self.queries),
+            'shard_size': self.shard_size,
+            'time_shards': self.time_shards,
+            'shards': self.shards,
+            'samples_per_request': self.samples_per_request,
+            'concurrency': self.concurrency,
+            'notes': self.notes,
+        }
+
+    def __str__(self):
+        series = f'{self.series:,}' if self.exact else f'at least {self.series:,}'
+        lines = [
+            f'query: {self.query}',
+            f'series: {series}, points per series: {self.points:,}, samples: {self.samples:,}',
+            f'label shards: {len(self.queries)}' + (f' by {self.shard_label}' if self.shard_label else ''),
+            f'time shards: {self.time_shards}' + (f' of {self.shard_size}' if self.shard_size else ''),
+            f'requests: {self.shards}, samples per request: {self.samples_per_request:,}, '
+            f'concurrency: {self.concurrency}',
+        ]
+        return '\n'.join(lines + [f'note: {note}' for note in self.notes])
+
+
+class QueryPlanner:
+    '''
+    A cardinality-aware planner of range queries
+
+    Estimates the number of series a range query selects, with the series
+    API (or the TSDB head statistics for plain metric names), and its number
+    of samples. From those, it splits the query into label shards (one query
+    per group of values of a label, e.g. 'instance') and time shards, so that
+    each request stays within a sample budget, and picks how many requests
+    run concurrently. Queries above the series or sample budgets are refused.
+    '''
+
+    def __init__(self,
+                 max_series: Optional[int] = None,
+                 max_samples: Optional[int] = None,
+                 max_series_per_request: int = 50000,
+                 max_samples_per_request: int = 10000000,
+                 max_inflight_samples: int = 50000000,
+                 max_concurrency: int = 8,
+                 shard_label: Optional[str] = 'instance',
+                 use_tsdb_status: bool = True):
+        '''
+        Parameters:
+            max_series (int): Refuse queries that select more series. None for no limit.
+            max_samples (int): Refuse queries that return more samples. None for no limit.
+            max_series_per_request (int): Split queries that select more series by shard_label
+            max_samples_per_request (int): Split the time range of queries so that each request
+                returns fewer samples
+            max_inflight_samples (int): Limit the concurrency, so that the concurrent requests
+                return fewer samples
+            max_concurrency (int): The maximal number of concurrent requests
+            shard_label (str): The label to split queries by. None to never split by label.
+                Only queries that compute each result series from one input series are split
+                (a single selector, no aggregation).
+            use_tsdb_status (bool): Estimate the series of plain metric names with the TSDB
+                head statistics, instead of listing them with the series API
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.max_series = max_series
+        self.max_samples = max_samples
+        self.max_series_per_request = max_series_per_request
+        self.max_samples_per_request = max_samples_per_request
+        self.max_inflight_samples = max_inflight_samples
+        self.max_concurrency = max_concurrency
+        self.shard_label = shard_label
+        self.use_tsdb_status = use_tsdb_status
+
+    def _kwargs(self, query_range: 'QueryRange') -> dict:
+        # The metadata API calls share the client settings of the query, but are not planned or cached on disk
+        return {name: value for name, value in query_range.init_kwargs.items()
+                if name not in ('planner', 'disk_cache', 'conversion_pool')}
+
+    def _head_series(self, query_range: 'QueryRange') -> Steps:
+        # The head series count of the top metric names, empty if the TSDB status is not available
+        status = TsdbStatus(query_range.base_url, **self._kwargs(query_range))
+        try:
+            data = yield status
+        except Exception as e:
+            self.logger.debug(f'TSDB status not available: {e}')
+            return {}
+        if not data:
+            return {}
+        return {item['name']: int(item['value']) for item in data.get('seriesCountByMetricName', [])}
+
+    def estimate_series(self, query_range: 'QueryRange') -> 'tuple[int, bool]':
+        '''
+        Estimate the number of series selected by a range query
+
+        Parameters:
+            query_range (QueryRange): The query
+        Returns:
+            series (int): The sum of the series of the selectors of the query
+            exact (bool): False if the count is a lower bound
+        Exceptions:
+            ValueError: If a series API call fails
+        '''
+        return _run(self._estimate_series(query_range))
+
+    def _estimate_series(self, query_range: 'QueryRange') -> Steps:
+        series = 0
+        exact = True
+        head: Optional[dict] = None
+        limit = self.max_series + 1 if self.max_series is not None else None
+        for selector in dict.fromkeys(selector.text() for selector in selectors(query_range.query)):
+            if self.use_tsdb_status and '{' not in selector:
+                if head is None:
+                    head = yield from self._head_series(query_range)
+                if selector in head:
+                    # Only the head block (recent samples) is counted
+                    series += head[selector]
+                    exact = False
+                    continue
+            endpoint = Series(query_range.base_url, selector, start=query_range.start, end=query_range.end,
+                              limit=limit, **self._kwargs(query_range))
+            data = yield endpoint
+            if data is None:
+                raise ValueError(f"Series API call failed: {endpoint.response.error_type()}: "
+                                 f"{endpoint.response.error()}")
+            series += len(data)
+            if limit is not None and len(data) >= limit:
+                exact = False
+        return series, exact
+
+    def plan(self, query_range: 'QueryRange') -> QueryPlan:
+        '''
+        Plan the execution of a range query
+        Executes metadata API calls only.
+
+        Parameters:
+            query_range (QueryRange): The query
+        Returns:
+            plan (QueryPlan): The plan
+        Exceptions:
+            QueryBudgetExceeded: If the query exceeds the series or sample budget
+            ValueError: If a metadata API call fails
+        '''
+        return _run(self._plan(query_range))
+
+    async def aplan(self, query_range: 'QueryRange', **kwargs) -> QueryPlan:
+        '''
+        Asynchronous plan()
+        The metadata API calls are awaited, with the keyword arguments (e.g. 'client').
+        '''
+        return await _arun(self._plan(query_range), **kwargs)
+
+    def _plan(self, query_range: 'QueryRange') -> Steps:
+        step = parse_duration(query_range.step)
+        start = query_range.start.timestamp()
+        end = query_range.end.timestamp()
+        points = max(0, int((end - start) // step) + 1) if step > 0 else 0
+        series, exact = yield from self._estimate_series(query_range)
+        plan = QueryPlan(query_range.query, series, exact, points, step)
+        if self.max_series is not None and series > self.max_series:
+            raise QueryBudgetExceeded(f"Query selects {'more than ' if not exact else ''}{series:,} series, "
+                                      f"above the budget of {self.max_series:,}: {query_range.query}", plan)
+        if self.max_samples is not None and plan.samples > self.max_samples:
+            raise QueryBudgetExceeded(f"Query returns about {plan.samples:,} samples ({series:,} series x "
+                                      f"{points:,} points), above the budget of {self.max_samples:,}: "
+                                      f"{query_range.query}", plan)
+
+        series_per_request = series
+        if series > self.max_series_per_request:
+            series_per_request = yield from self._split_by_label(query_range, plan)
+        plan.shard_points = max(1, min(max_points_per_series, points,
+                                       self.max_samples_per_request // max(1, series_per_request)))
+        plan.shards = len(plan.queries) * plan.time_shards
+        plan.samples_per_request = series_per_request * min(plan.shard_points, points)
+        plan.concurrency = max(1, min(self.max_concurrency, plan.shards,
+                                      self.max_inflight_samples // max(1, plan.samples_per_request)))
+        self.logger.debug(f'plan: {plan.as_dict()}')
+        return plan
+
+    def _split_by_label(self, query_range: 'QueryRange', plan: QueryPlan) -> Steps:
+        # Returns the estimated number of series per label shard
+        if self.shard_label is None:
+            plan.notes.append('no shard label')
+            return plan.series
+        if not is_label_preserving(query_range.query):
+            plan.notes.append(f'not split by {self.shard_label}: the query aggregates or combines series')
+            return plan.series
+        match = [selector.text() for selector in selectors(query_range.query)]
+        endpoint = LabelValues(query_range.base_url, self.shard_label, match=match, start=query_range.start,
+                               end=query_range.end, **self._kwargs(query_range))
+        values = yield endpoint
+        if not values:
+            plan.notes.append(f'not split by {self.shard_label}: no label values')
+            return plan.series
+        groups = min(len(values), math.ceil(plan.series / self.max_series_per_request))
+        if groups <= 1:
+            return plan.series
+        values = sorted(values)
+        # The first group also matches the series without the label (empty value)
+        plan.queries = []
+        for group in range(groups):
+            group_values = ([''] if group == 0 else []) + values[group::groups]
+            plan.queries.append(add_matcher(query_range.query, regex_matcher(self.shard_label, group_values)))
+        plan.shard_label = self.shard_label
+        plan.notes.append(f'{len(values)} {self.shard_label} values in {groups} groups')
+        return math.ceil(plan.series / groups)
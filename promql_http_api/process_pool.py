@@ -0,0 +1,264 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import pickle
+import threading
+from typing import Any, Callable, Optional, TYPE_CHECKING, cast
+
+# NumPy and multiprocessing are only imported by clients that convert in parallel
+if TYPE_CHECKING:
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+
+# Each element of the 'result' array starts with its labels. The byte sequence
+# cannot occur inside a JSON string, where the quote would be escaped.
+SERIES_START = b'{"metric"'
+WHITESPACE = b' \t\r\n'
+
+
+class ConversionPool:
+    '''
+    A process pool that decodes and converts large query responses in parallel
+
+    The response body is copied once into shared memory, and its 'result'
+    array is split between the worker processes at series boundaries. Each
+    worker decodes its share of the series, and converts their timestamps and
+    values to columnar arrays, which it returns through shared memory too.
+    Only the series labels are pickled.
+    '''
+
+    def __init__(self, max_workers: Optional[int] = None, min_size: int = 32 << 20, mp_context=None):
+        '''
+        Parameters:
+            max_workers (int): The number of worker processes. The default is the number of CPUs.
+            min_size (int): The response size in bytes from which the pool is used.
+                Smaller responses are converted in the calling thread.
+            mp_context: The multiprocessing context of the workers, e.g. multiprocessing.get_context('spawn')
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_size = min_size
+        self.mp_context = mp_context
+        self._executor: Optional['ProcessPoolExecutor'] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def executor(self) -> 'ProcessPoolExecutor':
+        '''
+        Get the process pool, started on first use
+        A forked child process starts its own pool.
+        '''
+        from concurrent.futures import ProcessPoolExecutor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def accepts(self, size: int, dtype, decoder: Optional[Callable[[bytes], Any]] = None) -> bool:
+        '''
+        Should a response be converted in the pool?
+
+        Parameters:
+            size (int): The response size in bytes
+            dtype: The requested dtype of the values. Floating point values are
+                returned through shared memory, and raw (str) values are pickled.
+                Other dtypes are converted in the calling thread.
+            decoder (callable): The JSON decoder. Decoders that cannot be pickled
+                (e.g. lambdas) are not sent to the workers.
+        Returns:
+            bool: True if the response is large enough, and the dtype and decoder are supported
+        '''
+        from .columnar import is_float_dtype
+        if size < self.min_size or not (dtype is None or dtype is str or is_float_dtype(dtype)):
+            return False
+        return decoder is None or _picklable(decoder)
+
+    def convert(self, content: bytes, decoder: Callable[[bytes], Any], dtype=None, timestamp: str = 's'):
+        '''
+        Decode a query response, and convert its series to columnar arrays
+
+        Parameters:
+            content (bytes): The response body
+            decoder (callable): The JSON decoder, e.g. json.loads or orjson.loads
+            dtype: The dtype of the values, see accepts()
+            timestamp (str): The timestamp format, see columnar.convert_timestamps()
+        Returns:
+            envelope (dict): The response body, with an empty 'result' array
+            metrics (list): The labels of each series
+            lengths (list): The number of samples of each series
+            timestamps (ndarray): The concatenated timestamps
+            values (ndarray): The concatenated values
+            None is returned if the body has no 'result' array of series,
+            e.g. for an error response, or if the decoder cannot be pickled.
+            It is then up to the caller to decode it.
+        '''
+        if not _picklable(decoder):
+            self.logger.debug(f'converting in the calling thread: cannot pickle the decoder {decoder!r}')
+            return None
+        from multiprocessing.shared_memory import SharedMemory
+        from .columnar import concatenate_timestamps, concatenate_values
+        bounds = _split(content, self.max_workers)
+        if bounds is None:
+            return None
+        start, end, offsets = bounds
+        envelope = decoder(content[:start] + b'[]' + content[end + 1:])
+        if not isinstance(envelope, dict) or (envelope.get('data') or {}).get('result') != []:
+            return None
+
+        shared = SharedMemory(create=True, size=len(content))
+        try:
+            _buffer(shared)[:len(content)] = content
+            ranges = zip(offsets, offsets[1:] + [end])
+            futures = [self.executor().submit(_convert, shared.name, first, last, decoder, dtype, timestamp)
+                       for first, last in ranges]
+            parts = [future.result() for future in futures]
+        finally:
+            shared.close()
+            shared.unlink()
+        metrics: list = []
+        lengths: list = []
+        timestamps = []
+        values = []
+        try:
+            for part_metrics, part_lengths, part_timestamps, part_values in parts:
+                metrics.extend(part_metrics)
+                lengths.extend(part_lengths)
+                timestamps.append(_attach(part_timestamps))
+                values.append(_attach(part_values) if isinstance(part_values, tuple) else part_values)
+        finally:
+            for part in parts:
+                _release(part[2])
+                if isinstance(part[3], tuple):
+                    _release(part[3])
+        self.logger.debug(f'{len(metrics)} series converted by {len(parts)} workers')
+        return envelope, metrics, lengths, concatenate_timestamps(timestamps, timestamp), \
+            concatenate_values(values, dtype)
+
+    def close(self):
+        '''
+        Shut the worker processes down
+        '''
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+
+def _picklable(obj) -> bool:
+    try:
+        pickle.dumps(obj)
+    except Exception:
+        return False
+    return True
+
+
+def _split(content: bytes, parts: int) -> Optional[tuple]:
+    # Returns the positions of the '[' and ']' of the result array,
+    # and the start offsets of up to 'parts' ranges of series
+    first = content.find(SERIES_START)
+    if first < 0:
+        return None
+    start = len(content[:first].rstrip(WHITESPACE)) - 1
+    if start < 0 or content[start] != ord('['):
+        return None
+    # The end of the array follows the last series
+    import json
+    last = content.rfind(SERIES_START)
+    tail = content[last:].decode()
+    try:
+        _, length = json.JSONDecoder().raw_decode(tail)
+    except ValueError:
+        return None
+    end = last + len(tail[:length].encode())
+    end += len(content[end:]) - len(content[end:].lstrip(WHITESPACE))
+    if end >= len(content) or content[end] != ord(']'):
+        return None
+    offsets = [first]
+    step = (end - first) // parts
+    for part in range(1, parts):
+        offset = content.find(SERIES_START, max(first + part * step, offsets[-1] + 1), end)
+        if offset < 0:
+            break
+        if offset != offsets[-1]:
+            offsets.append(offset)
+    return start, end, offsets
+
+
+def _convert(name: str, start: int, end: int, decoder: Callable[[bytes], Any], dtype, timestamp: str) -> tuple:
+    # Runs in a worker process: decode and convert the series between two offsets of the shared body
+    from multiprocessing.shared_memory import SharedMemory
+    from .columnar import (concatenate_timestamps, concatenate_values, convert_timestamps, is_float_dtype,
+                           parse_values, series_from_result)
+    shared = SharedMemory(name=name)
+    try:
+        chunk = bytes(_buffer(shared)[start:end]).rstrip(WHITESPACE).rstrip(b',')
+    finally:
+        shared.close()
+    metrics = []
+    lengths = []
+    timestamps = []
+    values = []
+    for result in decoder(b'[' + chunk + b']'):
+        block = series_from_result(result)
+        metrics.append(block.metric)
+        lengths.append(len(block))
+        timestamps.append(convert_timestamps(block.timestamps, timestamp))
+        values.append(parse_values(block.values, dtype))
+    all_values = concatenate_values(values, dtype)
+    shared_values = dtype is not None and dtype is not str and is_float_dtype(dtype)
+    return (metrics, lengths, _share(concatenate_timestamps(timestamps, timestamp)),
+            _share(all_values) if shared_values else all_values)
+
+
+def _buffer(shared: 'SharedMemory') -> memoryview:
+    # The buffer is only None after close()
+    return cast(memoryview, shared.buf)
+
+
+def _share(array: 'np.ndarray') -> tuple:
+    # Copy an array to a new shared memory block, owned (unlinked) by the receiver
+    from multiprocessing.shared_memory import SharedMemory
+    shared = SharedMemory(create=True, size=max(1, array.nbytes))
+    try:
+        _buffer(shared)[:array.nbytes] = array.tobytes()
+    finally:
+        shared.close()
+    return shared.name, array.dtype.str, len(array)
+
+
+def _attach(shared_array: tuple) -> 'np.ndarray':
+    import numpy as np
+    from multiprocessing.shared_memory import SharedMemory
+    name, dtype, length = shared_array
+    shared = SharedMemory(name=name)
+    try:
+        return np.frombuffer(_buffer(shared), dtype=dtype, count=length).copy()
+    finally:
+        shared.close()
+
+
+def _release(shared_array: tuple):
+    from multiprocessing.shared_memory import SharedMemory
+    try:
+        shared = SharedMemory(name=shared_array[0])
+    except FileNotFoundError:
+        return
+    shared.close()
+    shared.unlink()
@@ -0,0 +1,337 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+from typing import Iterator, NamedTuple
+
+# Identifiers that are not metric names: keywords, binary operators and number literals
+keywords = {'by', 'without', 'on', 'ignoring', 'group_left', 'group_right', 'offset', 'bool',
+            'and', 'or', 'unless', 'atan2', 'inf', 'nan'}
+# Keywords followed by a label list
+label_list_keywords = {'by', 'without', 'on', 'ignoring', 'group_left', 'group_right'}
+# Aggregation operators, and functions whose result depends on other series than the input series
+aggregations = {'sum', 'min', 'max', 'avg', 'group', 'stddev', 'stdvar', 'count', 'count_values', 'bottomk',
+                'topk', 'quantile', 'limitk', 'limit_ratio', 'absent', 'absent_over_time', 'scalar', 'vector'}
+
+_identifier = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*')
+_space = re.compile(r'(\s|#[^\n]*)*')
+# Hexadecimal, decimal (only signed in the exponent) and duration literals, e.g. 0x1f, 1.5e-3, 1h30m
+_number = re.compile(r'0[xX][0-9a-fA-F]+|([0-9][0-9_]*(\.[0-9_]*)?|\.[0-9][0-9_]*)([eE][+-]?[0-9]+)?[0-9a-zA-Z_]*')
+_aggregation = re.compile(r'\b(' + '|'.join(sorted(aggregations)) + r')\s*(\(|by\b|without\b)', re.IGNORECASE)
+
+
+class Selector(NamedTuple):
+    '''
+    A vector selector in a PromQL expression
+
+    Attributes:
+        start (int): The offset of the selector in the expression
+        end (int): The offset after the selector (and its label matchers)
+        name (str): The metric name, empty if the selector has none
+        matchers (str): The label matchers, between braces, empty if the selector has none
+    '''
+    start: int
+    end: int
+    name: str
+    matchers: str
+
+    def text(self) -> str:
+        return self.name + (f'{{{self.matchers}}}' if self.matchers or not self.name else '')
+
+
+class Call(NamedTuple):
+    '''
+    A function call or aggregation in a PromQL expression
+    '''
+    start: int
+    name: str
+
+
+class Range(NamedTuple):
+    '''
+    The range of a range vector selector or subquery in a PromQL expression,
+    e.g. '5m' for [5m], or '1h:5m' for [1h:5m]
+    '''
+    start: int
+    end: int
+    duration: str
+
+
+def _skip_string(query: str, pos: int) -> int:
+    # Returns the offset after the string literal starting at pos
+    quote = query[pos]
+    pos += 1
+    while pos < len(query):
+        if query[pos] == '\\' and quote != '`':
+            pos += 2
+            continue
+        if query[pos] == quote:
+            return pos + 1
+        pos += 1
+    raise ValueError(f"Unterminated string in PromQL expression: {query}")
+
+
+def _skip_braces(query: str, pos: int) -> int:
+    # Returns the offset after the label matchers starting with '{' at pos
+    pos += 1
+    while pos < len(query):
+        char = query[pos]
+        if char in '"\'`':
+            pos = _skip_string(query, pos)
+            continue
+        if char == '}':
+            return pos + 1
+        pos += 1
+    raise ValueError(f"Unterminated label matchers in PromQL expression: {query}")
+
+
+def _skip_parentheses(query: str, pos: int) -> int:
+    # Returns the offset after the label list starting with '(' at pos
+    end = query.find(')', pos)
+    if end < 0:
+        raise ValueError(f"Unterminated label list in PromQL expression: {query}")
+    return end + 1
+
+
+def _grouping(query: str, pos: int) -> bool:
+    # Is there a 'by' or 'without' grouping at pos?
+    match = _identifier.match(query, pos)
+    return match is not None and match.group().lower() in ('by', 'without')
+
+
+def _tokens(query: str) -> Iterator[tuple]:
+    # Yields the selectors and calls of a PromQL expression, in order
+    pos = 0
+    while pos < len(query):
+        pos = _space.match(query, pos).end()  # type: ignore
+        if pos >= len(query):
+            return
+        char = query[pos]
+        if char in '"\'`':
+            pos = _skip_string(query, pos)
+        elif char == '[':
+            # Range or subquery durations
+            end = query.find(']', pos)
+            if end < 0:
+                raise ValueError(f"Unterminated range in PromQL expression: {query}")
+            yield Range(pos, end + 1, query[pos + 1:end].strip())
+            pos = end + 1
+        elif char == '{':
+            end = _skip_braces(query, pos)
+            yield Selector(pos, end, '', query[pos + 1:end - 1])
+            pos = end
+        elif char.isdigit() or (char == '.' and query[pos + 1:pos + 2].isdigit()):
+            pos = _number.match(query, pos).end()  # type: ignore
+        else:
+            match = _identifier.match(query, pos)
+            if match is None:
+                pos += 1
+                continue
+            name = match.group()
+            after = _space.match(query, match.end()).end()  # type: ignore
+            next_char = query[after:after + 1]
+            if name.lower() in label_list_keywords and next_char == '(':
+                pos = _skip_parentheses(query, after)
+            elif name.lower() in keywords:
+                pos = match.end()
+            elif next_char == '(':
+                yield Call(pos, name)
+                pos = after + 1
+            elif name.lower() in aggregations and _grouping(query, after):
+                # An aggregation with its grouping first, e.g. sum by (job) (x)
+                yield Call(pos, name)
+                pos = after
+            elif next_char == '{':
+                end = _skip_braces(query, after)
+                yield Selector(pos, end, name, query[after + 1:end - 1])
+                pos = end
+            else:
+                yield Selector(pos, match.end(), name, '')
+                pos = match.end()
+
+
+def selectors(query: str) -> 'list[Selector]':
+    '''
+    Find the vector selectors of a PromQL expression
+
+    Parameters:
+        query (str): The PromQL expression
+    Returns:
+        selectors (list): Selector objects, in order of appearance
+    Exceptions:
+        ValueError: If a string, label matchers or a range are not terminated
+    '''
+    return [token for token in _tokens(query) if isinstance(token, Selector)]
+
+
+def calls(query: str) -> 'list[str]':
+    '''
+    Get the names of the functions and aggregation operators called in a PromQL expression
+    '''
+    return [token.name for token in _tokens(query) if isinstance(token, Call)]
+
+
+def quote(value: str) -> str:
+    '''
+    Quote a string for a PromQL expression
+    '''
+    return json.dumps(value, ensure_ascii=False)
+
+
+def regex_matcher(label: str, values: 'list[str]') -> str:
+    '''
+    Make a label matcher for any of several exact label values
+    An empty value also matches the series without the label.
+    '''
+    return f'{label}=~{quote("|".join(re.escape(value) for value in values))}'
+
+
+def add_matcher(query: str, matcher: str) -> str:
+    '''
+    Add a label matcher to all the vector selectors of a PromQL expression
+
+    Parameters:
+        query (str): The PromQL expression
+        matcher (str): The label matcher, e.g. 'instance="host1:9100"'
+    Returns:
+        query (str): The expression with the matcher in each selector
+    '''
+    for selector in reversed(selectors(query)):
+        if selector.matchers.strip():
+            text = f'{selector.name}{{{selector.matchers.rstrip().rstrip(",")}, {matcher}}}'
+        else:
+            text = f'{selector.name}{{{matcher}}}'
+        query = query[:selector.start] + text + query[selector.end:]
+    return query
+
+
+def rewrite_ranges(query: str, minimum: float, functions: 'tuple[str, ...]' = ('rate', 'increase')) -> str:
+    '''
+    Widen the range selectors of some functions to a minimal range
+    At a coarse query step, e.g. rate(x[1m]) evaluated every hour only
+    looks at one minute per hour. Its range is widened, so that the samples
+    between the steps are accounted for.
+
+    Parameters:
+        query (str): The PromQL expression
+        minimum (float): The minimal range in seconds
+        functions (tuple): The functions whose range vector argument is widened
+    Returns:
+        query (str): The expression with the widened ranges
+    '''
+    from .duration import format_duration, parse_duration
+    tokens = list(_tokens(query))
+    ranges = []
+    for call, selector, selected_range in zip(tokens, tokens[1:], tokens[2:]):
+        if not (isinstance(call, Call) and call.name in functions and isinstance(selector, Selector)
+                and isinstance(selected_range, Range)):
+            continue
+        try:
+            duration = parse_duration(selected_range.duration)
+        except ValueError:
+            # A subquery, or a template variable
+            continue
+        if duration < minimum:
+            ranges.append(selected_range)
+    for selected_range in reversed(ranges):
+        query = query[:selected_range.start] + f'[{format_duration(minimum)}]' + query[selected_range.end:]
+    return query
+
+
+# Functions that depend on the evaluation time, rather than on the samples only
+# (predict_linear() extrapolates to the evaluation time)
+time_functions = {'time', 'minute', 'hour', 'day_of_month', 'day_of_week', 'day_of_year', 'days_in_month',
+                  'month', 'year', 'predict_linear'}
+
+
+def at_time(query: str, timestamp: float) -> str:
+    '''
+    Evaluate all the selectors of a PromQL expression at a fixed time, with the @ modifier
+    The expression then has the same result at any evaluation time.
+
+    Parameters:
+        query (str): The PromQL expression
+        timestamp (float): The evaluation time, in seconds since the epoch
+    Returns:
+        query (str): The expression with an @ modifier after each selector (and its range)
+    Exceptions:
+        ValueError: If the expression cannot be evaluated at a fixed time this way: it has
+            @ modifiers or subqueries already, or calls time dependent functions (e.g. time())
+    '''
+    tokens = list(_tokens(query))
+    if any(isinstance(token, Range) and ':' in token.duration for token in tokens):
+        raise ValueError(f"Cannot fix the evaluation time of a subquery: {query}")
+    if any(isinstance(token, Call) and token.name in time_functions for token in tokens):
+        raise ValueError(f"Cannot fix the evaluation time of a time function: {query}")
+    if '@' in ''.join(_code(query[end:start]) for end, start in _gaps(tokens, len(query))):
+        raise ValueError(f"The expression has @ modifiers already: {query}")
+    positions = []
+    for token, following in zip(tokens, tokens[1:] + [None]):
+        if not isinstance(token, Selector):
+            continue
+        if isinstance(following, Range) and not query[token.end:following.start].strip():
+            positions.append(following.end)
+        else:
+            positions.append(token.end)
+    for position in reversed(positions):
+        query = query[:position] + f' @ {timestamp:.3f}' + query[position:]
+    return query
+
+
+def _gaps(tokens: list, length: int) -> 'list[tuple[int, int]]':
+    # The parts of an expression between its selectors and ranges (outside of label matchers).
+    # String literals are never split: they are inside label matchers, or in one part.
+    gaps = []
+    position = 0
+    for token in tokens:
+        if isinstance(token, (Selector, Range)):
+            gaps.append((position, token.start))
+            position = token.end
+    gaps.append((position, length))
+    return gaps
+
+
+def is_label_preserving(query: str) -> bool:
+    '''
+    Does a PromQL expression compute each output series from a single input series?
+    Such an expression can be split by any label (e.g. into one query per instance),
+    and the results of the parts concatenated: the expression has a single
+    selector, and no aggregation or binary operation between series.
+    '''
+    if len(selectors(query)) != 1 or any(name.lower() in aggregations for name in calls(query)):
+        return False
+    # Also look for aggregations in the text, outside of string literals and comments
+    return _aggregation.search(_code(query)) is None
+
+
+def _code(query: str) -> str:
+    # The expression with its string literals emptied and its comments removed
+    parts = []
+    pos = 0
+    while pos < len(query):
+        char = query[pos]
+        if char in '"\'`':
+            end = _skip_string(query, pos)
+            parts.append(char * 2)
+            pos = end
+        elif char == '#':
+            end = query.find('\n', pos)
+            pos = len(query) if end < 0 else end
+        else:
+            parts.append(char)
+            pos += 1
+    return ''.join(parts)
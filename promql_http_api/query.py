@@ -14,13 +14,40 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timezone
 import logging
-from pandas import DataFrame, Timestamp
+import time
 from .api_endpoint import ApiEndpoint
-import pytz
-from typing import Optional
+from .api_response import ApiResponse
+from .cache import ResultCache
+from .duration import Duration, format_duration, parse_duration
+from .http_config import max_points_per_series
+from .merge import merge_matrix
+from .metrics import RequestMetrics
+from typing import Iterator, Optional, TYPE_CHECKING
+
+# NumPy, pandas, pytz and the conversion modules are imported on first use,
+# so that importing the package stays fast for clients that do not convert results
+if TYPE_CHECKING:
+    from pandas import DataFrame
+    from .columnar import Grid, SeriesBlock
+    from .disk_cache import DiskCache
+    from .planner import QueryPlan, QueryPlanner
+    from .streaming import StreamingResultParser
+
+
+def _from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def _utc():
+    try:
+        import pytz
+    except ImportError as e:
+        raise ImportError("DataFrame output requires pytz: pip install 'promql-http-api[pandas]'") from e
+    return pytz.timezone('UTC')
 
 
 class Base(ApiEndpoint):
@@ -35,6 +62,7 @@ class Base(ApiEndpoint):
         self.time_format = "%Y-%m-%dT%H:%M:%S"
         self._schema = None
         self.prom_results = {}
+        self._stream_metrics = None
 
     @property
     def schema(self) -> Optional[dict]:
@@ -45,13 +73,25 @@ class Base(ApiEndpoint):
         self._schema = value
         return self
 
+    def end_time(self) -> Optional[datetime]:
+        '''
+        Get the end of the time range of the query results
+        '''
+        return None
+
+    def cache_ttl(self, cache: ResultCache) -> Optional[float]:
+        end = self.end_time()
+        if end is not None and cache.is_immutable(end.timestamp()):
+            return None
+        return cache.ttl
+
     def cast(self, result):
         if self.schema:
             dtype = self.schema.get('dtype', str)
             result = dtype(result)
         return result
 
-    def to_dataframe(self) -> DataFrame:
+    def to_dataframe(self) -> 'DataFrame':
         '''
         Convert the PromQL query results to a Pandas DataFrame
         Implicitly executes the query if it has not already been executed
@@ -68,70 +108,215 @@ class Base(ApiEndpoint):
         self.prom_results = data['result']
         if len(self.prom_results) == 0:
             raise ValueError("PromQL query response has no results")
-        self.logger.debug(f'prom_results: {self.prom_results}')
+        self.logger.debug('prom_results: %s', self.prom_results)
 
         if self.schema:
-            self.timezone = self.schema.get('timezone', pytz.timezone('UTC'))
+            self.timezone = self.schema.get('timezone', _utc())
 
+        started = time.perf_counter()
         prom_result_type = data['resultType']
         if prom_result_type == 'vector':
-            return self._vector_to_dataframe()
+            df = self._vector_to_dataframe()
         elif prom_result_type == 'matrix':
-            return self._matrix_to_dataframe()
+            df = self._matrix_to_dataframe()
         else:
             raise ValueError(f"Unexpected PromQL result type: {prom_result_type}")
+        self._conversion_done(started)
+        return df
 
-    def _vector_to_dataframe(self) -> DataFrame:
-        records = []
-        columns = self.get_schema_columns()
-        for result in self.prom_results:
-            prom_metric = result['metric']
-            columns = columns if columns else list(prom_metric.keys())
-            record = [prom_metric[column] for column in columns]
-            value = result['value']
-            full_record = self._make_full_record(record, value)
-            records.append(full_record)
-
-        if self.schema_has_timezone():
-            columns = ['timestamp', 'datetime'] + columns + ['value']
-        else:
-            columns = ['timestamp'] + columns + ['value']
-        self.logger.debug(f'columns = {columns}')
-        self.logger.debug(f'records = {records}')
-        df = DataFrame(records, columns=columns)
+    def _pool_to_dataframe(self) -> Optional['DataFrame']:
+        # Execute the query, and convert a large response in the conversion pool, if any.
+        # Returns None if the response is left to to_dataframe(), e.g. if it is too small.
+        pool = self.init_kwargs.get('conversion_pool', None)
+        if pool is None or self.response is not None or self.init_kwargs.get('cache', None) is not None:
+            return None
+        import numpy as np
+        schema = self.schema or {}
+        compact = schema.get('compact', False)
+        dtype = schema.get('dtype', np.float64 if compact else str) if self.schema else None
+        timestamp = schema.get('timestamp', 'ms' if compact else 's')
+        api_kwargs = self.init_kwargs.copy()
+        if self.queued is not None:
+            api_kwargs.setdefault('queued', self.queued)
+        url = self._prepare_request(api_kwargs)
+        self.response = ApiResponse(url, **api_kwargs)
+        content = self.response.content()
+        if content is None or not pool.accepts(len(content), dtype, self.response.decoder):
+            return None
+        started = time.perf_counter()
+        converted = pool.convert(content, self.response.decoder, dtype, timestamp)
+        if converted is None:
+            return None
+        envelope, metrics, lengths, timestamps, values = converted
+        if envelope['status'] != 'success' or envelope['data']['resultType'] not in ('vector', 'matrix'):
+            return None
+        from .columnar import columns_to_dataframe
+        if self.schema:
+            self.timezone = self.schema.get('timezone', _utc())
+        timezone = self.timezone if self.schema_has_timezone() else None
+        df = columns_to_dataframe(metrics, lengths, timestamps, values, self.get_schema_columns(), timezone,
+                                  categorical=schema.get('categorical', compact), timestamp=timestamp)
+        self._conversion_done(started)
+        self.logger.debug('columns = %s', list(df.columns))
         return df
 
-    def _matrix_to_dataframe(self):
-        records = []
-        columns = self.get_schema_columns()
-        for result in self.prom_results:
-            prom_metric = result['metric']
-            columns = columns if columns else list(prom_metric.keys())
-            record = [prom_metric[column] for column in columns]
-            values = result['values']
-            for value in values:
-                full_record = self._make_full_record(record, value)
-                records.append(full_record)
-        if self.schema_has_timezone():
-            columns = ['timestamp', 'datetime'] + columns + ['value']
+    def iter_series(self, chunk_size: int = 1 << 20) -> Iterator['SeriesBlock']:
+        '''
+        Execute the query in streaming mode, and iterate over the result series
+        The response body is read in chunks and parsed incrementally,
+        so only one series is held in memory at a time.
+        Streaming bypasses the response cached by __call__().
+
+        Parameters:
+            chunk_size (int): The HTTP read size in bytes
+        Returns:
+            series (iterator): SeriesBlock objects, one per result series
+        Exceptions:
+            ValueError: If the query fails
+        '''
+        api_kwargs = self.init_kwargs.copy()
+        api_kwargs['stream'] = True
+        url = self._prepare_request(api_kwargs)
+        response = ApiResponse(url, **api_kwargs)
+        try:
+            if not response.http_response_ok():
+                raise ValueError(f"PromQL query failed with HTTP status {response.response.status_code}")
+            from .streaming import StreamingResultParser
+            parser = StreamingResultParser(response.decoder)
+            if response.metrics is None:
+                yield from parser.parse(response.iter_content(chunk_size))
+            else:
+                yield from self._measured_parse(parser, response, response.metrics, chunk_size)
+            envelope = parser.envelope or {}
+            if envelope.get('status') != 'success':
+                raise ValueError(f"PromQL query failed: {envelope.get('errorType')}: {envelope.get('error')}")
+        finally:
+            # Release the connection, also on errors and when the consumer stops early
+            response.response.close()
+
+    def _measured_parse(self, parser: 'StreamingResultParser', response: ApiResponse, metrics: RequestMetrics,
+                        chunk_size: int) -> Iterator['SeriesBlock']:
+        # The download time of a streamed response includes its parsing (and consumption)
+        self._stream_metrics = metrics
+        metrics.bytes = metrics.series = metrics.samples = 0
+        headers = time.perf_counter()
+
+        def chunks():
+            for chunk in response.iter_content(chunk_size):
+                metrics.bytes += len(chunk)
+                yield chunk
+
+        for block in parser.parse(chunks()):
+            metrics.series += 1
+            metrics.samples += len(block)
+            yield block
+        metrics.download = time.perf_counter() - headers
+        response.report()
+
+    def _conversion_done(self, started: float, streamed: bool = False):
+        instrument = self.init_kwargs.get('instrument', None)
+        if instrument is None:
+            return
+        metrics = self._stream_metrics if streamed else self.response.metrics
+        if metrics is None:
+            metrics = RequestMetrics(self.base_url + self.make_url())
+        metrics.conversion = time.perf_counter() - started
+        instrument.conversion_done(metrics)
+
+    def to_arrow(self, schema: Optional[dict] = None, stream: bool = False, chunk_size: int = 1 << 20):
+        '''
+        Convert the PromQL query results to an Apache Arrow table
+        Implicitly executes the query if it has not already been executed.
+        The table is built directly from the parsed series, without pandas.
+
+        Parameters:
+            schema (dict): The table schema. Supports the 'columns', 'dtype'
+                (default float64) and 'timezone' elements.
+            stream (bool): Read and convert the response one series at a time
+            chunk_size (int): The HTTP read size in bytes, in streaming mode
+        Returns:
+            table (pyarrow.Table): 'timestamp', the label columns (dictionary
+                encoded) and 'value'
+        Exceptions:
+            ImportError: If pyarrow is not installed
+            ValueError: If the query fails
+        '''
+        import numpy as np
+        from .arrow import blocks_to_arrow
+        self.schema = schema
+        schema = schema or {}
+        if stream:
+            blocks = self.iter_series(chunk_size)
         else:
-            columns = ['timestamp'] + columns + ['value']
-        df = DataFrame(records, columns=columns)
+            self.__call__()
+            blocks = self._result_blocks()
+        started = time.perf_counter()
+        table = blocks_to_arrow(blocks, self.get_schema_columns(), schema.get('dtype', np.float64),
+                                schema.get('timezone'))
+        self._conversion_done(started, streamed=stream)
+        self.logger.debug('columns = %s', table.column_names)
+        return table
+
+    def to_polars(self, schema: Optional[dict] = None, stream: bool = False, chunk_size: int = 1 << 20):
+        '''
+        Convert the PromQL query results to a Polars DataFrame
+        The DataFrame is built from the Arrow table of to_arrow(); the label
+        columns become Categorical columns.
+
+        Parameters:
+            See to_arrow()
+        Returns:
+            df (polars.DataFrame): The query results as a Polars DataFrame
+        Exceptions:
+            ImportError: If polars or pyarrow are not installed
+            ValueError: If the query fails
+        '''
+        from .arrow import import_polars
+        pl = import_polars()
+        return pl.from_arrow(self.to_arrow(schema, stream, chunk_size))
+
+    def _result_blocks(self) -> Iterator['SeriesBlock']:
+        from .columnar import series_from_result
+        data = self.response.data()
+        if data is None:
+            raise ValueError("No data in PromQL query response")
+        if data['resultType'] not in ('vector', 'matrix'):
+            raise ValueError(f"Unexpected PromQL result type: {data['resultType']}")
+        return (series_from_result(result) for result in data['result'])
+
+    def _stream_to_dataframe(self, chunk_size: int) -> 'DataFrame':
+        if self.schema:
+            self.timezone = self.schema.get('timezone', _utc())
+        started = time.perf_counter()
+        df = self._blocks_to_dataframe(self.iter_series(chunk_size))
+        self._conversion_done(started, streamed=True)
+        if len(df) == 0:
+            raise ValueError("PromQL query response has no results")
         return df
 
-    def _make_full_record(self, partial_record, value):
-        full_record = []
-        timestamp = value[0]
-        result = self.cast(value[1])
-        if self.schema_has_timezone():
-            pd_timestamp = Timestamp(timestamp, unit='s', tz=self.timezone)
-            full_record = [timestamp, pd_timestamp] + partial_record + [result]
-        else:
-            full_record = [timestamp] + partial_record + [result]
+    def _vector_to_dataframe(self) -> 'DataFrame':
+        from .columnar import series_from_result
+        return self._blocks_to_dataframe(series_from_result(result) for result in self.prom_results)
+
+    def _matrix_to_dataframe(self) -> 'DataFrame':
+        from .columnar import series_from_result
+        return self._blocks_to_dataframe(series_from_result(result) for result in self.prom_results)
 
-        self.logger.debug(f'partial_record = {partial_record}')
-        self.logger.debug(f'full_record    = {full_record}')
-        return full_record
+    def _blocks_to_dataframe(self, blocks) -> 'DataFrame':
+        import numpy as np
+        from .columnar import blocks_to_dataframe
+        schema = self.schema or {}
+        compact = schema.get('compact', False)
+        if self.schema:
+            dtype = schema.get('dtype', np.float64 if compact else str)
+        else:
+            dtype = None
+        timezone = self.timezone if self.schema_has_timezone() else None
+        df = blocks_to_dataframe(blocks, self.get_schema_columns(), dtype, timezone,
+                                 categorical=schema.get('categorical', compact),
+                                 timestamp=schema.get('timestamp', 'ms' if compact else 's'))
+        self.logger.debug('columns = %s', list(df.columns))
+        return df
 
     def get_schema_columns(self) -> 'list[str]':
         self.logger.debug(f'schema = {self.schema}')
@@ -156,6 +341,8 @@ class Query(Base):
     Query API endpoint class
     '''
 
+    post_supported = True
+
     def __init__(self,
                  url: str = "",
                  query: str = "",
@@ -173,48 +360,122 @@ class Query(Base):
     def __repr__(self):
         return self.query
 
-    def make_url(self):
+    def end_time(self) -> Optional[datetime]:
+        return self.time
+
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
+        return '/api/v1/query'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
         '''
-        Make the URL for the API endpoint
+        Make the query parameters for the API endpoint
 
         Parameters:
             None
         Returns:
-            url (str): The URL for the API endpoint
+            params (list): (name, value) tuples
         '''
-        url = '/api/v1/query?query=' + str(self.query)
+        params = [('query', str(self.query))]
         if self.time:
-            time_str = str(self.time.timestamp())
-            url += '&time=' + time_str
-        return url
+            params.append(('time', str(self.time.timestamp())))
+        return params
 
     def to_dataframe(self, schema: Optional[dict] = None):
         if self.query is None:
             return None
+        from .columnar import import_pandas
+        import_pandas()
         self.schema = schema
+        df = self._pool_to_dataframe()
+        if df is not None:
+            return df
         self.__call__()
         return super().to_dataframe()
 
+    async def ato_dataframe(self, schema: Optional[dict] = None):
+        '''
+        Asynchronous to_dataframe()
+        '''
+        if self.query is None:
+            return None
+        from .columnar import import_pandas
+        import_pandas()
+        self.schema = schema
+        await self.acall()
+        return super().to_dataframe()
+
 
 class QueryRange(Base):
     '''
     QueryRange API endpoint class
     '''
 
+    post_supported = True
+
     def __init__(self,
                  url: str,
                  query: str,
                  start: datetime,
                  end: datetime,
-                 step: str,
-                 *args, **kwargs):
+                 step: Optional[str] = None,
+                 *args,
+                 shard_size: Optional[Duration] = None,
+                 parallelism: int = 4,
+                 max_points: Optional[int] = None,
+                 width: Optional[int] = None,
+                 scrape_interval: Duration = '15s',
+                 rewrite_ranges: bool = False,
+                 **kwargs):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            query (str): The PromQL query
+            start (datetime): The start of the query time range
+            end (datetime): The end of the query time range
+            step (str): The query resolution step (duration or seconds).
+                With max_points, the minimal step.
+            shard_size (duration): Split longer time ranges into shards of this size,
+                executed concurrently. The default splits only ranges with more points
+                per series than Prometheus accepts in one query.
+            parallelism (int): The maximal number of shards executed concurrently
+            max_points (int): Resolution mode: derive the step from the maximal number of
+                points per series, instead of passing it. The step is a multiple of the
+                scrape interval, and the time range is aligned to the step.
+            width (int): Resolution mode for a chart of this width in pixels (one point per pixel)
+            scrape_interval (duration): The scrape interval of the queried series, in resolution mode
+            rewrite_ranges (bool): Widen the range selectors of rate() and increase() to
+                the step plus the scrape interval, so that no samples are skipped between steps
+        '''
         super().__init__(url, *args, **kwargs)
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        max_points = max_points or width
+        if max_points is not None:
+            from .resolution import align_range, resolution_step
+            seconds = resolution_step(start, end, max_points, scrape_interval, step or 0)
+            start, end = align_range(start, end, seconds)
+            step = format_duration(seconds)
+        elif step is None:
+            raise ValueError("QueryRange requires a step, or max_points")
+        if rewrite_ranges:
+            from .promql import rewrite_ranges as rewrite
+            query = rewrite(query, parse_duration(step) + parse_duration(scrape_interval))
         self.logger.debug(f'query = {query}; start = {start}; end = {end}; step = {step}')
         self.query = query
         self.start = start
         self.end = end
         self.step = step
+        self.shard_size = shard_size
+        self.parallelism = parallelism
+        self.shards: 'list[QueryRange]' = []
+        self.query_plan: Optional['QueryPlan'] = None
 
     def __str__(self):
         return self.query
@@ -222,27 +483,316 @@ class QueryRange(Base):
     def __repr__(self):
         return self.query
 
-    def make_url(self):
+    def end_time(self) -> Optional[datetime]:
+        return self.end
+
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
+        return '/api/v1/query_range'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
         '''
-        Make the URL for the API endpoint
+        Make the query parameters for the API endpoint
 
         Parameters:
             None
         Returns:
-            url (str): The URL for the API endpoint
-        '''
-        start = str(self.start.timestamp())
-        end = str(self.end.timestamp())
-        url = '/api/v1/query_range?query=' + self.query
-        url += '&start=' + start
-        url += '&end=' + end
-        url += '&step=' + self.step
-        self.logger.debug(f'returned url = {url}')
-        return url
-
-    def to_dataframe(self, schema: dict = {}) -> DataFrame:
+            params (list): (name, value) tuples
+        '''
+        params = [
+            ('query', self.query),
+            ('start', str(self.start.timestamp())),
+            ('end', str(self.end.timestamp())),
+            ('step', self.step),
+        ]
+        self.logger.debug(f'params = {params}')
+        return params
+
+    def make_shards(self) -> 'list[QueryRange]':
+        '''
+        Split the query time range into step aligned shards
+        Shards do not overlap, and together evaluate the query at the
+        same timestamps as the whole time range.
+
+        Parameters:
+            None
+        Returns:
+            shards (list): QueryRange objects, one per shard.
+                Empty if the time range is not split.
+        '''
+        try:
+            step_ms = round(parse_duration(self.step) * 1000)
+        except ValueError:
+            return []
+        start_ms = round(self.start.timestamp() * 1000)
+        end_ms = round(self.end.timestamp() * 1000)
+        if step_ms <= 0 or end_ms <= start_ms:
+            return []
+        points = (end_ms - start_ms) // step_ms + 1
+        if self.shard_size is None:
+            shard_points = max_points_per_series
+        else:
+            shard_points = max(1, round(parse_duration(self.shard_size) * 1000) // step_ms)
+        queries = [self.query]
+        if self.query_plan is not None:
+            shard_points = min(shard_points, self.query_plan.shard_points)
+            queries = self.query_plan.queries
+        if points <= shard_points and len(queries) == 1:
+            return []
+
+        shards = []
+        for query in queries:
+            for first in range(0, points, shard_points):
+                last = min(first + shard_points, points) - 1
+                shard = QueryRange(self.base_url, query,
+                                   _from_ms(start_ms + first * step_ms),
+                                   _from_ms(start_ms + last * step_ms),
+                                   self.step, shard_size=self.shard_size, **self._shard_kwargs())
+                shards.append(shard)
+        self.logger.debug(f'{points} points of {len(queries)} queries split into {len(shards)} shards')
+        return shards
+
+    def _shard_kwargs(self, *exclude: str) -> dict:
+        # Shards are planned with their query, not again
+        return {name: value for name, value in self.init_kwargs.items() if name != 'planner' and name not in exclude}
+
+    def plan(self, planner: Optional['QueryPlanner'] = None) -> 'QueryPlan':
+        '''
+        Plan the execution of the query, without executing it
+        The series count is estimated with metadata API calls. The plan
+        (label shards, time shards and concurrency) is applied when the
+        query is executed. Queries created with a planner (the 'planner'
+        argument) are planned implicitly.
+
+        Parameters:
+            planner (QueryPlanner): The planner. Defaults to the planner of the query,
+                or a QueryPlanner with the default settings.
+        Returns:
+            plan (QueryPlan): The plan, also kept in the query_plan attribute
+        Exceptions:
+            QueryBudgetExceeded: If the query exceeds the budgets of the planner
+        '''
+        from .planner import QueryPlanner
+        planner = planner or self.init_kwargs.get('planner', None) or QueryPlanner()
+        self.query_plan = planner.plan(self)
+        self.parallelism = self.query_plan.concurrency
+        return self.query_plan
+
+    async def aplan(self, planner: Optional['QueryPlanner'] = None, **kwargs) -> 'QueryPlan':
+        '''
+        Asynchronous plan()
+        The metadata API calls are awaited, with the keyword arguments (e.g. 'client').
+        '''
+        from .planner import QueryPlanner
+        planner = planner or self.init_kwargs.get('planner', None) or QueryPlanner()
+        self.query_plan = await planner.aplan(self, **kwargs)
+        self.parallelism = self.query_plan.concurrency
+        return self.query_plan
+
+    def _planned(self):
+        if self.query_plan is None and self.init_kwargs.get('planner', None) is not None:
+            self.plan()
+
+    async def _aplanned(self, **kwargs):
+        if self.query_plan is None and self.init_kwargs.get('planner', None) is not None:
+            await self.aplan(**kwargs)
+
+    def __call__(self, *args, **kwargs):
+        if self.response is not None:
+            return
+        self._planned()
+        url, api_kwargs = self._request_args(kwargs)
+        disk_cache = api_kwargs.get('disk_cache', None)
+        if disk_cache is not None and self._aligned():
+            return self._call_disk_cache(disk_cache, url, api_kwargs, args, kwargs)
+        self.shards = self.make_shards()
+        if not self.shards:
+            return super().__call__(*args, **kwargs)
+        data = self._cache_get(url, api_kwargs)
+        if data is not None:
+            return data
+        queued = time.perf_counter()
+        for shard in self.shards:
+            shard.queued = queued
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            futures = [executor.submit(shard, *args, **kwargs) for shard in self.shards]
+            results = [future.result() for future in futures]
+        data = self._merge_shards(results)
+        self._cache_put(url, api_kwargs, data)
+        return data
+
+    async def acall(self, *args, **kwargs):
+        if self.response is not None:
+            return
+        await self._aplanned(**kwargs)
+        self.shards = self.make_shards()
+        if not self.shards:
+            return await super().acall(*args, **kwargs)
+        url, api_kwargs = self._request_args(kwargs)
+        data = self._cache_get(url, api_kwargs)
+        if data is not None:
+            return data
+        import asyncio
+        semaphore = asyncio.Semaphore(self.parallelism)
+        queued = time.perf_counter()
+        for shard in self.shards:
+            shard.queued = queued
+
+        async def run(shard):
+            async with semaphore:
+                return await shard.acall(*args, **kwargs)
+
+        results = await asyncio.gather(*(run(shard) for shard in self.shards))
+        data = self._merge_shards(results)
+        self._cache_put(url, api_kwargs, data)
+        return data
+
+    def _aligned(self) -> bool:
+        # Disk cache blocks are only reusable if the timestamps are on the step grid
+        try:
+            step_ms = round(parse_duration(self.step) * 1000)
+        except ValueError:
+            return False
+        return step_ms > 0 and round(self.start.timestamp() * 1000) % step_ms == 0
+
+    def _call_disk_cache(self, disk_cache: 'DiskCache', url: str, api_kwargs: dict, args: tuple, kwargs: dict):
+        step_ms = round(parse_duration(self.step) * 1000)
+        key = disk_cache.query_key(self.base_url, self.query, step_ms, api_kwargs.get('headers', {}))
+        init_kwargs = self._shard_kwargs('disk_cache')
+        failed = []
+
+        def fetch(start_ms: int, end_ms: int):
+            q = QueryRange(self.base_url, self.query, _from_ms(start_ms), _from_ms(end_ms), self.step,
+                           shard_size=self.shard_size, parallelism=self.parallelism, **init_kwargs)
+            # The missing blocks are split like the whole query (label shards, samples per request)
+            q.query_plan = self.query_plan
+            data = q(*args, **kwargs)
+            if data is None:
+                failed.append(q)
+                return None
+            return data['result']
+
+        result = disk_cache.fetch(key, round(self.start.timestamp() * 1000), round(self.end.timestamp() * 1000),
+                                  step_ms, fetch)
+        if result is None:
+            self.response = failed[0].response
+            return None
+        self.response = ApiResponse.from_data(url, {'resultType': 'matrix', 'result': result}, **api_kwargs)
+        return self.response.data()
+
+    def _request_args(self, kwargs: dict):
+        api_kwargs = self.init_kwargs.copy()
+        api_kwargs.update(kwargs)
+        return self.base_url + self.make_url(), api_kwargs
+
+    def _merge_shards(self, results: list):
+        for shard, data in zip(self.shards, results):
+            if data is None:
+                # Expose the failed shard response (status, error)
+                self.response = shard.response
+                return None
+        result = merge_matrix(data['result'] for data in results)
+        url = self.base_url + self.make_url()
+        self.response = ApiResponse.from_data(url, {'resultType': 'matrix', 'result': result}, **self.init_kwargs)
+        return self.response.data()
+
+    def to_dataframe(self,
+                     schema: dict = {},
+                     stream: bool = False,
+                     chunk_size: int = 1 << 20,
+                     layout: str = 'long') -> 'DataFrame':
+        '''
+        Convert the PromQL query results to a Pandas DataFrame
+        Implicitly executes the query if it has not already been executed
+
+        Parameters:
+            schema (dict): The DataFrame schema
+            stream (bool): Read and convert the response one series at a time,
+                instead of holding the whole response in memory.
+                The time range is not sharded in streaming mode.
+            chunk_size (int): The HTTP read size in bytes, in streaming mode
+            layout (str): 'long' for one row per sample, or 'wide' for one row per
+                timestamp and one column per series (see to_numpy_grid())
+        Returns:
+            df (DataFrame): The query results as a Pandas DataFrame
+        '''
         if self.query is None:
             raise ValueError("Please set the QueryRange::query element to issue a PromQL HTTP API query")
+        if layout not in ('long', 'wide'):
+            raise ValueError(f"Unexpected DataFrame layout: {layout}")
+        from .columnar import import_pandas
+        import_pandas()
         self.schema = schema
+        # The plan decides the shards, and whether the query is executed at all
+        self._planned()
+        if layout == 'wide':
+            from .columnar import grid_to_dataframe, is_float_dtype
+            dtype = schema.get('dtype', 'float64') if schema else 'float64'
+            grid, started = self._to_grid(dtype if is_float_dtype(dtype) else 'float64', stream, chunk_size)
+            timezone = self.schema.get('timezone') if self.schema_has_timezone() else None
+            df = grid_to_dataframe(grid, self.get_schema_columns(), timezone)
+            self._conversion_done(started, streamed=stream)
+            return df
+        if stream:
+            return self._stream_to_dataframe(chunk_size)
+        if self.init_kwargs.get('disk_cache', None) is None and not self.make_shards():
+            pooled = self._pool_to_dataframe()
+            if pooled is not None:
+                return pooled
         self.__call__()
         return super().to_dataframe()
+
+    def to_numpy_grid(self, dtype='float64', stream: bool = False, chunk_size: int = 1 << 20) -> 'Grid':
+        '''
+        Get the PromQL query results as a dense, step aligned 2-D array
+        Implicitly executes the query if it has not already been executed
+
+        Parameters:
+            dtype: A floating point dtype for the values
+            stream (bool): Read and convert the response one series at a time
+            chunk_size (int): The HTTP read size in bytes, in streaming mode
+        Returns:
+            grid (Grid): The values (series x timestamps, NaN for missing samples),
+                the grid timestamps, and the labels of each series
+        '''
+        grid, started = self._to_grid(dtype, stream, chunk_size)
+        self._conversion_done(started, streamed=stream)
+        return grid
+
+    def _to_grid(self, dtype, stream: bool, chunk_size: int) -> 'tuple[Grid, float]':
+        # Returns the grid, and the start time of the conversion
+        from .columnar import blocks_to_grid, series_from_result
+        start_ms = round(self.start.timestamp() * 1000)
+        step_ms = round(parse_duration(self.step) * 1000)
+        points = max(0, (round(self.end.timestamp() * 1000) - start_ms) // step_ms + 1)
+        if stream:
+            blocks = self.iter_series(chunk_size)
+        else:
+            self.__call__()
+            data = self.response.data()
+            if data is None:
+                raise ValueError("No data in PromQL query response")
+            if data['resultType'] != 'matrix':
+                raise ValueError(f"Unexpected PromQL result type: {data['resultType']}")
+            blocks = (series_from_result(result) for result in data['result'])
+        started = time.perf_counter()
+        return blocks_to_grid(blocks, start_ms, step_ms, points, dtype), started
+
+    async def ato_dataframe(self, schema: dict = {}) -> 'DataFrame':
+        '''
+        Asynchronous to_dataframe()
+        '''
+        if self.query is None:
+            raise ValueError("Please set the QueryRange::query element to issue a PromQL HTTP API query")
+        from .columnar import import_pandas
+        import_pandas()
+        self.schema = schema
+        await self.acall()
+        return super().to_dataframe()
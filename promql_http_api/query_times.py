@@ -0,0 +1,299 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import reduce
+from typing import Iterator, NamedTuple, Optional, Sequence, Union, TYPE_CHECKING
+from .api_response import ApiResponse
+from .duration import format_duration
+from .promql import at_time
+from .query import Base, Query, QueryRange, _from_ms
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+    from .columnar import SeriesBlock
+
+# The label that tells apart the evaluation times of a batched instant query
+time_label = '__query_time__'
+
+
+class TimeGrid(NamedTuple):
+    '''
+    Evaluation times on a regular grid, fetched with one range query
+    '''
+    start: int
+    end: int
+    step: int
+
+
+def group_times(times: Sequence[int], max_waste: float = 2.0, min_run: int = 3) -> 'tuple[list[TimeGrid], list[int]]':
+    '''
+    Group evaluation times into the range queries that evaluate them
+    If the times are on one regular grid, with few grid points that are not wanted,
+    they are fetched with a single range query. Otherwise, each run of at least min_run
+    evenly spaced times is fetched with a range query, and the other times are left over.
+
+    Parameters:
+        times (list): The evaluation times in milliseconds since the epoch
+        max_waste (float): The maximal ratio of the grid points to the wanted times,
+            for a single range query
+        min_run (int): The minimal number of evenly spaced times of a range query
+    Returns:
+        grids (list): TimeGrid tuples, in milliseconds
+        leftovers (list): The times that are not on any grid
+    '''
+    times = sorted(set(times))
+    if len(times) < 2:
+        return [], times
+    step = reduce(math.gcd, (b - a for a, b in zip(times, times[1:])))
+    if (times[-1] - times[0]) // step + 1 <= max_waste * len(times):
+        return [TimeGrid(times[0], times[-1], step)], []
+    grids, leftovers = [], []
+    i = 0
+    while i < len(times):
+        j = i + 1
+        while j + 1 < len(times) and times[j + 1] - times[j] == times[i + 1] - times[i]:
+            j += 1
+        if j < len(times) and j - i + 1 >= min_run:
+            grids.append(TimeGrid(times[i], times[j], times[i + 1] - times[i]))
+            i = j + 1
+        else:
+            leftovers.append(times[i])
+            i += 1
+    return grids, leftovers
+
+
+def _ms(time: Union[datetime, float]) -> int:
+    if isinstance(time, datetime):
+        return round(time.timestamp() * 1000)
+    return round(float(time) * 1000)
+
+
+class QueryTimes(Base):
+    '''
+    An instant query evaluated at many times, with few requests
+
+    The evaluation times are fetched with range queries where they are evenly spaced
+    (see group_times()). The other times are batched into instant queries, where each
+    time is set with @ modifiers. The results are the same as the ones of one Query
+    per evaluation time, in the order of the times.
+    '''
+
+    post_supported = True
+
+    def __init__(self,
+                 url: str,
+                 query: str,
+                 times: Sequence[Union[datetime, float]],
+                 *args,
+                 max_waste: float = 2.0,
+                 min_run: int = 3,
+                 batch_size: int = 20,
+                 parallelism: int = 4,
+                 **kwargs):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            query (str): The PromQL query
+            times (list): The evaluation times, as datetimes or seconds since the epoch
+            max_waste (float): Fetch all the times with one range query if the step grid
+                that covers them has at most this many points per wanted time
+            min_run (int): The minimal number of evenly spaced times of a range query
+            batch_size (int): The maximal number of times of a batched instant query
+            parallelism (int): The maximal number of concurrent requests
+            kwargs: Passed to the Query and QueryRange objects, e.g. headers
+        '''
+        # The requests are cached by the Query and QueryRange objects
+        self.result_cache = kwargs.pop('cache', None)
+        super().__init__(url, *args, **kwargs)
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.query = query
+        self.times = [_ms(time) for time in times]
+        self.max_waste = max_waste
+        self.min_run = min_run
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+        self.requests: 'list[Base]' = []
+
+    def __str__(self):
+        return self.query
+
+    def __repr__(self):
+        return self.query
+
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
+        return '/api/v1/query'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
+        '''
+        Make the query parameters for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            params (list): (name, value) tuples
+        '''
+        return [('query', str(self.query))]
+
+    def make_requests(self) -> 'list[Base]':
+        '''
+        Make the Query and QueryRange objects that evaluate the query at all the times
+
+        Parameters:
+            None
+        Returns:
+            requests (list): Query and QueryRange objects
+        '''
+        return [request for request, _ in self._plan()]
+
+    def _plan(self) -> 'list[tuple[Base, Optional[list[int]]]]':
+        # (request, times) tuples. The times of a range query are the wanted times on its grid,
+        # and the times of a batched instant query are indexed by its time label.
+        grids, leftovers = group_times(self.times, self.max_waste, self.min_run)
+        kwargs = self.init_kwargs.copy()
+        if self.result_cache is not None:
+            kwargs['cache'] = self.result_cache
+        plan: 'list[tuple[Base, Optional[list[int]]]]' = [
+            (QueryRange(self.base_url, self.query, _from_ms(grid.start), _from_ms(grid.end),
+                        format_duration(grid.step / 1000), parallelism=self.parallelism, **kwargs), None)
+            for grid in grids]
+        for i in range(0, len(leftovers), self.batch_size):
+            batch = leftovers[i:i + self.batch_size]
+            query = self._batch_query(batch) if len(batch) > 1 else None
+            if query is None:
+                plan.extend((Query(self.base_url, self.query, _from_ms(time), **kwargs), [time]) for time in batch)
+            else:
+                plan.append((Query(self.base_url, query, _from_ms(batch[-1]), **kwargs), batch))
+        return plan
+
+    def _batch_query(self, times: 'list[int]') -> Optional[str]:
+        # One instant query for several times: each time is set with @ modifiers and a label
+        try:
+            queries = [at_time(self.query, time / 1000) for time in times]
+        except ValueError as e:
+            self.logger.debug('no batched instant query: %s', e)
+            return None
+        return ' or '.join(f'label_replace({query}, "{time_label}", "{i}", "", "")'
+                           for i, query in enumerate(queries))
+
+    def end_time(self) -> Optional[datetime]:
+        return _from_ms(max(self.times)) if self.times else None
+
+    def __call__(self, *args, **kwargs):
+        if self.response is not None:
+            return
+        plan = self._plan()
+        self.requests = [request for request, _ in plan]
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            futures = [executor.submit(request, *args, **kwargs) for request in self.requests]
+            results = [future.result() for future in futures]
+        return self._merge(plan, results)
+
+    async def acall(self, *args, **kwargs):
+        if self.response is not None:
+            return
+        import asyncio
+        plan = self._plan()
+        self.requests = [request for request, _ in plan]
+        semaphore = asyncio.Semaphore(self.parallelism)
+
+        async def run(request):
+            async with semaphore:
+                return await request.acall(*args, **kwargs)
+
+        results = await asyncio.gather(*(run(request) for request in self.requests))
+        return self._merge(plan, results)
+
+    def _merge(self, plan: list, results: list):
+        # Assemble the vector of each time, and concatenate them in the order of the times
+        wanted = set(self.times)
+        vectors: 'dict[int, list]' = {time: [] for time in wanted}
+        for (request, times), data in zip(plan, results):
+            if data is None:
+                # Expose the failed request response (status, error)
+                self.response = request.response
+                return None
+            if data['resultType'] == 'matrix':
+                for series in data['result']:
+                    for value in series['values']:
+                        time = round(float(value[0]) * 1000)
+                        if time in wanted:
+                            vectors[time].append({'metric': series['metric'], 'value': value})
+            elif data['resultType'] != 'vector':
+                raise ValueError(f"Unexpected PromQL result type: {data['resultType']}")
+            elif len(times) == 1:
+                vectors[times[0]].extend(data['result'])
+            else:
+                for sample in data['result']:
+                    metric = sample['metric'].copy()
+                    time = times[int(metric.pop(time_label))]
+                    vectors[time].append({'metric': metric, 'value': [time / 1000, sample['value'][1]]})
+        result = [sample for time in self.times for sample in vectors[time]]
+        url = self.base_url + self.make_url()
+        self.response = ApiResponse.from_data(url, {'resultType': 'vector', 'result': result}, **self.init_kwargs)
+        return self.response.data()
+
+    def to_dataframe(self, schema: Optional[dict] = None) -> 'DataFrame':
+        '''
+        Convert the query results at all the times to a Pandas DataFrame
+        Implicitly executes the query if it has not already been executed
+
+        Parameters:
+            schema (dict): The DataFrame schema, see Query.to_dataframe()
+        Returns:
+            df (DataFrame): The rows of each time, in the order of the times
+        '''
+        from .columnar import import_pandas
+        import_pandas()
+        self.schema = schema
+        self.__call__()
+        return super().to_dataframe()
+
+    async def ato_dataframe(self, schema: Optional[dict] = None) -> 'DataFrame':
+        '''
+        Asynchronous to_dataframe()
+        '''
+        from .columnar import import_pandas
+        import_pandas()
+        self.schema = schema
+        await self.acall()
+        return super().to_dataframe()
+
+    def iter_series(self, chunk_size: int = 1 << 20) -> Iterator['SeriesBlock']:
+        '''
+        Iterate over the result samples, one single sample block per series and time
+        The results are assembled from several responses, so they are not streamed.
+
+        Parameters:
+            chunk_size (int): Unused
+        Returns:
+            series (iterator): SeriesBlock objects
+        Exceptions:
+            ValueError: If the query fails
+        '''
+        self.__call__()
+        return self._result_blocks()
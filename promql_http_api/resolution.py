@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from datetime import datetime
+from .duration import Duration, parse_duration
+
+
+def resolution_step(start: datetime, end: datetime, max_points: int, scrape_interval: Duration = '15s',
+                    min_step: Duration = 0) -> float:
+    '''
+    Get the finest query step that returns at most max_points points per series
+    The step is a multiple of the scrape interval: a finer step would only
+    repeat samples.
+
+    Parameters:
+        start (datetime): The start of the time range
+        end (datetime): The end of the time range
+        max_points (int): The maximal number of points per series (at least 2), e.g. the width of a chart in pixels
+        scrape_interval (duration): The scrape interval of the queried series
+        min_step (duration): The minimal step
+    Returns:
+        step (float): The step in seconds
+    Exceptions:
+        ValueError: If max_points is less than 2
+    '''
+    if max_points < 2:
+        raise ValueError(f"max_points must be at least 2: {max_points}")
+    scrape_ms = max(1, round(parse_duration(scrape_interval) * 1000))
+    span_ms = max(0, round((end.timestamp() - start.timestamp()) * 1000))
+    # The aligned time range may span one step more, hence max_points - 1 intervals
+    step_ms = max(span_ms / (max_points - 1), parse_duration(min_step) * 1000, scrape_ms)
+    return math.ceil(step_ms / scrape_ms) * scrape_ms / 1000
+
+
+def align_range(start: datetime, end: datetime, step: float) -> 'tuple[datetime, datetime]':
+    '''
+    Align a time range to multiples of the step
+    The evaluation timestamps of aligned range queries do not move while the
+    time range slides by less than a step, which makes their results cacheable.
+
+    Parameters:
+        start (datetime): The start of the time range
+        end (datetime): The end of the time range
+        step (float): The step in seconds
+    Returns:
+        start, end (datetime): The aligned time range
+    '''
+    step_ms = round(step * 1000)
+    start_ms = round(start.timestamp() * 1000) // step_ms * step_ms
+    end_ms = round(end.timestamp() * 1000) // step_ms * step_ms
+    # Naive datetimes stay naive (local time), like the timestamps of the query
+    return (datetime.fromtimestamp(start_ms / 1000, tz=start.tzinfo),
+            datetime.fromtimestamp(end_ms / 1000, tz=end.tzinfo))
@@ -15,8 +15,12 @@
 # limitations under the License.
 
 import logging
-from typing import Optional
-from .api_endpoint import ApiEndpoint
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Union
+from .api_endpoint import ApiEndpoint, metadata_params
+from .api_response import ApiResponse
+from .merge import series_key
 
 
 class Series(ApiEndpoint):
@@ -24,32 +28,108 @@ class Series(ApiEndpoint):
     Series API endpoint class
     '''
 
+    post_supported = True
+
     def __init__(
             self,
             url: str,
-            match: Optional[str] = None,
+            match: Optional[Union[str, 'list[str]']] = None,
+            match_batch_size: int = 100,
+            parallelism: int = 4,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            limit: Optional[int] = None,
             **kwargs):  # type: ignore
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            match (str or list): Series selectors
+            match_batch_size (int): Longer selector lists are split into batches
+                of this size, executed concurrently
+            parallelism (int): The maximal number of batches executed concurrently
+            start (datetime): The start of the time range
+            end (datetime): The end of the time range
+            limit (int): The maximal number of returned items (Prometheus 2.49 and later)
+        '''
         super().__init__(url, **kwargs)
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.match = match
+        self.match_batch_size = match_batch_size
+        self.parallelism = parallelism
+        self.start = start
+        self.end = end
+        self.limit = limit
 
-    def make_url(self):
+    def make_path(self):
         '''
-        Make the URL for the API endpoint
+        Make the URL path for the API endpoint
 
         Parameters:
             None
         Returns:
-            url (str): The URL for the API endpoint
+            path (str): The URL path for the API endpoint
         '''
-        url = '/api/v1/series?'
+        return '/api/v1/series'
 
+    def make_params(self) -> 'list[tuple[str, str]]':
+        '''
+        Make the query parameters for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            params (list): (name, value) tuples
+        '''
         self.logger.debug(f'match = {self.match}')
-        if isinstance(self.match, str):
-            url += f'match[]={self.match}'
-        elif isinstance(self.match, list):
-            url += 'match[]='
-            url += '&match[]='.join(self.match)
-        else:
+        if not isinstance(self.match, (str, list)):
             raise Exception('match is required')
-        return url
+        return metadata_params(self.match, self.start, self.end, self.limit)
+
+    def make_batches(self) -> 'list[Series]':
+        '''
+        Split the series selectors into batches
+
+        Parameters:
+            None
+        Returns:
+            batches (list): Series objects, one per batch.
+                Empty if the selectors are not split.
+        '''
+        if not isinstance(self.match, list) or len(self.match) <= self.match_batch_size:
+            return []
+        return [
+            Series(self.base_url, self.match[i:i + self.match_batch_size],
+                   match_batch_size=self.match_batch_size, start=self.start, end=self.end, limit=self.limit,
+                   **self.init_kwargs)
+            for i in range(0, len(self.match), self.match_batch_size)
+        ]
+
+    def __call__(self, *args, **kwargs):
+        url = self.base_url + self.make_url()
+        if self.response is not None:
+            return
+        batches = self.make_batches()
+        if not batches:
+            return super().__call__(*args, **kwargs)
+        api_kwargs = self.init_kwargs.copy()
+        api_kwargs.update(kwargs)
+        data = self._cache_get(url, api_kwargs)
+        if data is not None:
+            return data
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            futures = [executor.submit(batch, *args, **kwargs) for batch in batches]
+            results = [future.result() for future in futures]
+        for batch, result in zip(batches, results):
+            if result is None:
+                # Expose the failed batch response (status, error)
+                self.response = batch.response
+                return None
+        # A series may match selectors of several batches
+        merged = {series_key(series): series for result in results for series in result}
+        data = list(merged.values())
+        if self.limit is not None:
+            # Each batch returns up to limit series
+            data = data[:self.limit]
+        self.response = ApiResponse.from_data(url, data, **api_kwargs)
+        self._cache_put(url, api_kwargs, data)
+        return data
@@ -0,0 +1,154 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    '''
+    Coalesce identical in-flight requests into a single call ("single flight")
+
+    The first caller of a key (the leader) executes the call. Callers of
+    the same key that arrive while it is in flight wait for it, and get
+    the same result, or the same exception. The key is forgotten once the
+    call completes, so later callers execute a new call.
+    Works with threads (do) and with asyncio tasks (ado).
+    '''
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url: str, form: Optional[list] = None, headers: dict = {}, decoder: Any = None) -> tuple:
+        '''
+        Make a normalized key for a request
+        The key does not depend on the order of the parameters, on whether
+        they are sent in the URL or as a POST form, or on the case of the host
+        name and of the header names.
+
+        Parameters:
+            url (str): The request URL
+            form (list): The POST form parameters, or None
+            headers (dict): The request headers
+            decoder: The response decoder
+        Returns:
+            key (tuple): The request key
+        '''
+        parts = urlsplit(url)
+        params = parse_qsl(parts.query, keep_blank_values=True) + list(form or [])
+        key_headers = tuple(sorted((name.lower(), value) for name, value in headers.items()))
+        return (parts.scheme.lower(), parts.netloc.lower(), parts.path, tuple(sorted(params)), key_headers, decoder)
+
+    def do(self, key: tuple, fn: Callable[[], Any]) -> Any:
+        '''
+        Execute a call, or wait for the identical call in flight
+
+        Parameters:
+            key (tuple): The request key
+            fn (callable): Executes the call
+        Returns:
+            result: The result of the call
+        Exceptions:
+            Any exception raised by the call
+        '''
+        with self._lock:
+            call: Optional[_Call] = self._calls.get(key)
+            if call is None:
+                leader = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if call is not None:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            leader.result = fn()
+        except BaseException as e:
+            leader.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            leader.done.set()
+        return leader.result
+
+    async def ado(self, key: tuple, fn: Callable[[], Awaitable[Any]]) -> Any:
+        '''
+        Asynchronous do()
+        The call runs in its own task, so cancelling one of the callers does
+        not cancel the call for the others. Calls are coalesced per event loop.
+
+        Parameters:
+            key (tuple): The request key
+            fn (callable): Returns an awaitable that executes the call
+        Returns:
+            result: The result of the call
+        Exceptions:
+            Any exception raised by the call
+        '''
+        import asyncio
+        loop_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(loop_key)
+            if task is None:
+                task = self._tasks[loop_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._forget(loop_key))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, loop_key: tuple):
+        with self._lock:
+            del self._tasks[loop_key]
+
+    def in_flight(self) -> int:
+        '''
+        Get the number of calls in flight
+        '''
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
+
+    def stats(self) -> dict:
+        '''
+        Get the coalescing counters
+
+        Returns:
+            stats (dict): calls (executed), coalesced (callers that shared a call) and in_flight
+        '''
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls) + len(self._tasks),
+            }
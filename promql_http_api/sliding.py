@@ -0,0 +1,158 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+from datetime import datetime, timezone
+from typing import Optional, TYPE_CHECKING
+from .duration import Duration, parse_duration
+from .query import QueryRange
+
+if TYPE_CHECKING:
+    from pandas import DataFrame, Series
+
+
+class SlidingQueryRange:
+    '''
+    A range query over a sliding time window, refreshed incrementally
+
+    The first refresh() executes the query over the whole window. Later
+    refreshes only fetch the step aligned tail since the last refresh
+    (plus an overlap for late samples), merge it into the previous result,
+    and drop the samples that fell out of the window.
+    '''
+
+    def __init__(self,
+                 url: str,
+                 query: str,
+                 window: Duration,
+                 step: str,
+                 overlap: Optional[Duration] = None,
+                 schema: Optional[dict] = None,
+                 **kwargs):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            query (str): The PromQL query
+            window (duration): The time window length
+            step (str): The query resolution step
+            overlap (duration): How far back before the last refresh to fetch again,
+                to pick up late samples. The default is two steps.
+            schema (dict): The DataFrame schema, see QueryRange.to_dataframe()
+            kwargs: Passed to the QueryRange objects, e.g. headers
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.base_url = url
+        self.query = query
+        self.step = step
+        self.schema = schema or {}
+        self.init_kwargs = kwargs
+        # Tail requests are unique, and would only evict useful cache entries
+        self.init_kwargs.pop('cache', None)
+        self.step_ms = round(parse_duration(step) * 1000)
+        self.window_ms = round(parse_duration(window) * 1000) // self.step_ms * self.step_ms
+        overlap_ms = round(parse_duration(overlap) * 1000) if overlap is not None else 2 * self.step_ms
+        self.overlap_ms = math.ceil(overlap_ms / self.step_ms) * self.step_ms
+        self.end_ms: Optional[int] = None
+        self.frame: Optional['DataFrame'] = None
+
+    def __str__(self):
+        return self.query
+
+    def __repr__(self):
+        return self.query
+
+    def refresh(self, now: Optional[datetime] = None) -> 'DataFrame':
+        '''
+        Bring the result up to date
+
+        Parameters:
+            now (datetime): The end of the window. The default is the current time.
+        Returns:
+            df (DataFrame): The query results in the current window
+        Exceptions:
+            ValueError: If the query fails
+        '''
+        now = now or datetime.now(timezone.utc)
+        end_ms = round(now.timestamp() * 1000) // self.step_ms * self.step_ms
+        start_ms = end_ms - self.window_ms
+        if self.frame is None or self.frame.empty or self.end_ms is None:
+            fetch_ms = start_ms
+        else:
+            fetch_ms = max(self.end_ms - self.overlap_ms, start_ms)
+        self.logger.debug(f'window: [{start_ms}, {end_ms}]; fetching from {fetch_ms}')
+
+        tail = self._fetch(fetch_ms, end_ms)
+        if self.frame is None or self.frame.empty:
+            self.frame = tail
+        else:
+            timestamps_ms = self._timestamps_ms(self.frame)
+            keep = (timestamps_ms >= start_ms) & (timestamps_ms < fetch_ms)
+            if tail.empty:
+                self.frame = self.frame[keep].reset_index(drop=True)
+            else:
+                self.frame = self._concat(self.frame[keep], tail)
+        self.end_ms = end_ms
+        return self.frame
+
+    @property
+    def dataframe(self) -> Optional['DataFrame']:
+        '''
+        The query results as of the last refresh
+        '''
+        return self.frame
+
+    def _timestamps_ms(self, frame: 'DataFrame') -> 'Series':
+        # The 'timestamp' column in milliseconds, in any of the formats of the schema
+        timestamps = frame['timestamp']
+        timestamp = self.schema.get('timestamp', 'ms' if self.schema.get('compact', False) else 's')
+        if timestamp == 'datetime64':
+            return timestamps.dt.as_unit('ms').astype('int64')
+        if timestamp == 'ms':
+            return timestamps
+        return (timestamps * 1000).round()
+
+    def _concat(self, frame: 'DataFrame', tail: 'DataFrame') -> 'DataFrame':
+        # Categorical label columns keep their dtype, with the union of the categories
+        import numpy as np
+        from pandas import CategoricalDtype, concat
+        from pandas.api.types import union_categoricals
+        categorical = [column for column in frame.columns
+                       if isinstance(frame[column].dtype, CategoricalDtype) and column in tail.columns
+                       and isinstance(tail[column].dtype, CategoricalDtype)]
+        merged = concat([frame, tail], ignore_index=True)
+        for column in categorical:
+            merged[column] = union_categoricals([frame[column], tail[column]], ignore_order=True)
+        # Rows stay grouped by series (in order of first appearance) and in time order within each series
+        labels = [column for column in merged.columns if column not in ('timestamp', 'value')]
+        if labels:
+            series = merged.groupby(labels, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        else:
+            series = np.zeros(len(merged), dtype='int64')
+        order = np.lexsort((self._timestamps_ms(merged).to_numpy(), series))
+        return merged.take(order).reset_index(drop=True)
+
+    def _fetch(self, start_ms: int, end_ms: int) -> 'DataFrame':
+        start = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)
+        end = datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)
+        q = QueryRange(self.base_url, self.query, start, end, self.step, **self.init_kwargs)
+        data = q()
+        if data is None:
+            raise ValueError(f"PromQL query failed: {q.response.error_type()}: {q.response.error()}")
+        if len(data['result']) == 0:
+            from pandas import DataFrame
+            return DataFrame()
+        return q.to_dataframe(self.schema)
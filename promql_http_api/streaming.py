@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import Iterable, Iterator, Optional
+from .columnar import SeriesBlock, series_from_result
+from .decoders import Decoder, get_decoder
+
+# Structural characters that matter when looking for the end of a series
+_structure = re.compile(rb'[{}\[\]"]')
+# A complete JSON string, with escapes
+_string = re.compile(rb'"(?:[^"\\]|\\.)*"')
+# A run of complete [<timestamp>, "<value>"] samples, skipped in one step
+_samples = re.compile(rb'(?:\[\s*[-+0-9.eE]+\s*,\s*"[^"\\]*"\s*\]\s*,?\s*)+')
+# The start of the result array in the response envelope
+_result_start = re.compile(rb'"result"\s*:\s*\[')
+_whitespace = b' \t\r\n,'
+
+
+class StreamingResultParser:
+    '''
+    Incremental parser for PromQL query and query_range responses
+
+    Reads the response body chunk by chunk and yields the elements of the
+    'result' array one series at a time, so only one series is held in
+    memory at a time. The rest of the response (status, resultType,
+    warnings) is available in the envelope attribute once the body is
+    fully parsed.
+    '''
+
+    def __init__(self, decoder: Optional[Decoder] = None):
+        self.decoder = get_decoder(decoder)
+        self.envelope: Optional[dict] = None
+        self._buffer = bytearray()
+        self._prefix = b''
+        self._in_result = False
+        self._done = False
+        # Scan state of the series currently being read
+        self._start = -1
+        self._pos = 0
+        self._depth = 0
+
+    @property
+    def result_type(self) -> Optional[str]:
+        if self.envelope is None:
+            return None
+        return self.envelope.get('data', {}).get('resultType')
+
+    def parse(self, chunks: Iterable[bytes]) -> Iterator[SeriesBlock]:
+        '''
+        Parse a response body
+
+        Parameters:
+            chunks (iterable): The response body, in chunks of bytes
+        Returns:
+            series (iterator): SeriesBlock objects, one per result series
+        Exceptions:
+            ValueError: If the body is not a valid PromQL API response
+        '''
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        self.close()
+
+    def feed(self, chunk: bytes) -> Iterator[SeriesBlock]:
+        '''
+        Parse the next chunk of the response body
+
+        Parameters:
+            chunk (bytes): The next chunk of the response body
+        Returns:
+            series (iterator): The series completed by this chunk
+        '''
+        self._buffer += chunk
+        if not self._in_result and not self._done:
+            match = _result_start.search(self._buffer)
+            if match is None:
+                return
+            self._prefix = bytes(self._buffer[:match.end() - 1])
+            del self._buffer[:match.end()]
+            self._in_result = True
+        while self._in_result:
+            result = self._next_result()
+            if result is None:
+                break
+            yield series_from_result(self.decoder(result))
+
+    def close(self):
+        '''
+        Finish parsing, after the last chunk was fed
+
+        Exceptions:
+            ValueError: If the body ended in the middle of the result array
+        '''
+        if self._in_result:
+            raise ValueError("Truncated PromQL API response")
+        if not self._done:
+            # No result array, e.g. an error response
+            self.envelope = self.decoder(bytes(self._buffer))
+        else:
+            self.envelope = self.decoder(self._prefix + b'[]' + bytes(self._buffer))
+        self._buffer = bytearray()
+
+    def _next_result(self) -> Optional[bytes]:
+        buffer = self._buffer
+        if self._start < 0:
+            # Skip to the next series, or the end of the result array
+            pos = 0
+            while pos < len(buffer) and buffer[pos] in _whitespace:
+                pos += 1
+            if pos == len(buffer):
+                del buffer[:pos]
+                return None
+            if buffer[pos] == ord(']'):
+                del buffer[:pos + 1]
+                self._in_result = False
+                self._done = True
+                return None
+            if buffer[pos] != ord('{'):
+                raise ValueError("Only vector and matrix results can be streamed")
+            self._start = self._pos = pos
+            self._depth = 0
+
+        pos = self._pos
+        while True:
+            match = _structure.search(buffer, pos)
+            if match is None:
+                self._pos = len(buffer)
+                return None
+            pos = match.start()
+            char = buffer[pos]
+            if char == ord('"'):
+                string = _string.match(buffer, pos)
+                if string is None:
+                    # Incomplete string, wait for more data
+                    self._pos = pos
+                    return None
+                pos = string.end()
+                continue
+            if char == ord('['):
+                samples = _samples.match(buffer, pos)
+                if samples is not None:
+                    pos = samples.end()
+                    continue
+            if char in b'{[':
+                self._depth += 1
+            else:
+                self._depth -= 1
+            pos += 1
+            if self._depth == 0:
+                result = bytes(buffer[self._start:pos])
+                del buffer[:pos]
+                self._start = -1
+                self._pos = 0
+                return result
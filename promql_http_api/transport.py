@@ -0,0 +1,231 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import threading
+import weakref
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Transport:
+    '''
+    A thread-safe, fork-safe HTTP connection pool
+
+    Owns a requests.Session whose connections are kept alive and reused per host.
+    Each PromqlHttpApi gets its own Transport, which may be shared between clients
+    by passing it explicitly. After os.fork() the child process gets a new session
+    on first use, instead of sharing the sockets of its parent.
+    '''
+
+    _default: Optional['Transport'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self,
+                 pool_maxsize: Optional[int] = None,
+                 pool_connections: int = 10,
+                 max_connections: Optional[int] = None,
+                 keep_alive: bool = True,
+                 pool_block: bool = False):
+        '''
+        Parameters:
+            pool_maxsize (int): The number of connections kept alive per host.
+                Connections beyond it are opened and discarded after use,
+                unless pool_block is set. The default is 10, grown by run_many()
+                to its number of workers; an explicit size is never grown.
+            pool_connections (int): The number of hosts that have a pool
+            max_connections (int): The maximum number of concurrent requests over all hosts.
+                Additional requests wait for a free slot. None for no limit.
+            keep_alive (bool): Reuse connections between requests. If False,
+                every connection is closed after its response.
+            pool_block (bool): Wait for an idle connection when the pool of a host
+                is exhausted, instead of opening a connection that is discarded afterwards
+        '''
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else 10
+        # A size chosen by the user (or a blocking pool, which caps the connections) is not grown
+        self.fixed_size = pool_maxsize is not None or pool_block
+        self.pool_connections = pool_connections
+        self.max_connections = max_connections
+        self.keep_alive = keep_alive
+        self.pool_block = pool_block
+        self._slots = threading.BoundedSemaphore(max_connections) if max_connections else None
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._waits = 0
+        self._adapter: Optional[HTTPAdapter] = None
+        self._session = self._new_session()
+        self._pid = os.getpid()
+        _transports.add(self)
+
+    @classmethod
+    def default(cls) -> 'Transport':
+        '''
+        Get the process-wide transport of the API endpoints that are created
+        without a PromqlHttpApi client
+        '''
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def _new_adapter(self) -> HTTPAdapter:
+        return HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                           pool_block=self.pool_block)
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        self._adapter = self._new_adapter()
+        session.mount('http://', self._adapter)
+        session.mount('https://', self._adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        '''
+        The requests.Session of the current process
+        '''
+        if self._pid != os.getpid():
+            self._reinit()
+        return self._session
+
+    def _reinit(self):
+        # The sockets of the parent process are left alone: closing them from
+        # the child could interfere with the requests of the parent.
+        # The locks are replaced too, since a thread of the parent may have held them.
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections) if self.max_connections else None
+        self._requests = self._in_flight = self._max_in_flight = self._waits = 0
+        self._session = self._new_session()
+        self._pid = os.getpid()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        '''
+        Send an HTTP request over the pooled connections
+
+        Parameters:
+            method (str): The HTTP method
+            url (str): The URL
+            kwargs: Passed to requests.Session.request()
+        Returns:
+            response (requests.Response): The HTTP response
+        '''
+        session = self.session
+        slots = self._slots
+        if slots is not None and not slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            slots.acquire()
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if slots is not None:
+                slots.release()
+
+    def grow(self, size: int):
+        '''
+        Grow the connection pool of each host
+        Allows up to 'size' concurrent connections per host to be reused.
+        The pool is never shrunk, and pools whose size was chosen explicitly
+        (pool_maxsize or pool_block) are left alone. A larger adapter replaces
+        the one of the transport, so the other settings of the session (e.g.
+        verify, auth, adapters mounted by the caller) are kept.
+
+        Parameters:
+            size (int): The connection pool size per host
+        Returns:
+            None
+        '''
+        session = self.session
+        with self._lock:
+            if self.fixed_size or size <= self.pool_maxsize:
+                return
+            self.logger.debug(f'Growing the connection pool from {self.pool_maxsize} to {size} per host')
+            self.pool_maxsize = size
+            old = self._adapter
+            self._adapter = self._new_adapter()
+            for prefix, adapter in list(session.adapters.items()):
+                if adapter is old:
+                    session.mount(prefix, self._adapter)
+            # Idle connections are closed now, and connections in use when they are released
+            if old is not None:
+                old.close()
+
+    def stats(self) -> dict:
+        '''
+        Get the utilization of the connection pool, for tuning
+
+        Returns:
+            stats (dict): 'requests' sent, 'in_flight' requests, 'max_in_flight' requests,
+                'waits' for a free slot under max_connections, and 'pools' by host with
+                their 'maxsize', 'connections' opened, 'idle' connections and 'requests' sent.
+                Opened connections above maxsize were discarded because the pool was full.
+        '''
+        session = self.session
+        with self._lock:
+            stats: dict = {
+                'requests': self._requests,
+                'in_flight': self._in_flight,
+                'max_in_flight': self._max_in_flight,
+                'waits': self._waits,
+                'pools': {},
+            }
+        adapters = {id(adapter): adapter for adapter in session.adapters.values() if isinstance(adapter, HTTPAdapter)}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                idle = list(pool.pool.queue) if pool.pool is not None else []
+                stats['pools'][f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                    'maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+                    'connections': pool.num_connections,
+                    'idle': sum(1 for connection in idle if connection is not None),
+                    'requests': pool.num_requests,
+                }
+        return stats
+
+    def close(self):
+        '''
+        Close all pooled connections
+        '''
+        self._session.close()
+
+
+_transports: 'weakref.WeakSet[Transport]' = weakref.WeakSet()
+
+
+def _after_fork():
+    Transport._default_lock = threading.Lock()
+    for transport in list(_transports):
+        transport._reinit()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Optional
+from .api_endpoint import ApiEndpoint
+
+
+class TsdbStatus(ApiEndpoint):
+    '''
+    TsdbStatus API endpoint class
+    Cardinality statistics of the head block of the Prometheus TSDB
+    (the most recent samples), e.g. the series count of the top metric names
+    '''
+
+    def __init__(self, url: str, limit: Optional[int] = None, **kwargs):
+        '''
+        Parameters:
+            url (str): The Prometheus server URL
+            limit (int): The number of items of each top list (10 by default)
+        '''
+        super().__init__(url, **kwargs)
+        self.limit = limit
+
+    def make_path(self):
+        '''
+        Make the URL path for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            path (str): The URL path for the API endpoint
+        '''
+        return '/api/v1/status/tsdb'
+
+    def make_params(self) -> 'list[tuple[str, str]]':
+        '''
+        Make the query parameters for the API endpoint
+
+        Parameters:
+            None
+        Returns:
+            params (list): (name, value) tuples
+        '''
+        if self.limit is None:
+            return []
+        return [('limit', str(self.limit))]
@@ -0,0 +1,89 @@
+import json
+import sys
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients close the connections of cancelled requests (e.g. losing hedges) early
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakePrometheus:
+    '''
+    A minimal local stand-in for a Prometheus server
+
+    routes maps a URL path to a function that takes the request parameters
+    (a list of (key, value) tuples) and returns the decoded response body,
+    or a (status code, body) tuple.
+    '''
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.server = Server(('127.0.0.1', 0), self.make_handler())
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def make_handler(self):
+        prometheus = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive, like Prometheus
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def respond(self, params):
+                path = urlsplit(self.path).path
+                prometheus.requests.append((self.command, path, params))
+                route = prometheus.routes.get(path)
+                if route is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = route(params)
+                status = 200
+                if isinstance(body, tuple):
+                    status, body = body
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond(parse_qsl(urlsplit(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.respond(parse_qsl(self.rfile.read(length).decode()))
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def success(result_type, result):
+    return {'status': 'success', 'data': {'resultType': result_type, 'result': result}}
+
+
+@pytest.fixture
+def prometheus():
+    server = FakePrometheus()
+    yield server
+    server.close()
@@ -83,3 +83,9 @@ def test_runtimeinfo(dut):
 def test_buildinfo(dut):
     result = dut.buildinfo()
     assert isinstance(result, promql_http_api.BuildInfo)
+
+
+def test_tsdb_status(dut):
+    result = dut.tsdb_status(limit=20)
+    assert isinstance(result, promql_http_api.TsdbStatus)
+    assert result.make_url() == '/api/v1/status/tsdb?limit=20'
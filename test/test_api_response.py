@@ -0,0 +1,40 @@
+import json
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.decoders import get_decoder
+from conftest import success
+
+
+def test_get_decoder_default():
+    assert get_decoder() is json.loads
+
+
+def test_get_decoder_callable():
+    assert get_decoder(len) is len
+
+
+def test_get_decoder_unknown():
+    with pytest.raises(ValueError):
+        get_decoder('nope')
+
+
+def test_get_decoder_auto():
+    assert get_decoder('auto')(b'{"a": 1}') == {'a': 1}
+
+
+def test_decode_once(prometheus):
+    result = [{'metric': {'instance': 'a'}, 'value': [1, '1']}]
+    prometheus.routes['/api/v1/query'] = lambda params: success('vector', result)
+    calls = []
+
+    def decoder(content):
+        calls.append(content)
+        return json.loads(content)
+
+    api = PromqlHttpApi(prometheus.url, decoder=decoder)
+    q = api.query('up')
+    df = q.to_dataframe()
+    assert list(df['value']) == ['1']
+    assert q.response.status() == 'success'
+    assert q.response.error() is None
+    assert len(calls) == 1
@@ -0,0 +1,80 @@
+import datetime
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.arrow import blocks_to_arrow
+from promql_http_api.columnar import series_from_result
+from conftest import success
+
+pa = pytest.importorskip('pyarrow')
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+T0 = START.timestamp()
+
+
+def matrix(params):
+    return success('matrix', [
+        {'metric': {'job': 'j', 'instance': 'a'}, 'values': [[T0, '1'], [T0 + 60, '2']]},
+        {'metric': {'job': 'j'}, 'values': [[T0 + 60.5, 'NaN']]},
+    ])
+
+
+def test_blocks_to_arrow():
+    blocks = [series_from_result(result) for result in matrix(None)['data']['result']]
+    table = blocks_to_arrow(blocks)
+    assert table.column_names == ['timestamp', 'job', 'instance', 'value']
+    assert table.schema.field('timestamp').type == pa.timestamp('ms', tz='UTC')
+    assert pa.types.is_dictionary(table.schema.field('job').type)
+    assert table.column('job').to_pylist() == ['j', 'j', 'j']
+    assert table.column('instance').to_pylist() == ['a', 'a', None]
+    assert table.column('timestamp').cast(pa.int64()).to_pylist()[-1] == int(T0 * 1000) + 60500
+    assert table.column('value').type == pa.float64()
+
+    table = blocks_to_arrow(blocks, ['instance'], dtype=str)
+    assert table.column_names == ['timestamp', 'instance', 'value']
+    assert table.column('value').to_pylist() == ['1', '2', 'NaN']
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_query_range_to_arrow(prometheus, stream):
+    prometheus.routes['/api/v1/query_range'] = matrix
+    api = PromqlHttpApi(prometheus.url)
+    q = api.query_range('up', START, START + datetime.timedelta(minutes=1), '1m')
+    table = q.to_arrow({'timezone': 'Europe/Paris'}, stream=stream)
+    assert table.num_rows == 3
+    assert table.schema.field('timestamp').type == pa.timestamp('ms', tz='Europe/Paris')
+    assert table.column('value').to_pylist()[:2] == [1.0, 2.0]
+
+
+def test_arrow_timezone():
+    import pytz
+    import zoneinfo
+    from promql_http_api.arrow import arrow_timezone
+    assert arrow_timezone(None) == 'UTC'
+    assert arrow_timezone('Europe/Paris') == 'Europe/Paris'
+    assert arrow_timezone(zoneinfo.ZoneInfo('Europe/Paris')) == 'Europe/Paris'
+    assert arrow_timezone(pytz.timezone('Europe/Paris')) == 'Europe/Paris'
+    assert arrow_timezone(datetime.timezone.utc) == '+00:00'
+    assert arrow_timezone(datetime.timezone(datetime.timedelta(hours=2))) == '+02:00'
+    assert arrow_timezone(datetime.timezone(-datetime.timedelta(hours=5, minutes=30))) == '-05:30'
+    assert arrow_timezone(pytz.FixedOffset(90)) == '+01:30'
+
+
+def test_to_arrow_fixed_offset(prometheus):
+    prometheus.routes['/api/v1/query_range'] = matrix
+    api = PromqlHttpApi(prometheus.url)
+    q = api.query_range('up', START, START + datetime.timedelta(minutes=1), '1m')
+    table = q.to_arrow({'timezone': datetime.timezone(datetime.timedelta(hours=2))})
+    assert table.schema.field('timestamp').type == pa.timestamp('ms', tz='+02:00')
+    assert table.num_rows == 3
+
+
+def test_query_to_polars(prometheus):
+    pl = pytest.importorskip('polars')
+    prometheus.routes['/api/v1/query'] = lambda params: success('vector', [
+        {'metric': {'instance': 'a'}, 'value': [T0, '5']},
+        {'metric': {'instance': 'b'}, 'value': [T0, '7']},
+    ])
+    df = PromqlHttpApi(prometheus.url).query('up', START).to_polars()
+    assert df.columns == ['timestamp', 'instance', 'value']
+    assert df['instance'].dtype == pl.Categorical
+    assert df['value'].to_list() == [5.0, 7.0]
@@ -0,0 +1,42 @@
+import asyncio
+import datetime
+import promql_http_api
+from promql_http_api import AsyncPromqlHttpApi
+from conftest import success
+
+
+def test_factory_methods():
+    api = AsyncPromqlHttpApi('http://localhost:9090')
+    time = datetime.datetime.now()
+    assert isinstance(api.query('up', time), promql_http_api.Query)
+    assert isinstance(api.query_range('up', time, time, '1m'), promql_http_api.QueryRange)
+    assert isinstance(api.labels(), promql_http_api.Labels)
+    assert api.labels().init_kwargs['client'] is api.client
+    # Requests go through the httpx client, the client has no requests connection pool
+    assert api.transport is None
+    assert 'transport' not in api.labels().init_kwargs
+    asyncio.run(api.aclose())
+
+
+def test_transport():
+    from promql_http_api import Transport
+    transport = Transport()
+    api = AsyncPromqlHttpApi('http://localhost:9090', transport=transport)
+    assert api.labels().init_kwargs['transport'] is transport
+    asyncio.run(api.aclose())
+
+
+def test_concurrent_queries(prometheus):
+    prometheus.routes['/api/v1/query'] = lambda params: success(
+        'vector', [{'metric': {'query': dict(params)['query']}, 'value': [1, '1']}])
+    prometheus.routes['/api/v1/labels'] = lambda params: {'status': 'success', 'data': ['job']}
+
+    async def run():
+        async with AsyncPromqlHttpApi(prometheus.url, max_connections=4) as api:
+            frames = await asyncio.gather(*(api.query(f'up{i}').ato_dataframe() for i in range(10)))
+            labels = await api.labels()
+        return frames, labels
+
+    frames, labels = asyncio.run(run())
+    assert [df['query'][0] for df in frames] == [f'up{i}' for i in range(10)]
+    assert labels == ['job']
@@ -0,0 +1,36 @@
+import datetime
+from promql_http_api import PromqlHttpApi
+from conftest import success
+
+
+def query_route(params):
+    query = dict(params)['query']
+    if query == 'bad':
+        return {'status': 'error', 'errorType': 'bad_data', 'error': 'parse error'}
+    return success('vector', [{'metric': {'query': query}, 'value': [1, '1']}])
+
+
+def test_run_many_ordered(prometheus):
+    prometheus.routes['/api/v1/query'] = query_route
+    api = PromqlHttpApi(prometheus.url)
+    time = datetime.datetime.now()
+    queries = [api.query(f'up{i}', time) for i in range(20)]
+    results = api.run_many(queries, max_workers=12)
+    assert [result.index for result in results] == list(range(20))
+    assert all(result.ok for result in results)
+    assert [result.data['result'][0]['metric']['query'] for result in results] == [f'up{i}' for i in range(20)]
+    assert api.transport.pool_maxsize >= 12
+    assert api.transport.stats()['requests'] == 20
+
+
+def test_run_many_errors(prometheus):
+    prometheus.routes['/api/v1/query'] = query_route
+    api = PromqlHttpApi(prometheus.url)
+    time = datetime.datetime.now()
+    queries = [api.query('up', time), api.query('bad', time), api.query('up', time)]
+    results = list(api.run_many(queries, ordered=False, func=lambda q: q.to_dataframe()))
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    failed = [result for result in results if not result.ok]
+    assert len(failed) == 1
+    assert failed[0].index == 1
+    assert isinstance(failed[0].error, ValueError)
@@ -0,0 +1,26 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'bench.py')
+
+
+def test_benchmarks_run(tmp_path):
+    # Keep the benchmark suite runnable, with a tiny workload
+    output = tmp_path / 'results.json'
+    args = [sys.executable, BENCH, '--series', '3', '--points', '10', '--queries', '4', '--latency', '0',
+            '--repeat', '1', '--json', str(output)]
+    subprocess.run(args, check=True, capture_output=True, timeout=60)
+    results = json.loads(output.read_text())
+    assert results['dataframe_throughput']['value'] > 0
+    assert results['concurrent_throughput']['unit'] == 'queries/s'
+
+    # A baseline 10 times faster is a regression
+    baseline = {name: dict(result, value=result['value'] * (10 if result['higher_is_better'] else 0.1))
+                for name, result in results.items()}
+    (tmp_path / 'baseline.json').write_text(json.dumps(baseline))
+    process = subprocess.run(args[:-2] + ['--only', 'numpy_grid', '--baseline', str(tmp_path / 'baseline.json')],
+                             capture_output=True, text=True, timeout=60)
+    assert process.returncode == 1
+    assert 'REGRESSION numpy_grid_throughput' in process.stdout
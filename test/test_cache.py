@@ -0,0 +1,60 @@
+import datetime
+import time
+from promql_http_api import PromqlHttpApi
+from promql_http_api.cache import ResultCache
+from conftest import success
+
+
+def test_make_key_normalized():
+    cache = ResultCache()
+    first = cache.make_key('http://HOST:9090/api/v1/query?query=up&time=1', {'Authorization': 'a'})
+    second = cache.make_key('http://host:9090/api/v1/query?time=1&query=up', {'authorization': 'a'})
+    assert first == second
+    assert first != cache.make_key('http://host:9090/api/v1/query?time=1&query=up', {'authorization': 'b'})
+
+
+def test_key_headers():
+    cache = ResultCache(headers=['Authorization'])
+    assert cache.make_key('http://h/x', {'User-Agent': 'a'}) == cache.make_key('http://h/x', {'User-Agent': 'b'})
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put(('a',), 1)
+    cache.put(('b',), 2)
+    assert cache.get(('a',)) == 1
+    cache.put(('c',), 3)
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) == 1
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'evictions': 1, 'expirations': 0, 'entries': 2}
+
+
+def test_ttl():
+    cache = ResultCache()
+    cache.put(('a',), 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get(('a',)) is None
+    assert cache.expirations == 1
+
+
+def test_immutable():
+    cache = ResultCache(immutable_after='1h')
+    assert cache.is_immutable(time.time() - 7200)
+    assert not cache.is_immutable(time.time())
+
+
+def test_shared_cache(prometheus):
+    prometheus.routes['/api/v1/query_range'] = lambda params: success(
+        'matrix', [{'metric': {}, 'values': [[1, '1']]}])
+    cache = ResultCache()
+    api = PromqlHttpApi(prometheus.url, cache=cache)
+    end = datetime.datetime.now() - datetime.timedelta(days=1)
+    start = end - datetime.timedelta(hours=1)
+    for _ in range(3):
+        q = api.query_range('up', start, end, '1m')
+        assert q.to_dataframe()['value'][0] == '1'
+    assert len(prometheus.requests) == 1
+    assert cache.hits == 2
+    assert q.cache_ttl(cache) is None
+    recent = api.query_range('up', start, datetime.datetime.now(), '1m')
+    assert recent.cache_ttl(cache) == cache.ttl
@@ -0,0 +1,76 @@
+import numpy as np
+import pytz
+from promql_http_api.columnar import SeriesBlock, blocks_to_dataframe, parse_values, series_from_result
+
+
+def make_result(instance, samples):
+    return {'metric': {'__name__': 'up', 'instance': instance}, 'values': samples}
+
+
+def test_series_from_result_matrix():
+    block = series_from_result(make_result('a', [[1, '1'], [2, '2']]))
+    assert isinstance(block, SeriesBlock)
+    assert block.metric['instance'] == 'a'
+    assert list(block.timestamps) == [1, 2]
+    assert list(block.values) == ['1', '2']
+
+
+def test_series_from_result_vector():
+    block = series_from_result({'metric': {'job': 'j'}, 'value': [1.5, '3']})
+    assert len(block) == 1
+    assert block.timestamps[0] == 1.5
+
+
+def test_parse_values_special():
+    values = np.array(['NaN', '+Inf', '-Inf', '1.5'], dtype=object)
+    parsed = parse_values(values, float)
+    assert np.isnan(parsed[0])
+    assert parsed[1] == np.inf
+    assert parsed[2] == -np.inf
+    assert parsed[3] == 1.5
+
+
+def test_parse_values_raw():
+    values = np.array(['1'], dtype=object)
+    assert parse_values(values) is values
+    assert parse_values(values, int) == [1]
+
+
+def test_blocks_to_dataframe():
+    blocks = [
+        series_from_result(make_result('a', [[1, '1'], [2, '2']])),
+        series_from_result(make_result('b', [[1, '3']])),
+    ]
+    df = blocks_to_dataframe(blocks, dtype=float)
+    assert list(df.columns) == ['timestamp', '__name__', 'instance', 'value']
+    assert list(df['instance']) == ['a', 'a', 'b']
+    assert list(df['value']) == [1.0, 2.0, 3.0]
+
+
+def test_blocks_to_dataframe_timezone():
+    blocks = [series_from_result(make_result('a', [[0, '1']]))]
+    df = blocks_to_dataframe(blocks, columns=['instance'], timezone=pytz.timezone('US/Eastern'))
+    assert list(df.columns) == ['timestamp', 'datetime', 'instance', 'value']
+    assert df['datetime'][0].hour == 19
+
+
+def test_blocks_to_dataframe_compact():
+    blocks = [
+        series_from_result(make_result('a', [[1, '1'], [2.5, '2']])),
+        series_from_result(make_result('b', [[1, '3']])),
+    ]
+    df = blocks_to_dataframe(blocks, dtype=np.float32, categorical=True, timestamp='ms')
+    assert df['timestamp'].dtype == np.int64
+    assert list(df['timestamp']) == [1000, 2500, 1000]
+    assert df['instance'].dtype == 'category'
+    assert list(df['instance'].cat.categories) == ['a', 'b']
+    assert list(df['instance']) == ['a', 'a', 'b']
+    assert df['value'].dtype == np.float32
+
+
+def test_blocks_to_dataframe_datetime64():
+    blocks = [series_from_result(make_result('a', [[1.5, '1']]))]
+    df = blocks_to_dataframe(blocks, timestamp='datetime64', timezone=pytz.utc)
+    assert df['timestamp'].dtype == 'datetime64[ns]'
+    assert df['timestamp'][0].value == 1500000000
+    assert df['datetime'][0].value == 1500000000
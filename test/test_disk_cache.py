@@ -0,0 +1,83 @@
+import datetime
+from promql_http_api import PromqlHttpApi
+from promql_http_api.disk_cache import DiskCache
+from promql_http_api.duration import parse_duration
+from conftest import success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def range_route(params):
+    params = dict(params)
+    start = float(params['start'])
+    end = float(params['end'])
+    step = parse_duration(params['step'])
+    count = int(round((end - start) / step)) + 1
+    values = [[int(start + k * step), str(k)] for k in range(count)]
+    return success('matrix', [{'metric': {'instance': i}, 'values': values} for i in 'ab'])
+
+
+def test_store_load(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    result = [{'metric': {'a': '1'}, 'values': [[1, '1'], [1.5, 'NaN']]}, {'metric': {'a': '2'}, 'values': []}]
+    cache.store('key', 3, result)
+    assert cache.load('key', 3) == result
+    assert cache.load('key', 4) is None
+    assert cache.size() > 0
+
+
+def test_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=0)
+    cache.store('key', 1, [])
+    cache.evict()
+    assert cache.load('key', 1) is None
+
+
+def test_query_range_blocks(prometheus, tmp_path):
+    prometheus.routes['/api/v1/query_range'] = range_route
+    cache = DiskCache(str(tmp_path), block_points=60)
+    api = PromqlHttpApi(prometheus.url, disk_cache=cache)
+    end = START + datetime.timedelta(hours=2, minutes=30)
+    first = api.query_range('up', START, end, '1m').to_dataframe({'dtype': float})
+    assert len(prometheus.requests) == 1
+    assert len(first) == 2 * 151
+
+    # Served from the stored blocks, with one request for the missing block
+    later = api.query_range('up', START + datetime.timedelta(minutes=30), end + datetime.timedelta(hours=1), '1m')
+    df = later.to_dataframe({'dtype': float})
+    assert len(prometheus.requests) == 2
+    params = dict(prometheus.requests[-1][2])
+    assert float(params['start']) == (START + datetime.timedelta(hours=3)).timestamp()
+    assert df['timestamp'].min() == (START + datetime.timedelta(minutes=30)).timestamp()
+    assert len(df) == 2 * 181
+
+    uncached = PromqlHttpApi(prometheus.url).query_range('up', START, end, '1m').to_dataframe({'dtype': float})
+    assert uncached.equals(first)
+
+
+def test_eviction_scans(prometheus, tmp_path):
+    class ScanCounter(DiskCache):
+        scans = 0
+
+        def _files(self):
+            self.scans += 1
+            return super()._files()
+
+    prometheus.routes['/api/v1/query_range'] = range_route
+    cache = ScanCounter(str(tmp_path), block_points=60)
+    api = PromqlHttpApi(prometheus.url, disk_cache=cache)
+    end = START + datetime.timedelta(hours=2, minutes=30)
+    api.query_range('up', START, end, '1m').to_dataframe()
+    assert cache.scans == 1
+    # Cache hits, and stores within max_bytes, do not scan the cache directory
+    api.query_range('up', START, end, '1m').to_dataframe()
+    api.query_range('up', START, end + datetime.timedelta(hours=2), '1m').to_dataframe()
+    assert cache.scans == 1
+    assert cache._bytes == cache.size()
+
+    # Stores beyond max_bytes evict
+    cache.max_bytes = 0
+    scans = cache.scans
+    api.query_range('up', START, end + datetime.timedelta(hours=4), '1m').to_dataframe()
+    assert cache.scans == scans + 1
+    assert cache.size() == 0 and cache._bytes == 0
@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+import time
+import pytest
+from promql_http_api import AsyncPromqlHttpApi, Hedging, LatencyTracker, PromqlHttpApi
+from conftest import FakePrometheus, success
+
+TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def vector(name, delay=0.0):
+    def route(params):
+        time.sleep(delay)
+        return success('vector', [{'metric': {'server': name}, 'value': [1, '1']}])
+    return route
+
+
+@pytest.fixture
+def replica():
+    server = FakePrometheus()
+    yield server
+    server.close()
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=10)
+    assert tracker.percentile('a', 50) is None
+    for latency in range(20):
+        tracker.observe('a', latency)
+    assert tracker.count('a') == 10
+    assert tracker.percentile('a', 50) == 15
+    assert tracker.percentile('a', 100) == 19
+
+
+def test_candidates():
+    hedging = Hedging(['http://a:9090/', 'http://b:9090'])
+    assert hedging.candidates('http://b:9090/api/v1/query?query=up') == [
+        ('http://b:9090', 'http://b:9090/api/v1/query?query=up'),
+        ('http://a:9090', 'http://a:9090/api/v1/query?query=up'),
+    ]
+    assert hedging.candidates('http://c:9090/api') == [('', 'http://c:9090/api')]
+    # The server URL must match up to a path separator
+    assert hedging.candidates('http://a:90901/api') == [('', 'http://a:90901/api')]
+
+
+def test_hedged_request(prometheus, replica):
+    prometheus.routes['/api/v1/query'] = vector('primary', delay=1)
+    replica.routes['/api/v1/query'] = vector('replica')
+    hedging = Hedging([prometheus.url, replica.url], initial_delay=0.05)
+    api = PromqlHttpApi(prometheus.url, hedge=hedging)
+    started = time.perf_counter()
+    assert api.query('up', TIME)()['result'][0]['metric'] == {'server': 'replica'}
+    assert time.perf_counter() - started < 0.5
+    assert hedging.stats() == {'requests': 1, 'hedged': 1, 'hedge_wins': 1}
+
+    # A fast primary is not hedged
+    prometheus.routes['/api/v1/query'] = vector('primary')
+    assert api.query('up', TIME)()['result'][0]['metric'] == {'server': 'primary'}
+    assert hedging.stats()['hedged'] == 1
+
+
+def test_failed_request_is_retried_on_replica(prometheus, replica):
+    replica.routes['/api/v1/query'] = vector('replica')
+    api = PromqlHttpApi(prometheus.url, hedge=[replica.url])
+    # The primary has no route, and answers 404: not a server failure
+    q = api.query('up', TIME)
+    assert q() is None
+    assert q.response.response.status_code == 404
+
+    # Connection failures fall back to the replica right away
+    api = PromqlHttpApi('http://127.0.0.1:9', hedge=[replica.url])
+    assert api.query('up', TIME)()['result'][0]['metric'] == {'server': 'replica'}
+
+
+def test_failed_responses_are_closed(prometheus, replica):
+    from promql_http_api import MetricsAggregator
+    prometheus.routes['/api/v1/query'] = lambda params: (503, {'status': 'error', 'error': 'unavailable'})
+    replica.routes['/api/v1/query'] = vector('replica')
+    # Instrumented responses are streamed
+    api = PromqlHttpApi(prometheus.url, hedge=[replica.url], instrument=MetricsAggregator())
+    for _ in range(3):
+        assert api.query('up', TIME)()['result'][0]['metric'] == {'server': 'replica'}
+    pools = api.transport.session.get_adapter(prometheus.url).poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key).pool
+        # No connection is left checked out
+        assert pool.qsize() == pool.maxsize
+
+    # All the servers failed: the last response is returned, the others are closed
+    replica.routes['/api/v1/query'] = prometheus.routes['/api/v1/query']
+    q = api.query('up', TIME)
+    assert q() is None
+    assert q.response.response.status_code == 503
+
+
+def test_async_hedged_request(prometheus, replica):
+    prometheus.routes['/api/v1/query'] = vector('primary', delay=1)
+    replica.routes['/api/v1/query'] = vector('replica')
+    hedging = Hedging([prometheus.url, replica.url], initial_delay=0.05)
+
+    async def run():
+        async with AsyncPromqlHttpApi(prometheus.url, hedge=hedging) as api:
+            started = time.perf_counter()
+            data = await api.query('up', TIME)
+            return data, time.perf_counter() - started
+
+    data, elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    assert data['result'][0]['metric'] == {'server': 'replica'}
+    assert hedging.stats()['hedge_wins'] == 1
+
+
+def test_hedges_after_each_delay(prometheus, replica):
+    third = FakePrometheus()
+    try:
+        prometheus.routes['/api/v1/query'] = vector('primary', delay=1)
+        replica.routes['/api/v1/query'] = vector('replica', delay=1)
+        third.routes['/api/v1/query'] = vector('third')
+        hedging = Hedging([prometheus.url, replica.url, third.url], initial_delay=0.05, max_hedges=2)
+        api = PromqlHttpApi(prometheus.url, hedge=hedging)
+        started = time.perf_counter()
+        assert api.query('up', TIME)()['result'][0]['metric'] == {'server': 'third'}
+        assert time.perf_counter() - started < 0.5
+        assert hedging.stats() == {'requests': 1, 'hedged': 2, 'hedge_wins': 1}
+
+        async def run():
+            async with AsyncPromqlHttpApi(prometheus.url, hedge=hedging) as api:
+                started = time.perf_counter()
+                data = await api.query('up', TIME)
+                return data, time.perf_counter() - started
+
+        data, elapsed = asyncio.run(run())
+        assert elapsed < 0.5
+        assert data['result'][0]['metric'] == {'server': 'third'}
+        assert hedging.stats()['hedged'] == 4
+    finally:
+        third.close()
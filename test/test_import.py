@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The import time budget of the package itself, on top of requests (seconds)
+IMPORT_BUDGET = 0.25
+
+
+def run_python(*args) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True, cwd=ROOT)
+
+
+def test_import_is_lazy():
+    code = ('import sys, promql_http_api; '
+            'print(sorted(m for m in ("numpy", "pandas", "pytz", "httpx", "asyncio") if m in sys.modules))')
+    assert run_python('-c', code).stdout.strip() == '[]'
+
+
+def test_import_time_budget():
+    times = {}
+    for line in run_python('-X', 'importtime', '-c', 'import promql_http_api').stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1e6
+    assert times['promql_http_api'] - times.get('requests', 0) < IMPORT_BUDGET
+
+
+def test_metadata_client_stays_light(prometheus):
+    prometheus.routes['/api/v1/status/buildinfo'] = lambda params: {'status': 'success', 'data': {'version': '2'}}
+    code = ('import sys, promql_http_api; '
+            f'print(promql_http_api.PromqlHttpApi("{prometheus.url}").buildinfo()()); '
+            'print("numpy" in sys.modules or "pandas" in sys.modules)')
+    assert run_python('-c', code).stdout.split() == ["{'version':", "'2'}", 'False']
+
+
+def test_pandas_missing():
+    # to_dataframe() fails before executing the query, with an installation hint
+    code = ('import sys; sys.modules["pandas"] = None; import datetime, promql_http_api; '
+            'q = promql_http_api.PromqlHttpApi("http://127.0.0.1:1").query("up", datetime.datetime.now()); '
+            'exec("try: q.to_dataframe()\\nexcept ImportError as e: print(e)"); print(q.response)')
+    assert run_python('-c', code).stdout.splitlines() == [
+        "DataFrame output requires pandas: pip install 'promql-http-api[pandas]'", 'None']
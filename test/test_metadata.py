@@ -0,0 +1,96 @@
+import datetime
+import re
+from urllib.parse import parse_qsl, urlsplit
+import pytest
+from promql_http_api import MetadataIndex, PromqlHttpApi
+from promql_http_api.metadata import literal_prefix
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+END = START + datetime.timedelta(hours=1)
+
+SERIES = [
+    {'__name__': 'node_cpu_seconds_total', 'instance': 'host1', 'cpu': '0'},
+    {'__name__': 'node_cpu_seconds_total', 'instance': 'host2', 'cpu': '0'},
+    {'__name__': 'node_memory_bytes', 'instance': 'host1'},
+    {'__name__': 'up', 'instance': 'host1', 'job': 'node'},
+    {'__name__': 'up', 'instance': 'host2', 'job': 'node'},
+]
+
+
+def params(endpoint):
+    return parse_qsl(urlsplit(endpoint.make_url()).query)
+
+
+def test_metadata_params():
+    api = PromqlHttpApi('http://localhost:9090')
+    assert params(api.labels()) == []
+    assert params(api.labels(match='up', start=START, end=END)) == [
+        ('match[]', 'up'), ('start', str(START.timestamp())), ('end', str(END.timestamp()))]
+    assert params(api.label_values('job', match=['up', 'node_load1'], end=END)) == [
+        ('match[]', 'up'), ('match[]', 'node_load1'), ('end', str(END.timestamp()))]
+    assert params(api.series('up', start=START)) == [('match[]', 'up'), ('start', str(START.timestamp()))]
+    batches = api.series([f'm{i}' for i in range(5)], match_batch_size=2, start=START, end=END).make_batches()
+    assert len(batches) == 3
+    assert all(batch.start == START and batch.end == END for batch in batches)
+
+
+def test_literal_prefix():
+    assert literal_prefix('node_cpu.*') == 'node_cpu'
+    assert literal_prefix('node_cpus?') == 'node_cpu'
+    assert literal_prefix('up') == 'up'
+    assert literal_prefix('up|down') == ''
+    assert literal_prefix('.*cpu') == ''
+
+
+@pytest.fixture
+def series(prometheus):
+    served = list(SERIES)
+    prometheus.routes['/api/v1/series'] = lambda params: {'status': 'success', 'data': served}
+    return served
+
+
+def test_index_lookups(prometheus, series):
+    index = PromqlHttpApi(prometheus.url).metadata_index(start=START, end=END)
+    assert len(index) == 5
+    assert index.labels() == ['__name__', 'cpu', 'instance', 'job']
+    assert index.labels(prefix='in') == ['instance']
+    assert index.label_values('__name__') == ['node_cpu_seconds_total', 'node_memory_bytes', 'up']
+    assert index.label_values('__name__', prefix='node_') == ['node_cpu_seconds_total', 'node_memory_bytes']
+    assert index.label_values('__name__', regex='node_.*_total') == ['node_cpu_seconds_total']
+    assert index.label_values('__name__', regex='up|node_memory_bytes') == ['node_memory_bytes', 'up']
+    assert index.label_values('__name__', prefix='up', regex='node.*') == []
+    assert index.label_values('missing') == []
+    assert index.series(__name__='up') == SERIES[3:]
+    assert index.series({'instance': 'host1', '__name__': re.compile('node_.*')}) == [SERIES[0], SERIES[2]]
+    # Compiled patterns keep their flags
+    assert index.label_values('__name__', regex=re.compile('NODE_.*', re.IGNORECASE)) == [
+        'node_cpu_seconds_total', 'node_memory_bytes']
+    assert index.label_values('__name__', regex=re.compile('u p', re.VERBOSE)) == ['up']
+    assert index.series({'instance': re.compile('HOST2', re.IGNORECASE)}) == [SERIES[1], SERIES[4]]
+    assert index.count(instance='host1') == 3
+    assert index.count() == 5
+    assert index.count(instance='host3') == 0
+    method, path, query = prometheus.requests[-1]
+    assert dict(query)['match[]'] == '{__name__=~".+"}'
+    assert dict(query)['start'] == str(START.timestamp())
+
+
+def test_index_refresh(prometheus, series):
+    index = MetadataIndex(PromqlHttpApi(prometheus.url), match='up').load()
+    assert index.label_values('instance') == ['host1', 'host2']
+    series.append({'__name__': 'up', 'instance': 'host3', 'job': 'node', 'zone': 'a'})
+    assert index.refresh('10m') == 1
+    assert index.refresh('10m') == 0
+    assert index.label_values('instance') == ['host1', 'host2', 'host3']
+    assert index.labels() == ['__name__', 'cpu', 'instance', 'job', 'zone']
+    assert index.series(zone='a') == [series[-1]]
+    query = dict(prometheus.requests[-1][2])
+    assert float(query['end']) - float(query['start']) == pytest.approx(600)
+    assert index.refreshed_at > index.loaded_at
+
+
+def test_index_errors(prometheus):
+    prometheus.routes['/api/v1/series'] = lambda params: {'status': 'error', 'errorType': 'bad_data',
+                                                          'error': 'parse error'}
+    with pytest.raises(ValueError, match='parse error'):
+        PromqlHttpApi(prometheus.url).metadata_index(match='{')
@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+import pytest
+from promql_http_api import AsyncPromqlHttpApi, Instrumentation, MetricsAggregator, PromqlHttpApi
+from promql_http_api.metrics import Histogram
+from conftest import success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+T0 = START.timestamp()
+
+
+class Recorder(Instrumentation):
+    def __init__(self):
+        self.requests = []
+        self.conversions = []
+
+    def request_done(self, metrics):
+        self.requests.append(metrics)
+
+    def conversion_done(self, metrics):
+        self.conversions.append(metrics)
+
+
+def matrix(params):
+    return success('matrix', [
+        {'metric': {'instance': 'a'}, 'values': [[T0, '1'], [T0 + 60, '2']]},
+        {'metric': {'instance': 'b'}, 'values': [[T0, '3']]},
+    ])
+
+
+def test_histogram_export():
+    histogram = Histogram('x_seconds', 'Help', (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.export() == [
+        '# HELP x_seconds Help', '# TYPE x_seconds histogram',
+        'x_seconds_bucket{le="0.1"} 1', 'x_seconds_bucket{le="1"} 2', 'x_seconds_bucket{le="+Inf"} 3',
+        'x_seconds_sum 5.55', 'x_seconds_count 3',
+    ]
+    # Large bounds and sums are exported with all their digits
+    histogram = Histogram('x_bytes', 'Help', (1048576, 1048577, 1.5e20))
+    histogram.observe(123456789)
+    assert histogram.export()[2:5] == [
+        'x_bytes_bucket{le="1048576"} 0', 'x_bytes_bucket{le="1048577"} 0', 'x_bytes_bucket{le="1.5e+20"} 1']
+    assert histogram.export()[6] == 'x_bytes_sum 123456789'
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_request_metrics(prometheus, stream):
+    prometheus.routes['/api/v1/query_range'] = matrix
+    recorder = Recorder()
+    api = PromqlHttpApi(prometheus.url, instrument=recorder)
+    df = api.query_range('up', START, START + datetime.timedelta(minutes=1), '1m').to_dataframe(stream=stream)
+    assert len(df) == 3
+    assert len(recorder.requests) == 1
+    metrics = recorder.requests[0]
+    assert metrics.status_code == 200
+    assert metrics.series == 2 and metrics.samples == 3
+    assert metrics.bytes == len(str(matrix(None)).replace("'", '"'))
+    assert metrics.ttfb > 0 and metrics.download >= 0
+    assert (metrics.decode is None) == stream
+    assert recorder.conversions == [metrics] and metrics.conversion > 0
+
+
+def test_queue_wait_and_aggregator(prometheus):
+    prometheus.routes['/api/v1/query_range'] = matrix
+    aggregator = MetricsAggregator()
+    api = PromqlHttpApi(prometheus.url, instrument=aggregator)
+    q = api.query_range('up', START, START + datetime.timedelta(minutes=2), '1m', shard_size=1)
+    q.to_dataframe()
+    text = aggregator.export()
+    assert 'promql_http_api_requests_total{code="200"} 3\n' in text
+    assert 'promql_http_api_queue_wait_seconds_count 3\n' in text
+    assert 'promql_http_api_series_sum 6\n' in text
+    # The merged shards are converted once
+    assert 'promql_http_api_conversion_seconds_count 1\n' in text
+    assert 'promql_http_api_connect_seconds_count 0\n' in text
+
+
+def test_async_metrics(prometheus):
+    prometheus.routes['/api/v1/query'] = lambda params: success('vector', [{'metric': {}, 'value': [T0, '1']}])
+    recorder = Recorder()
+
+    async def run():
+        async with AsyncPromqlHttpApi(prometheus.url, instrument=recorder) as api:
+            return await api.query('up', START).ato_dataframe()
+
+    asyncio.run(run())
+    metrics = recorder.requests[0]
+    assert metrics.connect is not None and metrics.connect > 0
+    assert metrics.ttfb >= metrics.connect
+    assert metrics.series == 1 and metrics.samples == 1
+    assert metrics.bytes > 0 and metrics.decode is not None
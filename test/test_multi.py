@@ -0,0 +1,73 @@
+import datetime
+import pytest
+from promql_http_api import MultiPromqlHttpApi
+from promql_http_api.merge import deduplicate
+from conftest import FakePrometheus, success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+END = START + datetime.timedelta(minutes=3)
+T0 = START.timestamp()
+
+
+@pytest.fixture
+def replica():
+    server = FakePrometheus()
+    yield server
+    server.close()
+
+
+def samples(*offsets):
+    return [[T0 + 60 * offset, str(offset)] for offset in offsets]
+
+
+def test_deduplicate():
+    result = [
+        {'metric': {'job': 'j', 'replica': 'a'}, 'values': samples(0, 1)},
+        {'metric': {'job': 'j', 'replica': 'b'}, 'values': samples(0, 2, 3)},
+        {'metric': {'job': 'k', 'replica': 'a'}, 'values': samples(0)},
+    ]
+    merged = deduplicate(result, 'replica')
+    assert merged == [
+        {'metric': {'job': 'j'}, 'values': samples(0, 1, 2, 3)},
+        {'metric': {'job': 'k'}, 'values': samples(0)},
+    ]
+
+
+def test_fan_out_query_range(prometheus, replica):
+    # Shards with different series, with a source label
+    prometheus.routes['/api/v1/query_range'] = lambda params: success(
+        'matrix', [{'metric': {'instance': 'a'}, 'values': samples(0, 1)}])
+    replica.routes['/api/v1/query_range'] = lambda params: success(
+        'matrix', [{'metric': {'instance': 'b'}, 'values': samples(0)}])
+    api = MultiPromqlHttpApi({'east': prometheus.url, 'west': replica.url}, source_label='source')
+    df = api.query_range('up', START, END, '1m').to_dataframe({'dtype': float})
+    assert list(df.columns) == ['timestamp', 'instance', 'source', 'value']
+    assert list(df['source']) == ['east', 'east', 'west']
+    assert len(prometheus.requests) == len(replica.requests) == 1
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_fan_out_ha_dedup(prometheus, replica, stream):
+    # HA replicas with gaps
+    prometheus.routes['/api/v1/query_range'] = lambda params: success(
+        'matrix', [{'metric': {'instance': 'a', 'replica': '0'}, 'values': samples(0, 1, 3)}])
+    replica.routes['/api/v1/query_range'] = lambda params: success(
+        'matrix', [{'metric': {'instance': 'a', 'replica': '1'}, 'values': samples(0, 2)}])
+    api = MultiPromqlHttpApi([prometheus.url, replica.url], replica_label='replica')
+    df = api.query_range('up', START, END, '1m').to_dataframe({'dtype': float}, stream=stream)
+    assert list(df.columns) == ['timestamp', 'instance', 'value']
+    assert list(df['value']) == [0, 1, 2, 3]
+
+
+def test_fan_out_errors(prometheus, replica):
+    prometheus.routes['/api/v1/query'] = lambda params: success('vector', [{'metric': {}, 'value': [T0, '1']}])
+    replica.routes['/api/v1/query'] = lambda params: {'status': 'error', 'errorType': 'timeout', 'error': 'slow'}
+    api = MultiPromqlHttpApi([prometheus.url, replica.url])
+    q = api.query('up', START)
+    assert q() is None
+    assert q.response.error_type() == 'timeout'
+
+    api = MultiPromqlHttpApi([prometheus.url, replica.url], partial_response=True)
+    q = api.query('up', START)
+    assert q()['result'] == [{'metric': {}, 'value': [T0, '1']}]
+    assert list(q.errors) == [replica.url]
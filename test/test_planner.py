@@ -0,0 +1,156 @@
+import datetime
+import re
+import pytest
+from promql_http_api import ConversionPool, PromqlHttpApi, QueryBudgetExceeded, QueryPlanner
+from promql_http_api.duration import parse_duration
+from conftest import success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+END = START + datetime.timedelta(minutes=99)
+INSTANCES = [f'host{i}' for i in range(6)]
+SERIES = [{'__name__': 'm', 'instance': instance, 'cpu': str(cpu)} for instance in INSTANCES for cpu in range(10)]
+
+
+def series_route(params):
+    params = dict(params)
+    limit = int(params.get('limit', len(SERIES)))
+    return {'status': 'success', 'data': SERIES[:limit]}
+
+
+def query_range_route(params):
+    params = dict(params)
+    match = re.search(r'instance=~"([^"]*)"', params['query'])
+    series = [s for s in SERIES if match is None or re.fullmatch(match.group(1), s['instance'])]
+    start, end, step = float(params['start']), float(params['end']), parse_duration(params['step'])
+    timestamps = [start + i * step for i in range(int((end - start) // step) + 1)]
+    return success('matrix', [{'metric': s, 'values': [[t, '1'] for t in timestamps]} for s in series])
+
+
+@pytest.fixture
+def api(prometheus):
+    prometheus.routes['/api/v1/series'] = series_route
+    prometheus.routes['/api/v1/label/instance/values'] = lambda params: {'status': 'success', 'data': INSTANCES}
+    prometheus.routes['/api/v1/query_range'] = query_range_route
+    prometheus.routes['/api/v1/status/tsdb'] = lambda params: {'status': 'success', 'data': {
+        'seriesCountByMetricName': [{'name': 'big', 'value': 1000000}]}}
+    return PromqlHttpApi(prometheus.url)
+
+
+def test_plan_small(api):
+    plan = api.query_range('rate(m[5m])', START, END, '60s').plan()
+    assert plan.series == 60 and plan.exact
+    assert plan.points == 100
+    assert plan.samples == 6000
+    assert plan.queries == ['rate(m[5m])']
+    assert plan.shards == 1
+    assert plan.shard_size is None
+    assert plan.concurrency == 1
+
+
+def test_plan_shards(api, prometheus):
+    planner = QueryPlanner(max_series_per_request=25, max_samples_per_request=1000, max_inflight_samples=2000)
+    q = api.query_range('rate(m[5m])', START, END, '60s')
+    plan = q.plan(planner)
+    assert plan.shard_label == 'instance'
+    assert len(plan.queries) == 3
+    assert plan.queries[0] == 'rate(m{instance=~"|host0|host3"}[5m])'
+    # 20 series per label shard, 1000 samples per request
+    assert plan.shard_points == 50
+    assert plan.shard_size == '50m'
+    assert plan.shards == 6
+    assert plan.samples_per_request == 1000
+    assert plan.concurrency == 2
+    assert 'label shards: 3 by instance' in str(plan)
+    assert plan.as_dict()['time_shards'] == 2
+
+    # Nothing runs before the query is executed
+    assert not any(path == '/api/v1/query_range' for _, path, _ in prometheus.requests)
+    expected = api.query_range('rate(m[5m])', START, END, '60s').to_dataframe()
+    df = q.to_dataframe()
+    assert len(q.shards) == 6
+    assert q.parallelism == 2
+    key = ['instance', 'cpu', 'timestamp']
+    assert df.sort_values(key).reset_index(drop=True).equals(expected.sort_values(key).reset_index(drop=True))
+
+
+def test_plan_not_label_preserving(api):
+    planner = QueryPlanner(max_series_per_request=25)
+    plan = api.query_range('sum(rate(m[5m]))', START, END, '60s').plan(planner)
+    assert plan.queries == ['sum(rate(m[5m]))']
+    assert 'aggregates' in plan.notes[0]
+    plan = api.query_range('1-sum(rate(m[5m]))', START, END, '60s').plan(planner)
+    assert plan.queries == ['1-sum(rate(m[5m]))']
+    plan = api.query_range('2+rate(m[5m])', START, END, '60s').plan(planner)
+    assert len(plan.queries) > 1
+
+
+def test_plan_budgets(api):
+    with pytest.raises(QueryBudgetExceeded, match='more than 51 series') as error:
+        api.query_range('m', START, END, '60s').plan(QueryPlanner(max_series=50, use_tsdb_status=False))
+    assert not error.value.plan.exact
+    with pytest.raises(QueryBudgetExceeded, match='6,000 samples'):
+        api.query_range('m', START, END, '60s').plan(QueryPlanner(max_samples=5000))
+    with pytest.raises(QueryBudgetExceeded, match='1,000,000 series'):
+        api.query_range('big', START, END, '60s').plan(QueryPlanner(max_series=50))
+
+
+def test_planner_client(api, prometheus):
+    planned = PromqlHttpApi(prometheus.url, planner=QueryPlanner(max_samples=5000))
+    with pytest.raises(QueryBudgetExceeded):
+        planned.query_range('m', START, END, '60s').to_dataframe()
+    planned = PromqlHttpApi(prometheus.url, planner=QueryPlanner(max_samples_per_request=3000))
+    q = planned.query_range('m', START, END, '60s')
+    assert len(q.to_dataframe()) == 6000
+    assert q.query_plan.shards == 2
+    assert all(shard.query_plan is None for shard in q.shards)
+
+
+def test_planner_conversion_pool(api, prometheus):
+    pool = ConversionPool(max_workers=2, min_size=0)
+    planned = PromqlHttpApi(prometheus.url, planner=QueryPlanner(max_samples=5000), conversion_pool=pool)
+    with pytest.raises(QueryBudgetExceeded):
+        planned.query_range('m', START, END, '60s').to_dataframe({'dtype': float})
+    planned = PromqlHttpApi(prometheus.url, planner=QueryPlanner(max_samples_per_request=3000), conversion_pool=pool)
+    q = planned.query_range('m', START, END, '60s')
+    assert len(q.to_dataframe({'dtype': float})) == 6000
+    assert q.query_plan.shards == 2
+    assert len([path for _, path, _ in prometheus.requests if path == '/api/v1/query_range']) == 2
+    planned.close()
+
+
+def test_planner_async(api, prometheus, monkeypatch):
+    import asyncio
+    from promql_http_api import AsyncPromqlHttpApi
+    from promql_http_api.label_values import LabelValues
+    from promql_http_api.series import Series
+
+    def blocking(self, *args, **kwargs):
+        raise AssertionError('synchronous API call in the event loop')
+
+    monkeypatch.setattr(Series, '__call__', blocking)
+    monkeypatch.setattr(LabelValues, '__call__', blocking)
+    planner = QueryPlanner(max_series_per_request=25, max_samples_per_request=1000)
+
+    async def run(planner):
+        async with AsyncPromqlHttpApi(prometheus.url) as async_api:
+            q = async_api.query_range('m', START, END, '60s', planner=planner)
+            return q, await q.ato_dataframe()
+
+    q, df = asyncio.run(run(planner))
+    assert len(df) == 6000
+    assert len(q.query_plan.queries) == 3
+    with pytest.raises(QueryBudgetExceeded):
+        asyncio.run(run(QueryPlanner(max_series=10)))
+
+
+def test_planner_disk_cache(api, prometheus, tmp_path):
+    from promql_http_api import DiskCache
+    planned = PromqlHttpApi(prometheus.url, planner=QueryPlanner(max_series_per_request=25),
+                            disk_cache=DiskCache(str(tmp_path)))
+    q = planned.query_range('rate(m[5m])', START, END, '60s')
+    df = q.to_dataframe()
+    assert len(df) == 6000
+    queries = [dict(params)['query'] for _, path, params in prometheus.requests if path == '/api/v1/query_range']
+    # The missing blocks are fetched with the label shards of the plan
+    assert len(q.query_plan.queries) == 3
+    assert set(queries) == set(q.query_plan.queries)
@@ -0,0 +1,99 @@
+import datetime
+import json
+import os
+import numpy as np
+import pytest
+from promql_http_api import ConversionPool, PromqlHttpApi
+from promql_http_api.process_pool import _split
+from conftest import success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+END = START + datetime.timedelta(minutes=10)
+
+
+def matrix(count=20):
+    result = [{'metric': {'__name__': 'up', 'instance': f'host{i}', 'job': 'node'},
+               'values': [[1704067200 + 60 * t + 0.5, str(i * t)] for t in range(i % 4)] + [[1704067800, 'NaN']]}
+              for i in range(count)]
+    return success('matrix', result)
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = ConversionPool(max_workers=3, min_size=0)
+    yield pool
+    pool.close()
+
+
+def shared_blocks():
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+
+@pytest.mark.parametrize('schema', [
+    None,
+    {'dtype': np.float64, 'columns': ['instance']},
+    {'compact': True},
+    {'dtype': 'float32', 'timestamp': 'datetime64', 'timezone': datetime.timezone.utc},
+])
+def test_pool_matches_serial(prometheus, pool, schema):
+    prometheus.routes['/api/v1/query_range'] = lambda params: matrix()
+    expected = PromqlHttpApi(prometheus.url).query_range('up', START, END, '60s').to_dataframe(schema)
+    before = shared_blocks()
+    df = PromqlHttpApi(prometheus.url, conversion_pool=pool).query_range('up', START, END, '60s').to_dataframe(schema)
+    assert df.equals(expected)
+    assert pool._executor is not None
+    assert shared_blocks() == before
+
+
+def test_pool_vector(prometheus, pool):
+    result = [{'metric': {'instance': f'host{i}'}, 'value': [1704067200, str(i)]} for i in range(10)]
+    prometheus.routes['/api/v1/query'] = lambda params: success('vector', result)
+    api = PromqlHttpApi(prometheus.url, conversion_pool=pool)
+    df = api.query('up', START).to_dataframe({'dtype': float})
+    assert list(df['instance']) == [f'host{i}' for i in range(10)]
+    assert list(df['value']) == list(range(10))
+
+
+def test_pool_errors(prometheus, pool):
+    prometheus.routes['/api/v1/query_range'] = lambda params: {'status': 'error', 'errorType': 'bad_data',
+                                                               'error': 'parse error'}
+    api = PromqlHttpApi(prometheus.url, conversion_pool=pool)
+    with pytest.raises(ValueError, match='No data'):
+        api.query_range('up', START, END, '60s').to_dataframe()
+    prometheus.routes['/api/v1/query_range'] = lambda params: success('matrix', [])
+    with pytest.raises(ValueError, match='no results'):
+        api.query_range('up', START, END, '60s').to_dataframe()
+
+
+def test_pool_min_size(prometheus):
+    prometheus.routes['/api/v1/query_range'] = lambda params: matrix()
+    pool = ConversionPool(max_workers=2)
+    api = PromqlHttpApi(prometheus.url, conversion_pool=pool)
+    assert len(api.query_range('up', START, END, '60s').to_dataframe()) > 0
+    # Small responses are converted in the calling thread
+    assert pool._executor is None
+    assert not pool.accepts(1 << 30, int)
+
+
+def test_split():
+    body = json.dumps(matrix(10)).encode()
+    start, end, offsets = _split(body, 4)
+    assert body[start:start + 1] == b'[' and body[end:end + 1] == b']'
+    assert len(offsets) == 4
+    chunks = [body[first:last].rstrip(b' ,') for first, last in zip(offsets, offsets[1:] + [end])]
+    assert sum(len(json.loads(b'[' + chunk + b']')) for chunk in chunks) == 10
+    assert _split(json.dumps(success('matrix', [])).encode(), 4) is None
+    assert _split(b'{"status":"error"}', 4) is None
+
+
+def test_pool_unpicklable_decoder(prometheus, pool):
+    prometheus.routes['/api/v1/query_range'] = lambda params: matrix()
+    decoder = lambda content: json.loads(content)  # noqa: E731
+    assert not pool.accepts(1 << 30, float, decoder)
+    assert pool.accepts(1 << 30, float, json.loads)
+    expected = PromqlHttpApi(prometheus.url).query_range('up', START, END, '60s').to_dataframe({'dtype': float})
+    api = PromqlHttpApi(prometheus.url, decoder=decoder, conversion_pool=pool)
+    df = api.query_range('up', START, END, '60s').to_dataframe({'dtype': float})
+    assert df.equals(expected)
+    # Direct calls convert nothing, instead of failing in the workers
+    assert pool.convert(json.dumps(matrix()).encode(), decoder) is None
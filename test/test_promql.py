@@ -0,0 +1,66 @@
+import pytest
+from promql_http_api.promql import add_matcher, at_time, calls, is_label_preserving, quote, regex_matcher, selectors
+
+
+def texts(query):
+    return [selector.text() for selector in selectors(query)]
+
+
+def test_selectors():
+    assert texts('up') == ['up']
+    assert texts('rate(http_requests_total{job="api", path=~"/a}b"}[5m])') == [
+        'http_requests_total{job="api", path=~"/a}b"}']
+    assert texts('sum by (job) (rate(x[5m])) / on(job) group_left(a) y offset 5m') == ['x', 'y']
+    assert texts('sum without(instance)(x) > bool 1') == ['x']
+    assert texts('{__name__="up"} and x @ start()') == ['{__name__="up"}', 'x']
+    assert texts('histogram_quantile(0.9, sum(rate(b_bucket[5m])) by (le))') == ['b_bucket']
+    assert texts('max_over_time(x[1h:5m]) + 1e3 - Inf # comment y') == ['x']
+    assert texts('label_replace(x, "dst", "$1", "src", "(.*)")') == ['x']
+    with pytest.raises(ValueError):
+        selectors('x{job="a')
+
+
+def test_calls():
+    assert calls('sum by (job) (rate(x[5m]))') == ['sum', 'rate']
+    assert calls('x') == []
+    # Signs are not part of number literals, except in exponents
+    assert calls('1-sum(rate(m[5m]))') == ['sum', 'rate']
+    assert calls('2+rate(x[5m]) > 1e+3 * 0x1f') == ['rate']
+
+
+def test_add_matcher():
+    assert add_matcher('up', 'instance="a"') == 'up{instance="a"}'
+    assert add_matcher('rate(x{job="a",}[5m]) / y{}', 'instance="a"') == \
+        'rate(x{job="a", instance="a"}[5m]) / y{instance="a"}'
+    assert add_matcher('{__name__="up"}', 'instance="a"') == '{__name__="up", instance="a"}'
+
+
+def test_at_time():
+    assert at_time('up', 1704067200) == 'up @ 1704067200.000'
+    assert at_time('rate(x{a="@"}[5m]) / y offset 1h', 1704067200.5) == \
+        'rate(x{a="@"}[5m] @ 1704067200.500) / y @ 1704067200.500 offset 1h'
+    assert at_time('sum by (job) (x [5m])', 1) == 'sum by (job) (x [5m] @ 1.000)'
+    # @ in string literals and comments
+    assert at_time('label_replace(x, "a", "x@y", "b", "") # @', 1) == \
+        'label_replace(x @ 1.000, "a", "x@y", "b", "") # @'
+    # Subqueries, @ modifiers and time functions depend on the evaluation time
+    for query in ('max_over_time(x[1h:5m])', 'x @ end()', 'time() - x', 'hour() == 3 and x',
+                  'predict_linear(x[1h], 3600)'):
+        with pytest.raises(ValueError):
+            at_time(query, 1)
+
+
+def test_label_preserving():
+    assert is_label_preserving('rate(x{job="a"}[5m]) * 8')
+    assert is_label_preserving('label_replace(x, "dst", "$1", "src", "(.*)")')
+    assert not is_label_preserving('sum by (instance) (x)')
+    assert not is_label_preserving('x / y')
+    assert not is_label_preserving('absent(x)')
+    assert not is_label_preserving('1-sum(rate(m[5m]))')
+    assert not is_label_preserving('2+sum by (job) (x)')
+    assert is_label_preserving('2+rate(x[5m])')
+
+
+def test_quote():
+    assert quote('a"b\\c') == '"a\\"b\\\\c"'
+    assert regex_matcher('instance', ['', 'host.1:9100']) == 'instance=~"|host\\\\.1:9100"'
@@ -0,0 +1,84 @@
+import datetime
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.duration import format_duration, parse_duration
+from promql_http_api.merge import merge_matrix
+from conftest import success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def range_route(params):
+    params = dict(params)
+    start = float(params['start'])
+    end = float(params['end'])
+    step = parse_duration(params['step'])
+    values = []
+    t = start
+    while t <= end:
+        values.append([t, str(t)])
+        t += step
+    return success('matrix', [{'metric': {'instance': i}, 'values': values} for i in 'ab'])
+
+
+@pytest.mark.parametrize('value,seconds', [('15s', 15), ('1h30m', 5400), ('500ms', 0.5), ('30', 30), (60, 60)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_parse_duration_invalid():
+    with pytest.raises(ValueError):
+        parse_duration('1x')
+
+
+def test_format_duration():
+    assert format_duration(5400) == '1h30m'
+    assert format_duration(0.5) == '500ms'
+
+
+def test_merge_matrix():
+    first = [{'metric': {'a': '1'}, 'values': [[1, '1'], [2, '2']]}]
+    second = [{'metric': {'a': '1'}, 'values': [[2, '2'], [3, '3']]}, {'metric': {'a': '2'}, 'values': [[3, '3']]}]
+    merged = merge_matrix([first, second])
+    assert merged[0]['values'] == [[1, '1'], [2, '2'], [3, '3']]
+    assert merged[1]['metric'] == {'a': '2'}
+    # Series are sorted by their labels, also when they are new in a later result
+    merged = merge_matrix([[{'metric': {'a': '2'}, 'values': [[1, '1']]}], second])
+    assert [series['metric'] for series in merged] == [{'a': '1'}, {'a': '2'}]
+
+
+def test_make_shards():
+    api = PromqlHttpApi('http://localhost:9090')
+    end = START + datetime.timedelta(minutes=10)
+    assert api.query_range('up', START, end, '1m').make_shards() == []
+    shards = api.query_range('up', START, end, '1m', shard_size='3m').make_shards()
+    assert [shard.start for shard in shards] == [START + datetime.timedelta(minutes=m) for m in (0, 3, 6, 9)]
+    assert shards[-1].end == end
+
+
+def test_sharded_query_range(prometheus):
+    prometheus.routes['/api/v1/query_range'] = range_route
+    api = PromqlHttpApi(prometheus.url)
+    end = START + datetime.timedelta(hours=1)
+    expected = api.query_range('up', START, end, '1m').to_dataframe({'dtype': float})
+    requests = len(prometheus.requests)
+    sharded = api.query_range('up', START, end, '1m', shard_size='7m', parallelism=3).to_dataframe({'dtype': float})
+    assert len(prometheus.requests) - requests == 9
+    assert sharded.equals(expected)
+
+
+def test_sharded_query_range_order(prometheus):
+    def route(params):
+        # Series a starts after 30 minutes, Prometheus sorts the series by their labels
+        values = range_route(params)['data']['result'][0]['values']
+        late = [value for value in values if value[0] >= START.timestamp() + 1800]
+        return success('matrix', ([{'metric': {'instance': 'a'}, 'values': late}] if late else []) +
+                       [{'metric': {'instance': i}, 'values': values} for i in 'bc'])
+
+    prometheus.routes['/api/v1/query_range'] = route
+    api = PromqlHttpApi(prometheus.url)
+    end = START + datetime.timedelta(hours=1)
+    expected = api.query_range('up', START, end, '1m').to_dataframe({'dtype': float})
+    sharded = api.query_range('up', START, end, '1m', shard_size='7m').to_dataframe({'dtype': float})
+    assert list(expected['instance'].unique()) == ['a', 'b', 'c']
+    assert sharded.equals(expected)
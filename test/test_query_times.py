@@ -0,0 +1,124 @@
+import datetime
+import re
+import pandas as pd
+import pytest
+from conftest import success
+from promql_http_api import PromqlHttpApi, QueryRange, QueryTimes
+from promql_http_api.duration import parse_duration
+from promql_http_api.query_times import TimeGrid, group_times
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+HOUR = 3600
+
+
+def evaluate(t):
+    # Instance 'b' only exists in even hours
+    samples = [({'__name__': 'up', 'instance': 'a'}, str(t % 7))]
+    if int(t) // HOUR % 2 == 0:
+        samples.append(({'__name__': 'up', 'instance': 'b'}, str(t % 11)))
+    return samples
+
+
+def query_route(params):
+    params = dict(params)
+    time = float(params['time'])
+    if params['query'] == 'up':
+        return success('vector', [{'metric': metric, 'value': [time, value]} for metric, value in evaluate(time)])
+    result = []
+    for at, index in re.findall(r'label_replace\(up @ ([0-9.]+), "__query_time__", "([0-9]+)", "", ""\)',
+                                params['query']):
+        for metric, value in evaluate(float(at)):
+            result.append({'metric': {**metric, '__query_time__': index}, 'value': [time, value]})
+    return success('vector', result)
+
+
+def query_range_route(params):
+    params = dict(params)
+    start, end, step = float(params['start']), float(params['end']), parse_duration(params['step'])
+    series = {}
+    t = start
+    while t <= end:
+        for metric, value in evaluate(t):
+            series.setdefault(metric['instance'], {'metric': metric, 'values': []})['values'].append([t, value])
+        t += step
+    return success('matrix', [series[instance] for instance in sorted(series)])
+
+
+@pytest.fixture
+def api(prometheus):
+    prometheus.routes['/api/v1/query'] = query_route
+    prometheus.routes['/api/v1/query_range'] = query_range_route
+    return PromqlHttpApi(prometheus.url)
+
+
+def individual(api, times, schema=None):
+    frames = [api.query('up', time).to_dataframe(schema) for time in times]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_group_times():
+    assert group_times([0, 10, 20, 30]) == ([TimeGrid(0, 30, 10)], [])
+    # Unordered, with duplicates and a few gaps
+    assert group_times([30, 0, 10, 60, 10]) == ([TimeGrid(0, 60, 10)], [])
+    assert group_times([5]) == ([], [5])
+    grids, leftovers = group_times([0, 1, 2, 3, 100, 250, 1000, 2000, 3000, 3001])
+    assert grids == [TimeGrid(0, 3, 1), TimeGrid(1000, 3000, 1000)]
+    assert leftovers == [100, 250, 3001]
+
+
+def test_evenly_spaced(api, prometheus):
+    times = [START + datetime.timedelta(hours=i) for i in range(48)]
+    q = api.query_times('up', times)
+    assert isinstance(q, QueryTimes)
+    requests = q.make_requests()
+    assert len(requests) == 1 and isinstance(requests[0], QueryRange)
+    assert requests[0].step == '1h'
+    df = q.to_dataframe()
+    assert [path for _, path, _ in prometheus.requests] == ['/api/v1/query_range']
+    pd.testing.assert_frame_equal(df, individual(api, times))
+
+
+def test_irregular(api, prometheus):
+    times = [START + datetime.timedelta(seconds=s) for s in
+             (0, 600, 1200, 1800, 4000, 9000, 20000, 40000, 60000, 80000, 90001, 93333)]
+    # Not sorted, with a duplicate
+    times = times[6:] + times[:6] + times[2:3]
+    q = api.query_times('up', times)
+    # Two runs, and the leftovers in one batched instant query
+    assert len(q.make_requests()) == 3
+    schema = {'dtype': float}
+    df = q.to_dataframe(schema)
+    assert len(prometheus.requests) == 3
+    pd.testing.assert_frame_equal(df, individual(api, times, schema))
+    assert df['timestamp'][0] == times[0].timestamp()
+
+
+def test_unbatched(api):
+    times = [START + datetime.timedelta(seconds=s) for s in (0, 100, 1000, 10000, 100000)]
+    assert len(api.query_times('up', times).make_requests()) == 1
+    # Times cannot be set with @ modifiers in time functions
+    requests = api.query_times('time() - up', times).make_requests()
+    assert [request.query for request in requests] == ['time() - up'] * 5
+    assert len(api.query_times('up', times, batch_size=2).make_requests()) == 3
+
+
+def test_error(api, prometheus):
+    prometheus.routes['/api/v1/query_range'] = lambda params: {
+        'status': 'error', 'errorType': 'bad_data', 'error': 'too many points'}
+    times = [START + datetime.timedelta(hours=i) for i in range(10)]
+    q = api.query_times('up', times)
+    with pytest.raises(ValueError):
+        q.to_dataframe()
+    assert q.response.error_type() == 'bad_data'
+
+
+def test_async(api):
+    import asyncio
+    from promql_http_api import AsyncPromqlHttpApi
+
+    async def run():
+        async with AsyncPromqlHttpApi(api.url) as async_api:
+            return await async_api.query_times('up', times).ato_dataframe()
+
+    times = [START + datetime.timedelta(hours=i) for i in (0, 1, 2, 5, 13)]
+    pd.testing.assert_frame_equal(asyncio.run(run()), individual(api, times))
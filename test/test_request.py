@@ -0,0 +1,58 @@
+import datetime
+from promql_http_api import PromqlHttpApi
+from conftest import success
+
+TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def test_make_url_encoded():
+    api = PromqlHttpApi('http://localhost:9090')
+    q = api.query('sum(rate(x{a="b c"}[5m])) + 1', TIME)
+    assert q.make_url() == '/api/v1/query?query=sum%28rate%28x%7Ba%3D%22b+c%22%7D%5B5m%5D%29%29+%2B+1&time=1704067200.0'
+    assert api.series(['up', 'x']).make_url() == '/api/v1/series?match%5B%5D=up&match%5B%5D=x'
+    assert api.label_values('a/b').make_url() == '/api/v1/label/a%2Fb/values'
+
+
+def test_make_request():
+    api = PromqlHttpApi('http://localhost:9090')
+    assert api.query('up', TIME).make_request()[0] == 'GET'
+    method, url, form = api.query('up' * 5000, TIME).make_request()
+    assert method == 'POST'
+    assert url == 'http://localhost:9090/api/v1/query'
+    assert form[0] == ('query', 'up' * 5000)
+    assert api.targets().make_request(threshold=0)[0] == 'GET'
+
+
+def test_post(prometheus):
+    prometheus.routes['/api/v1/query'] = lambda params: success(
+        'vector', [{'metric': {'query': dict(params)['query']}, 'value': [1, '1']}])
+    api = PromqlHttpApi(prometheus.url)
+    query = 'up{job="' + 'x' * 5000 + '"}'
+    df = api.query(query, TIME).to_dataframe()
+    assert df['query'][0] == query
+    assert prometheus.requests[-1][0] == 'POST'
+
+
+def test_series_batches(prometheus):
+    def route(params):
+        return {'status': 'success', 'data': [{'__name__': value} for _, value in params] + [{'__name__': 'common'}]}
+
+    prometheus.routes['/api/v1/series'] = route
+    api = PromqlHttpApi(prometheus.url)
+    match = [f'm{i}' for i in range(25)]
+    data = api.series(match, match_batch_size=10)()
+    assert len(prometheus.requests) == 3
+    assert [series['__name__'] for series in data] == match[:10] + ['common'] + match[10:]
+
+
+def test_series_batches_limit(prometheus):
+    def route(params):
+        limit = int(dict(params)['limit'])
+        return {'status': 'success', 'data': [{'__name__': value} for key, value in params if key == 'match[]'][:limit]}
+
+    prometheus.routes['/api/v1/series'] = route
+    api = PromqlHttpApi(prometheus.url)
+    match = [f'm{i}' for i in range(25)]
+    data = api.series(match, match_batch_size=10, limit=12)()
+    assert len(prometheus.requests) == 3
+    assert [series['__name__'] for series in data] == match[:12]
@@ -0,0 +1,62 @@
+import datetime
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.duration import parse_duration
+from promql_http_api.promql import rewrite_ranges
+from promql_http_api.resolution import align_range, resolution_step
+
+END = datetime.datetime(2024, 1, 31, 12, 34, 56, tzinfo=datetime.timezone.utc)
+START = END - datetime.timedelta(days=30)
+
+
+def test_resolution_step():
+    # 30 days in at most 1000 points, in multiples of 15s
+    assert resolution_step(START, END, 1000) == 2595
+    assert resolution_step(START, END, 1000, scrape_interval='1m') == 2640
+    # Never finer than the scrape interval, or the minimal step
+    assert resolution_step(END - datetime.timedelta(minutes=5), END, 1000) == 15
+    assert resolution_step(END - datetime.timedelta(minutes=5), END, 1000, min_step='1m') == 60
+    with pytest.raises(ValueError):
+        resolution_step(START, END, 1)
+
+
+@pytest.mark.parametrize('max_points', [2, 3, 10, 999, 1000, 1001, 4321])
+def test_align_range(max_points):
+    step = resolution_step(START, END, max_points)
+    start, end = align_range(START, END, step)
+    assert start <= START and end <= END
+    assert start.timestamp() % step == 0 and end.timestamp() % step == 0
+    assert (end - start).total_seconds() // step + 1 <= max_points
+    assert start.tzinfo == START.tzinfo
+
+
+def test_query_range_max_points():
+    api = PromqlHttpApi('http://localhost:9090')
+    q = api.query_range('up', START, END, max_points=1000)
+    assert q.step == '43m15s'
+    assert q.start.timestamp() % 2595 == 0
+    params = dict(q.make_params())
+    assert params['step'] == '43m15s'
+    assert api.query_range('up', START, END, width=1000).step == '43m15s'
+    # The step is a minimum
+    assert api.query_range('up', START, END, '1h', max_points=1000).step == '1h'
+    with pytest.raises(ValueError, match='step'):
+        api.query_range('up', START, END)
+
+
+def test_rewrite_ranges():
+    assert rewrite_ranges('rate(x[1m])', 300) == 'rate(x[5m])'
+    assert rewrite_ranges('sum(increase(x{a="b"}[30s])) / rate(y[2h])', 300) == \
+        'sum(increase(x{a="b"}[5m])) / rate(y[2h])'
+    # Operators without spaces around them
+    assert rewrite_ranges('1-rate(x[1m])', 3600) == '1-rate(x[1h])'
+    assert rewrite_ranges('2e-3*increase(x[1m])+1', 3600) == '2e-3*increase(x[1h])+1'
+    # Subqueries and other functions are left alone
+    assert rewrite_ranges('rate(sum(x)[5m:1m]) + irate(x[1m])', 3600) == 'rate(sum(x)[5m:1m]) + irate(x[1m])'
+    assert rewrite_ranges('max_over_time(rate(x[1m])[1h:5m])', 300) == 'max_over_time(rate(x[5m])[1h:5m])'
+
+    api = PromqlHttpApi('http://localhost:9090')
+    q = api.query_range('rate(x[1m])', START, END, max_points=1000, rewrite_ranges=True)
+    assert q.query == 'rate(x[43m30s])'
+    assert parse_duration('43m30s') == 2595 + 15
+    assert api.query_range('rate(x[1m])', START, END, '15s', rewrite_ranges=True).query == 'rate(x[1m])'
@@ -0,0 +1,76 @@
+import asyncio
+import datetime
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from promql_http_api import AsyncPromqlHttpApi, Coalescer, PromqlHttpApi
+from conftest import success
+
+TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def slow_vector(params):
+    time.sleep(0.2)
+    return success('vector', [{'metric': {'instance': 'a'}, 'value': [1, '1']}])
+
+
+def test_make_key():
+    key = Coalescer.make_key('http://Host/api/v1/query?time=1&query=up', None, {'X-Org': '1'})
+    assert key == Coalescer.make_key('http://host/api/v1/query', [('query', 'up'), ('time', '1')], {'x-org': '1'})
+    assert key != Coalescer.make_key('http://host/api/v1/query?query=up&time=2', None, {'x-org': '1'})
+
+
+def test_do_shares_result_and_error():
+    coalescer = Coalescer()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait()
+        return object()
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(coalescer.do, 'key', fn) for _ in range(8)]
+        while coalescer.stats()['coalesced'] < 7:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert coalescer.stats() == {'calls': 1, 'coalesced': 7, 'in_flight': 0}
+
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        coalescer.do('key', fail)
+    assert coalescer.in_flight() == 0
+
+
+def test_threaded_queries(prometheus):
+    prometheus.routes['/api/v1/query'] = slow_vector
+    api = PromqlHttpApi(prometheus.url, coalesce=True)
+    queries = [api.query('up', TIME) for _ in range(10)]
+    with ThreadPoolExecutor(10) as executor:
+        results = list(executor.map(lambda q: q(), queries))
+    assert len(prometheus.requests) == 1
+    assert all(result is results[0] for result in results)
+    assert all(q.to_dataframe()['instance'][0] == 'a' for q in queries)
+
+    # Queries that differ are not coalesced
+    api.query('up', TIME + datetime.timedelta(seconds=1))()
+    assert len(prometheus.requests) == 2
+
+
+def test_async_queries(prometheus):
+    prometheus.routes['/api/v1/query'] = slow_vector
+
+    async def run():
+        async with AsyncPromqlHttpApi(prometheus.url, coalesce=True) as api:
+            return await asyncio.gather(*(api.query('up', TIME).ato_dataframe() for _ in range(10)))
+
+    frames = asyncio.run(run())
+    assert len(prometheus.requests) == 1
+    assert [df['instance'][0] for df in frames] == ['a'] * 10
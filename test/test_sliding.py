@@ -0,0 +1,59 @@
+import datetime
+import pandas as pd
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.duration import parse_duration
+from conftest import success
+
+NOW = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+def range_route(params):
+    params = dict(params)
+    start = float(params['start'])
+    end = float(params['end'])
+    step = parse_duration(params['step'])
+    count = int(round((end - start) / step)) + 1
+    values = [[start + k * step, '1'] for k in range(count)]
+    return success('matrix', [{'metric': {'instance': i}, 'values': values} for i in 'ab'])
+
+
+def test_refresh(prometheus):
+    prometheus.routes['/api/v1/query_range'] = range_route
+    api = PromqlHttpApi(prometheus.url)
+    q = api.sliding_query_range('up', '10m', '1m', overlap='1m')
+    df = q.refresh(NOW)
+    assert len(df) == 22
+    assert df['timestamp'].max() == NOW.timestamp()
+
+    later = NOW + datetime.timedelta(minutes=3, seconds=20)
+    df = q.refresh(later)
+    params = dict(prometheus.requests[-1][2])
+    assert float(params['start']) == NOW.timestamp() - 60
+    assert len(df) == 22
+    assert df['timestamp'].min() == NOW.timestamp() - 420
+    assert df['timestamp'].max() == NOW.timestamp() + 180
+    assert not df.duplicated(['timestamp', 'instance']).any()
+    # Rows are grouped by series, in time order
+    assert list(df['instance']) == ['a'] * 11 + ['b'] * 11
+    assert df.groupby('instance')['timestamp'].apply(lambda t: t.is_monotonic_increasing).all()
+    assert q.dataframe is df
+
+
+@pytest.mark.parametrize('schema', [{'compact': True}, {'timestamp': 'ms'}, {'timestamp': 'datetime64'},
+                                    {'timestamp': 'datetime64', 'compact': True}])
+def test_refresh_timestamp_formats(prometheus, schema):
+    prometheus.routes['/api/v1/query_range'] = range_route
+    api = PromqlHttpApi(prometheus.url)
+    q = api.sliding_query_range('up', '10m', '1m', overlap='1m', schema=schema)
+    assert len(q.refresh(NOW)) == 22
+    df = q.refresh(NOW + datetime.timedelta(minutes=3, seconds=20))
+    assert len(df) == 22
+    assert not df.duplicated(['timestamp', 'instance']).any()
+    assert list(df['instance']) == ['a'] * 11 + ['b'] * 11
+    if schema.get('compact'):
+        assert df['instance'].dtype == 'category'
+    if schema.get('timestamp') == 'datetime64':
+        assert df['timestamp'].min() == pd.Timestamp(NOW - datetime.timedelta(minutes=7)).tz_localize(None)
+    else:
+        assert df['timestamp'].min() == (NOW.timestamp() - 420) * 1000
@@ -0,0 +1,68 @@
+import json
+import datetime
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.streaming import StreamingResultParser
+from conftest import success
+
+
+def make_matrix(series, points):
+    return [
+        {'metric': {'__name__': 'up', 'instance': f'host{i}'},
+         'values': [[1000 + 15 * k, str(k)] for k in range(points)]}
+        for i in range(series)
+    ]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_parser_chunks(chunk_size):
+    result = make_matrix(3, 20)
+    result[1]['metric']['path'] = 'a"b]}{['
+    body = json.dumps(success('matrix', result)).encode()
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    parser = StreamingResultParser()
+    blocks = list(parser.parse(chunks))
+    assert [block.metric for block in blocks] == [series['metric'] for series in result]
+    assert list(blocks[2].timestamps) == [1000 + 15 * k for k in range(20)]
+    assert parser.result_type == 'matrix'
+
+
+def test_parser_error():
+    parser = StreamingResultParser()
+    body = b'{"status":"error","errorType":"bad_data","error":"parse error"}'
+    assert list(parser.parse([body])) == []
+    assert parser.envelope['errorType'] == 'bad_data'
+
+
+def test_parser_truncated():
+    body = json.dumps(success('matrix', make_matrix(2, 5))).encode()
+    with pytest.raises(ValueError):
+        list(StreamingResultParser().parse([body[:-20]]))
+
+
+def test_query_range_stream(prometheus):
+    result = make_matrix(4, 50)
+    prometheus.routes['/api/v1/query_range'] = lambda params: success('matrix', result)
+    api = PromqlHttpApi(prometheus.url)
+    now = datetime.datetime.now()
+    schema = {'dtype': float}
+    streamed = api.query_range('up', now, now, '15s').to_dataframe(schema, stream=True, chunk_size=64)
+    expected = api.query_range('up', now, now, '15s').to_dataframe(schema)
+    assert streamed.equals(expected)
+
+
+def test_iter_series_closes_response(prometheus):
+    prometheus.routes['/api/v1/query_range'] = lambda params: success('matrix', make_matrix(4, 50))
+    api = PromqlHttpApi(prometheus.url)
+    now = datetime.datetime.now()
+    # The consumer stops early
+    for block in api.query_range('up', now, now, '15s').iter_series(chunk_size=64):
+        break
+    prometheus.routes['/api/v1/query_range'] = lambda params: (400, {'status': 'error', 'error': 'bad'})
+    with pytest.raises(ValueError, match='HTTP status 400'):
+        next(api.query_range('up', now, now, '15s').iter_series())
+    pools = api.transport.session.get_adapter(prometheus.url).poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key).pool
+        # No connection is left checked out
+        assert pool.qsize() == pool.maxsize
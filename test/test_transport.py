@@ -0,0 +1,143 @@
+import datetime
+import os
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from promql_http_api import PromqlHttpApi, Transport
+from conftest import success
+
+TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def vector(delay=0.0):
+    def route(params):
+        time.sleep(delay)
+        return success('vector', [{'metric': {'job': 'a'}, 'value': [1, '1']}])
+    return route
+
+
+def test_transport_per_client(prometheus):
+    prometheus.routes['/api/v1/query'] = vector()
+    api1 = PromqlHttpApi(prometheus.url)
+    api2 = PromqlHttpApi(prometheus.url)
+    assert api1.transport is not api2.transport
+    shared = Transport()
+    api3 = PromqlHttpApi(prometheus.url, transport=shared)
+    api4 = PromqlHttpApi(prometheus.url, transport=shared)
+    for api in (api1, api3, api4):
+        api.query('up', TIME)()
+    assert api1.transport.stats()['requests'] == 1
+    assert api2.transport.stats()['requests'] == 0
+    assert shared.stats()['requests'] == 2
+
+
+def test_keep_alive(prometheus):
+    prometheus.routes['/api/v1/query'] = vector()
+    api = PromqlHttpApi(prometheus.url)
+    for _ in range(5):
+        api.query('up', TIME)()
+    stats = api.transport.stats()
+    pool = stats['pools'][prometheus.url]
+    assert stats['requests'] == 5
+    assert pool['requests'] == 5
+    assert pool['connections'] == 1
+    assert pool['idle'] == 1
+
+
+def test_no_keep_alive(prometheus):
+    prometheus.routes['/api/v1/query'] = vector()
+    api = PromqlHttpApi(prometheus.url, transport=Transport(keep_alive=False))
+    for _ in range(3):
+        assert len(api.query('up', TIME).to_dataframe()) == 1
+    assert api.transport.session.headers['Connection'] == 'close'
+    assert api.transport.stats()['pools'][prometheus.url]['requests'] == 3
+
+
+def test_pool_maxsize(prometheus):
+    prometheus.routes['/api/v1/query'] = vector(0.05)
+    api = PromqlHttpApi(prometheus.url, transport=Transport(pool_maxsize=2))
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: api.query('up', TIME)(), range(6)))
+    pool = api.transport.stats()['pools'][prometheus.url]
+    assert pool['maxsize'] == 2
+    # Connections beyond the pool size are discarded after use
+    assert pool['connections'] > 2
+    assert pool['idle'] == 2
+
+
+def test_max_connections(prometheus):
+    prometheus.routes['/api/v1/query'] = vector(0.05)
+    api = PromqlHttpApi(prometheus.url, transport=Transport(max_connections=2))
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: api.query('up', TIME)(), range(6)))
+    stats = api.transport.stats()
+    assert stats['requests'] == 6
+    assert stats['in_flight'] == 0
+    assert stats['max_in_flight'] == 2
+    assert stats['waits'] >= 1
+    assert stats['pools'][prometheus.url]['connections'] <= 2
+
+
+def test_grow(prometheus):
+    transport = Transport()
+    transport.grow(2)
+    assert transport.pool_maxsize == 10
+    session = transport.session
+    session.verify = False
+    adapter = session.get_adapter(prometheus.url)
+    prometheus.routes['/api/v1/query'] = vector()
+    api = PromqlHttpApi(prometheus.url, transport=transport)
+    api.query('up', TIME)()
+    transport.grow(16)
+    assert transport.pool_maxsize == 16
+    # The session and its settings are kept, and the connections of the old adapter are closed
+    assert transport.session is session and not session.verify
+    assert session.get_adapter(prometheus.url) is not adapter
+    assert not adapter.poolmanager.pools
+    api.query('up', TIME)()
+    assert transport.stats()['pools'][prometheus.url]['maxsize'] == 16
+
+
+def test_grow_fixed_size():
+    # A size chosen by the user is kept
+    for transport, size in ((Transport(pool_maxsize=4), 4), (Transport(pool_block=True), 10)):
+        adapter = transport.session.get_adapter('http://localhost')
+        transport.grow(16)
+        assert transport.pool_maxsize == size
+        assert transport.session.get_adapter('http://localhost') is adapter
+
+
+def test_api_response_session():
+    from promql_http_api.api_response import ApiResponse
+    with pytest.warns(DeprecationWarning):
+        session = ApiResponse.session
+    assert session is Transport.default().session
+
+
+def test_fork(prometheus):
+    prometheus.routes['/api/v1/query'] = vector()
+    api = PromqlHttpApi(prometheus.url)
+    api.query('up', TIME)()
+    session = api.transport.session
+    pid = os.fork()
+    if pid == 0:
+        # The child must not reuse the connections of its parent
+        try:
+            ok = api.transport.session is not session and api.transport.stats()['requests'] == 0
+            df = api.query('up', TIME).to_dataframe()
+            ok = ok and len(df) == 1 and api.transport.stats()['pools'][prometheus.url]['connections'] == 1
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert api.transport.session is session
+    api.query('up', TIME)()
+    assert api.transport.stats()['pools'][prometheus.url]['connections'] == 1
+
+
+def test_close(prometheus):
+    prometheus.routes['/api/v1/query'] = vector()
+    api = PromqlHttpApi(prometheus.url)
+    api.query('up', TIME)()
+    api.close()
+    assert api.transport.stats()['pools'] == {}
@@ -0,0 +1,53 @@
+import datetime
+import numpy as np
+import pytest
+from promql_http_api import PromqlHttpApi
+from promql_http_api.columnar import blocks_to_grid, series_from_result
+from conftest import success
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+T0 = START.timestamp()
+
+
+def matrix(params):
+    return success('matrix', [
+        {'metric': {'job': 'j', 'instance': 'a'}, 'values': [[T0, '1'], [T0 + 60, '2'], [T0 + 120, '3']]},
+        {'metric': {'job': 'j', 'instance': 'b'}, 'values': [[T0 + 60, 'NaN'], [T0 + 120, '+Inf']]},
+    ])
+
+
+def test_blocks_to_grid():
+    blocks = [series_from_result({'metric': {}, 'values': [[10, '1'], [30, '3'], [50, '5']]})]
+    grid = blocks_to_grid(blocks, 10000, 10000, 3)
+    assert grid.values.shape == (1, 3)
+    assert list(grid.values[0][[0, 2]]) == [1.0, 3.0]
+    assert np.isnan(grid.values[0][1])
+    assert list(grid.timestamps) == [10, 20, 30]
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_to_numpy_grid(prometheus, stream):
+    prometheus.routes['/api/v1/query_range'] = matrix
+    api = PromqlHttpApi(prometheus.url)
+    q = api.query_range('up', START, START + datetime.timedelta(minutes=3), '1m')
+    grid = q.to_numpy_grid(stream=stream)
+    assert grid.values.shape == (2, 4)
+    assert list(grid.values[0][:3]) == [1, 2, 3]
+    assert np.isnan(grid.values[1][0])
+    assert grid.values[1][2] == np.inf
+    assert [metric['instance'] for metric in grid.metrics] == ['a', 'b']
+
+
+def test_wide_dataframe(prometheus):
+    prometheus.routes['/api/v1/query_range'] = matrix
+    api = PromqlHttpApi(prometheus.url)
+    q = api.query_range('up', START, START + datetime.timedelta(minutes=2), '1m')
+    df = q.to_dataframe(layout='wide')
+    assert df.shape == (3, 2)
+    assert list(df.columns.names) == ['job', 'instance']
+    assert df[('j', 'a')].tolist() == [1, 2, 3]
+    assert str(df.index.tz) == 'UTC'
+
+    df = q.to_dataframe({'columns': ['instance'], 'dtype': np.float32}, layout='wide')
+    assert list(df.columns) == ['a', 'b']
+    assert df['a'].dtype == np.float32